@@ -69,6 +69,13 @@ export function createMarpAgent({ stack, userPool, userPoolClient, nameSuffix, s
   // 環境ごとのランタイム名（例: marp_agent_dev, marp_agent_main）
   const runtimeName = nameSuffix ? `marp_agent_sv1_${nameSuffix}` : 'marp_agent';
 
+  // Tavily APIキー（TAVILY_API_KEY, TAVILY_API_KEY2, ... を本数の制限なく渡す）
+  const tavilyApiKeys = Object.fromEntries(
+    Object.entries(process.env)
+      .filter(([name]) => /^TAVILY_API_KEY\d*$/.test(name))
+      .map(([name, value]) => [name, value || '']),
+  );
+
   // AgentCore Runtime作成
   const runtime = new agentcore.Runtime(stack, 'MarpAgentRuntime', {
     runtimeName,
@@ -76,8 +83,7 @@ export function createMarpAgent({ stack, userPool, userPoolClient, nameSuffix, s
     authorizerConfiguration: authConfig,
     environmentVariables: {
       TAVILY_API_KEY: process.env.TAVILY_API_KEY || '',
-      TAVILY_API_KEY2: process.env.TAVILY_API_KEY2 || '',
-      TAVILY_API_KEY3: process.env.TAVILY_API_KEY3 || '',
+      ...tavilyApiKeys,
       // 共有スライド用S3/CloudFront設定
       SHARED_SLIDES_BUCKET: sharedSlidesBucket?.bucketName || '',
       CLOUDFRONT_DOMAIN: sharedSlidesDistributionDomain || '',
@@ -112,6 +118,12 @@ export function createMarpAgent({ stack, userPool, userPoolClient, nameSuffix, s
       actions: ['s3:PutObject'],
       resources: [`${sharedSlidesBucket.bucketArn}/*`],
     }));
+    // エクスポートのダウンロードURL（delivery: "url"）はこのロールで署名するため、
+    // exports/ 配下の読み取りと、失敗したマルチパートアップロードの中止も許可
+    runtime.addToRolePolicy(new iam.PolicyStatement({
+      actions: ['s3:GetObject', 's3:AbortMultipartUpload'],
+      resources: [`${sharedSlidesBucket.bucketArn}/exports/*`],
+    }));
   }
 
   // エンドポイントはDEFAULTを使用（runtime.addEndpoint不要）
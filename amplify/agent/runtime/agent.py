@@ -1,233 +1,358 @@
 """パワポ作るマン - エージェントエントリポイント"""
 
+import asyncio
 import base64
+import io
 import json
+import os
+import threading
+from typing import BinaryIO
 
 from bedrock_agentcore import BedrockAgentCoreApp
 
-from config import MAX_RETRY_COUNT
-from tools import (
-    web_search,
-    output_slide,
-    generate_tweet_url,
-    get_generated_markdown,
-    reset_generated_markdown,
-    get_generated_tweet_url,
-    reset_generated_tweet_url,
+from config import MAX_RETRY_COUNT, KIMI_EARLY_ABORT, KIMI_FAILOVER_MODEL_TYPE, KIMI_FAILOVER_AFTER, MODEL_WARMUP_TYPES
+from tools import REQUEST_STATE_KEY, begin_request
+from handlers import (
+    KimiStreamFilter,
+    MarpMarkdownExtractor,
+    SlideEventStream,
+    AttemptRecorder,
+    backoff_delay,
+    record_failover,
+    is_tool_name_corrupted,
+    extract_marp_markdown_from_text,
 )
-from tools.web_search import get_last_search_result, reset_last_search_result
-from handlers import is_tool_name_corrupted, remove_think_tags, extract_marp_markdown_from_text
-from exports import generate_pdf, generate_pptx
-from sharing import share_slide
-from session import get_or_create_agent
+from session import get_or_create_agent, build_user_message, compact_history, record_session_size, warm_up_models
+from telemetry import Stage, deck_attributes
+from deck import check_exportable
 
 app = BedrockAgentCoreApp()
 
+# エクスポートアクションと出力形式
+# エクスポート・共有（Marp・pypdf・S3クライアント）は使うリクエストが来るまで読み込まない（起動時間短縮）
+_EXPORT_FORMATS = {
+    "export_pdf": "pdf",
+    "export_pptx": "pptx",
+}
+
+
+async def _deliver_export(source: bytes | BinaryIO, output_format: str, delivery: str):
+    """変換結果（バイト列または開いたファイル）を配信方法（inline / chunked / url）に応じたイベントにする
+
+    ファイルを渡した場合はチャンク配信・アップロードとも1チャンクずつ読む（閉じるのは呼び出し側）。
+    """
+    from exports import chunk_events
+    from sharing import upload_export
+
+    file = io.BytesIO(source) if isinstance(source, bytes) else source
+    if delivery == "chunked":
+        # 固定サイズのBase64チャンクで配信（巨大なイベントを作らない）
+        size = len(source) if isinstance(source, bytes) else os.fstat(file.fileno()).st_size
+        async for event in chunk_events(file, size, output_format):
+            yield event
+    elif delivery == "url":
+        # S3にアップロードして署名付きURLを返す
+        result = await upload_export(file, output_format)
+        yield {"type": "export_url", "format": output_format, "url": result['url'], "expiresAt": result['expiresAt']}
+    else:
+        data = source if isinstance(source, bytes) else await asyncio.to_thread(file.read)
+        yield {"type": output_format, "data": base64.b64encode(data).decode("utf-8")}
+
 
 @app.entrypoint
 async def invoke(payload, context=None):
     """エージェント実行（ストリーミング対応）"""
-    # グローバル状態をリセット
-    reset_generated_markdown()
-    reset_generated_tweet_url()
-    reset_last_search_result()
+    with Stage(
+        "agent.invoke",
+        action=payload.get("action", "chat"),
+        model_type=payload.get("model_type", "nova"),
+        theme=payload.get("theme", "gradient"),
+        **deck_attributes(payload.get("markdown", "")),
+    ) as invoke_stage:
+        async for event in _handle_invoke(payload, context, invoke_stage):
+            if event.get("type") == "markdown":
+                invoke_stage.set(**deck_attributes(event["data"]))
+            yield event
+
+
+async def _handle_invoke(payload, context=None, invoke_stage: Stage | None = None):
+    # リクエスト単位のツール状態（同一プロセス内の並行リクエストと共有しない）
+    request_state = begin_request()
 
     user_message = payload.get("prompt", "")
     action = payload.get("action", "chat")
     current_markdown = payload.get("markdown", "")
     model_type = payload.get("model_type", "nova")
+    stream_slides = bool(payload.get("stream_slides", False))
     session_id = getattr(context, 'session_id', None) if context else None
     theme = payload.get("theme", "gradient")
 
-    # PDF出力
-    if action == "export_pdf" and current_markdown:
-        try:
-            pdf_bytes = generate_pdf(current_markdown, theme)
-            pdf_base64 = base64.b64encode(pdf_bytes).decode("utf-8")
-            yield {"type": "pdf", "data": pdf_base64}
-        except Exception as e:
-            yield {"type": "error", "message": str(e)}
-        return
-
-    # PPTX出力
-    if action == "export_pptx" and current_markdown:
-        try:
-            pptx_bytes = generate_pptx(current_markdown, theme)
-            pptx_base64 = base64.b64encode(pptx_bytes).decode("utf-8")
-            yield {"type": "pptx", "data": pptx_base64}
-        except Exception as e:
-            yield {"type": "error", "message": str(e)}
+    # PDF/PPTX出力
+    if action in _EXPORT_FORMATS and current_markdown:
+        from exports import generate_pdf, generate_pptx, open_export, run_export, ExportBusyError
+
+        output_format = _EXPORT_FORMATS[action]
+        generator = generate_pdf if output_format == "pdf" else generate_pptx
+        delivery = payload.get("delivery", "inline")
+        with Stage(
+            "export", format=output_format, delivery=delivery, theme=theme, **deck_attributes(current_markdown)
+        ) as export_stage:
+            try:
+                # 壊れたデッキはMarpを起動する前に断る
+                check_exportable(current_markdown)
+                if delivery in ("chunked", "url"):
+                    # 大きなPDF/PPTXをメモリに載せないよう、ファイルとして開いて配信する
+                    export_file = await run_export(open_export, current_markdown, output_format, theme)
+                    with export_file:
+                        async for event in _deliver_export(export_file, output_format, delivery):
+                            yield event
+                else:
+                    file_bytes = await run_export(generator, current_markdown, theme)
+                    async for event in _deliver_export(file_bytes, output_format, delivery):
+                        yield event
+            except ExportBusyError as e:
+                export_stage.finish(error=e)
+                yield {"type": "busy", "message": str(e)}
+            except Exception as e:
+                export_stage.finish(error=e)
+                yield {"type": "error", "message": str(e)}
         return
 
     # スライド共有
     if action == "share_slide" and current_markdown:
-        try:
-            result = share_slide(current_markdown, theme)
-            yield {
-                "type": "share_result",
-                "url": result['url'],
-                "expiresAt": result['expiresAt'],
-            }
-        except Exception as e:
-            yield {"type": "error", "message": str(e)}
+        from exports import ExportBusyError
+        from sharing import share_slide
+
+        with Stage("share", theme=theme, **deck_attributes(current_markdown)) as share_stage:
+            try:
+                check_exportable(current_markdown)
+                result = await share_slide(current_markdown, theme)
+                yield {
+                    "type": "share_result",
+                    "url": result['url'],
+                    "expiresAt": result['expiresAt'],
+                }
+            except ExportBusyError as e:
+                share_stage.finish(error=e)
+                yield {"type": "busy", "message": str(e)}
+            except Exception as e:
+                share_stage.finish(error=e)
+                yield {"type": "error", "message": str(e)}
+        return
+
+    # 複数形式の一括エクスポート（PDF/PPTXは1回のレンダラーセッションで変換し、揃った形式から返す）
+    if action == "export_batch" and current_markdown:
+        from exports import BATCH_FORMATS, ExportBusyError, stream_export_batch
+        from sharing import share_slide
+
+        requested = payload.get("formats") or []
+        delivery = payload.get("delivery", "inline")
+        with Stage(
+            "export", format="batch", delivery=delivery, theme=theme, **deck_attributes(current_markdown)
+        ) as export_stage:
+            try:
+                formats = list(dict.fromkeys(requested)) if isinstance(requested, list) else []
+                if not formats or any(f not in BATCH_FORMATS and f != "share" for f in formats):
+                    raise ValueError(f"formats には {', '.join(BATCH_FORMATS)}, share のリストを指定してください（指定値: {requested!r}）")
+                check_exportable(current_markdown)
+                file_formats = [f for f in formats if f in BATCH_FORMATS]
+                if file_formats:
+                    async for output_format, data in stream_export_batch(current_markdown, file_formats, theme):
+                        async for event in _deliver_export(data, output_format, delivery):
+                            yield event
+                # 共有用HTMLはHTMLタグを許可したレンダラー設定で変換するため別のセッションになる
+                if "share" in formats:
+                    result = await share_slide(current_markdown, theme)
+                    yield {"type": "share_result", "url": result['url'], "expiresAt": result['expiresAt']}
+            except ExportBusyError as e:
+                export_stage.finish(error=e)
+                yield {"type": "busy", "message": str(e)}
+            except Exception as e:
+                export_stage.finish(error=e)
+                yield {"type": "error", "message": str(e)}
         return
 
+    # patch_slidesはこのデッキに修正を適用する
+    request_state.current_markdown = current_markdown
+
     # 現在のスライドがある場合はユーザーメッセージに付加
-    if current_markdown:
-        user_message = f"現在のスライド:\n```markdown\n{current_markdown}\n```\n\nユーザーの指示: {user_message}"
+    user_message = build_user_message(user_message, current_markdown)
 
     # セッションIDとモデルタイプに対応するAgentを取得
     agent = get_or_create_agent(session_id, model_type)
 
+    # 古いスライド全文・古いターンを圧縮してから送信
+    saved_tokens = compact_history(agent, has_current_deck=bool(current_markdown))
+    if invoke_stage is not None:
+        invoke_stage.set(**{"history.tokens_saved": saved_tokens})
+
     # Kimi K2のツール名破損時のリトライループ
     retry_count = 0
     fallback_markdown: str | None = None
 
     while retry_count <= MAX_RETRY_COUNT:
-        reset_generated_markdown()
+        request_state.generated_markdown = None
         fallback_markdown = None
         tool_name_corrupted = False
         has_any_output = False
         web_search_executed = False
 
-        # Kimi K2用のバッファ
-        kimi_text_buffer = "" if model_type == "kimi" else None
-        kimi_skip_text = False
-        kimi_in_think_tag = False
-        kimi_pending_text = ""
-
-        stream = agent.stream_async(user_message)
-
-        async for event in stream:
-            # Kimi K2 Thinking の思考プロセスは無視
-            if event.get("reasoning"):
-                continue
-
-            if "data" in event:
-                chunk = event["data"]
-                if model_type == "kimi":
-                    kimi_text_buffer += chunk
+        # Kimi K2用のストリームフィルタ
+        kimi_filter = KimiStreamFilter() if model_type == "kimi" else None
+        # フォールバック用マークダウンの逐次抽出（テキストストリーム・思考テキスト）
+        kimi_extractor = MarpMarkdownExtractor() if model_type == "kimi" else None
+        reasoning_extractor = MarpMarkdownExtractor()
+        # 完成したスライドから slide イベントを逐次送る（stream_slides指定時）
+        slide_events = SlideEventStream() if stream_slides else None
+
+        # ツール名破損を検出したらこのシグナルでBedrockのストリームを中断する
+        cancel_signal = threading.Event()
+        with AttemptRecorder(agent, retry_count, model_type) as attempt_recorder:
+            stream = agent.stream_async(
+                user_message,
+                invocation_state={REQUEST_STATE_KEY: request_state},
+                cancel_signal=cancel_signal,
+            )
+
+            async for event in stream:
+                # 中断後は残りのイベントを読み捨てる
+                if cancel_signal.is_set():
+                    continue
 
-                    # マークダウン検出
-                    if not kimi_skip_text and "marp: true" in kimi_text_buffer.lower():
-                        kimi_skip_text = True
-                        print(f"[INFO] Kimi K2: Marp markdown detected in text stream, skipping text output")
+                if "data" in event or "current_tool_use" in event:
+                    attempt_recorder.mark_first_token()
 
-                    if not kimi_skip_text:
-                        # <think>タグのフィルタリング処理
-                        kimi_pending_text += chunk
+                # Kimi K2 Thinking の思考プロセスは表示しない（マークダウン抽出にだけ使う）
+                if event.get("reasoning"):
+                    reasoning_text = event.get("reasoningText")
+                    if isinstance(reasoning_text, str):
+                        reasoning_extractor.feed(reasoning_text)
+                    continue
 
-                        # <think>タグ開始の検出
-                        while "<think>" in kimi_pending_text:
-                            before, _, after = kimi_pending_text.partition("<think>")
-                            if before:
+                if "data" in event:
+                    chunk = event["data"]
+                    if kimi_filter is not None:
+                        # <think>タグ除去・マークダウン検出・抽出（チャンク単位で逐次処理）
+                        kimi_extractor.feed(chunk)
+                        visible_text = kimi_filter.feed(chunk)
+                        if visible_text:
+                            has_any_output = True
+                            yield {"type": "text", "data": visible_text}
+                        if slide_events is not None:
+                            for slide_event in slide_events.emit(kimi_extractor.pop_slides(), kimi_extractor.front_matter):
+                                yield slide_event
+                    else:
+                        # Claude: そのままテキスト送信
+                        has_any_output = True
+                        yield {"type": "text", "data": chunk}
+
+                elif "current_tool_use" in event:
+                    tool_info = event["current_tool_use"]
+                    tool_name = tool_info.get("name", "unknown")
+                    tool_input = tool_info.get("input", {})
+
+                    # Kimi K2のツール名破損をチェック
+                    if is_tool_name_corrupted(tool_name):
+                        tool_name_corrupted = True
+                        print(f"[WARN] Corrupted tool name detected: {tool_name[:50]}... (retry {retry_count + 1}/{MAX_RETRY_COUNT})")
+                        if KIMI_EARLY_ABORT and model_type == "kimi":
+                            # 生成の残りを待たずに中断してリトライへ
+                            cancel_signal.set()
+                            print(f"[INFO] Kimi K2: Cancelling stream after corrupted tool name")
+                        continue
+
+                    if tool_name == "output_slide" and slide_events is not None and isinstance(tool_input, str):
+                        # 生成途中の入力から完成したスライドを送る
+                        for slide_event in slide_events.feed_tool_input(tool_info.get("toolUseId"), tool_input):
+                            yield slide_event
+
+                    if tool_name == "web_search":
+                        # 文字列の場合はJSONパースを試みる（入力が大きいoutput_slideでは毎回パースしない）
+                        if isinstance(tool_input, str):
+                            try:
+                                tool_input = json.loads(tool_input)
+                            except json.JSONDecodeError:
+                                pass
+                        web_search_executed = True
+                        if isinstance(tool_input, dict) and "query" in tool_input:
+                            yield {"type": "tool_use", "data": tool_name, "query": tool_input["query"]}
+                    else:
+                        yield {"type": "tool_use", "data": tool_name}
+
+                elif "result" in event:
+                    result = event["result"]
+                    if hasattr(result, 'message') and result.message:
+                        for content in getattr(result.message, 'content', []):
+                            # Kimi K2 Thinking の reasoningContent からマークダウンを抽出
+                            if hasattr(content, 'reasoningContent'):
+                                reasoning = content.reasoningContent
+                                if hasattr(reasoning, 'reasoningText'):
+                                    reasoning_text = reasoning.reasoningText
+                                    if hasattr(reasoning_text, 'text') and reasoning_text.text:
+                                        text = reasoning_text.text
+                                        if "<|tool_call" in text or "functions.web_search" in text or "functions.output_slide" in text:
+                                            tool_name_corrupted = True
+                                            print(f"[WARN] Tool call found in reasoning text (retry {retry_count + 1}/{MAX_RETRY_COUNT})")
+                                        # ストリーム中に抽出済みならそれを使う
+                                        if reasoning_extractor.received:
+                                            extracted = reasoning_extractor.result()
+                                        else:
+                                            extracted = extract_marp_markdown_from_text(text)
+                                        if extracted and not fallback_markdown:
+                                            fallback_markdown = extracted
+                                            print(f"[INFO] Fallback markdown extracted from reasoningContent")
+                                continue
+                            if hasattr(content, 'text') and content.text:
                                 has_any_output = True
-                                yield {"type": "text", "data": before}
-                            kimi_in_think_tag = True
-                            kimi_pending_text = after
-                            print(f"[INFO] Kimi K2: <think> tag detected, entering think mode")
-
-                        # </think>タグ終了の検出
-                        while "</think>" in kimi_pending_text:
-                            before, _, after = kimi_pending_text.partition("</think>")
-                            kimi_in_think_tag = False
-                            kimi_pending_text = after
-                            print(f"[INFO] Kimi K2: </think> tag detected, exiting think mode")
-
-                        # タグ内でなければテキストを出力
-                        if not kimi_in_think_tag:
-                            safe_end = len(kimi_pending_text)
-                            if "<" in kimi_pending_text:
-                                last_lt = kimi_pending_text.rfind("<")
-                                if len(kimi_pending_text) - last_lt <= 7:
-                                    safe_end = last_lt
-                            if safe_end > 0:
-                                to_send = kimi_pending_text[:safe_end]
-                                kimi_pending_text = kimi_pending_text[safe_end:]
-                                if to_send:
-                                    has_any_output = True
-                                    yield {"type": "text", "data": to_send}
-                else:
-                    # Claude: そのままテキスト送信
+                                yield {"type": "text", "data": content.text}
+
+            if kimi_filter is not None:
+                # Kimi K2: ストリーム終了後の保留テキストを出力
+                remaining_text = kimi_filter.flush()
+                if remaining_text:
                     has_any_output = True
-                    yield {"type": "text", "data": chunk}
+                    yield {"type": "text", "data": remaining_text}
 
-            elif "current_tool_use" in event:
-                tool_info = event["current_tool_use"]
-                tool_name = tool_info.get("name", "unknown")
-                tool_input = tool_info.get("input", {})
+                if slide_events is not None:
+                    for slide_event in slide_events.emit(kimi_extractor.pop_slides(final=True), kimi_extractor.front_matter):
+                        yield slide_event
 
-                # Kimi K2のツール名破損をチェック
-                if is_tool_name_corrupted(tool_name):
-                    tool_name_corrupted = True
-                    print(f"[WARN] Corrupted tool name detected: {tool_name[:50]}... (retry {retry_count + 1}/{MAX_RETRY_COUNT})")
-                    continue
+                # Kimi K2: テキストストリームからマークダウンを抽出（フォールバック）
+                if not fallback_markdown:
+                    extracted = kimi_extractor.result()
+                    if extracted:
+                        fallback_markdown = extracted
+                        print(f"[INFO] Kimi K2: Fallback markdown extracted from text stream")
 
-                # 文字列の場合はJSONパースを試みる
-                if isinstance(tool_input, str):
-                    try:
-                        tool_input = json.loads(tool_input)
-                    except json.JSONDecodeError:
-                        pass
-
-                if tool_name == "web_search":
-                    web_search_executed = True
-                    if isinstance(tool_input, dict) and "query" in tool_input:
-                        yield {"type": "tool_use", "data": tool_name, "query": tool_input["query"]}
-                else:
-                    yield {"type": "tool_use", "data": tool_name}
-
-            elif "result" in event:
-                result = event["result"]
-                if hasattr(result, 'message') and result.message:
-                    for content in getattr(result.message, 'content', []):
-                        # Kimi K2 Thinking の reasoningContent からマークダウンを抽出
-                        if hasattr(content, 'reasoningContent'):
-                            reasoning = content.reasoningContent
-                            if hasattr(reasoning, 'reasoningText'):
-                                reasoning_text = reasoning.reasoningText
-                                if hasattr(reasoning_text, 'text') and reasoning_text.text:
-                                    text = reasoning_text.text
-                                    if "<|tool_call" in text or "functions.web_search" in text or "functions.output_slide" in text:
-                                        tool_name_corrupted = True
-                                        print(f"[WARN] Tool call found in reasoning text (retry {retry_count + 1}/{MAX_RETRY_COUNT})")
-                                    extracted = extract_marp_markdown_from_text(text)
-                                    if extracted and not fallback_markdown:
-                                        fallback_markdown = extracted
-                                        print(f"[INFO] Fallback markdown extracted from reasoningContent")
-                            continue
-                        if hasattr(content, 'text') and content.text:
-                            has_any_output = True
-                            yield {"type": "text", "data": content.text}
-
-        # Kimi K2: ストリーム終了後のペンディングバッファ処理
-        if model_type == "kimi" and kimi_pending_text and not kimi_skip_text and not kimi_in_think_tag:
-            clean_text = remove_think_tags(kimi_pending_text)
-            if clean_text:
-                has_any_output = True
-                yield {"type": "text", "data": clean_text}
-
-        # Kimi K2: テキストストリームからマークダウンを抽出（フォールバック）
-        if model_type == "kimi" and kimi_text_buffer and not fallback_markdown:
-            extracted = extract_marp_markdown_from_text(kimi_text_buffer)
-            if extracted:
-                fallback_markdown = extracted
-                print(f"[INFO] Kimi K2: Fallback markdown extracted from text stream")
+            attempt_recorder.finish(corrupted=tool_name_corrupted, aborted=cancel_signal.is_set())
 
         # リトライ判定
-        generated_markdown = get_generated_markdown()
+        generated_markdown = request_state.generated_markdown
         if tool_name_corrupted and not generated_markdown and not fallback_markdown and model_type == "kimi":
             retry_count += 1
             if retry_count <= MAX_RETRY_COUNT:
-                yield {"type": "status", "data": f"リトライ中... ({retry_count}/{MAX_RETRY_COUNT})"}
                 agent.messages.clear()
+                if KIMI_FAILOVER_MODEL_TYPE and retry_count > KIMI_FAILOVER_AFTER:
+                    # 破損が続く場合は別のモデルに切り替え
+                    print(f"[INFO] Kimi K2: Failing over to {KIMI_FAILOVER_MODEL_TYPE} after {retry_count - 1} retries")
+                    model_type = KIMI_FAILOVER_MODEL_TYPE
+                    agent = get_or_create_agent(session_id, model_type)
+                    record_failover()
+                    yield {"type": "status", "data": f"別のモデルで再試行中... ({retry_count}/{MAX_RETRY_COUNT})"}
+                else:
+                    yield {"type": "status", "data": f"リトライ中... ({retry_count}/{MAX_RETRY_COUNT})"}
+                    with Stage("retry.backoff", model_type=model_type, retry=retry_count):
+                        await asyncio.sleep(backoff_delay(retry_count))
                 continue
             else:
                 yield {"type": "error", "message": "スライド生成に失敗しました。Claudeモデルをお試しください。"}
         break
 
+    # 今回のリクエストで増えた会話履歴をメモリ予算に反映
+    record_session_size(session_id, model_type)
+
     # マークダウン出力
-    generated_markdown = get_generated_markdown()
+    generated_markdown = request_state.generated_markdown
     markdown_to_send = generated_markdown or fallback_markdown
     if markdown_to_send:
         if fallback_markdown and not generated_markdown:
@@ -235,7 +360,7 @@ async def invoke(payload, context=None):
         yield {"type": "markdown", "data": markdown_to_send}
 
     # Web検索後にスライドが生成されなかった場合のフォールバック
-    last_search_result = get_last_search_result()
+    last_search_result = request_state.last_search_result
     if web_search_executed and not markdown_to_send and last_search_result:
         truncated_result = last_search_result[:500]
         if len(last_search_result) > 500:
@@ -245,7 +370,7 @@ async def invoke(payload, context=None):
         yield {"type": "text", "data": fallback_message}
 
     # ツイートURL出力
-    generated_tweet_url = get_generated_tweet_url()
+    generated_tweet_url = request_state.generated_tweet_url
     if generated_tweet_url:
         yield {"type": "tweet_url", "data": generated_tweet_url}
 
@@ -253,4 +378,6 @@ async def invoke(payload, context=None):
 
 
 if __name__ == "__main__":
+    # 最初のリクエストでモデルクライアントの作成・TLS接続を待たないよう起動時に済ませる
+    warm_up_models(MODEL_WARMUP_TYPES)
     app.run()
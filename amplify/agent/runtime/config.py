@@ -1,8 +1,84 @@
 """モデル設定・定数・システムプロンプト"""
 
+import os
+
 # Kimi K2のツール名破損検出用
-VALID_TOOL_NAMES = {"web_search", "output_slide", "generate_tweet_url"}
+VALID_TOOL_NAMES = {"web_search", "output_slide", "patch_slides", "generate_tweet_url"}
 MAX_RETRY_COUNT = 5  # ツール名破損時の最大リトライ回数
+KIMI_EARLY_ABORT = os.environ.get("KIMI_EARLY_ABORT", "1") == "1"  # 1ならツール名破損の検出時点でストリームを中断
+RETRY_BACKOFF_BASE = float(os.environ.get("RETRY_BACKOFF_BASE", "0.5"))  # 1回目のリトライ前の待ち時間（秒、以降は倍々）
+RETRY_BACKOFF_MAX = float(os.environ.get("RETRY_BACKOFF_MAX", "8"))  # リトライ前の待ち時間の上限（秒）
+KIMI_FAILOVER_MODEL_TYPE = os.environ.get("KIMI_FAILOVER_MODEL_TYPE", "")  # 破損が続いたら切り替えるモデルタイプ（空なら切り替えない）
+KIMI_FAILOVER_AFTER = int(os.environ.get("KIMI_FAILOVER_AFTER", "2"))  # この回数リトライしても破損したら切り替え
+
+# Marpレンダラーワーカープール（常駐Marp CLIサーバー）
+MARP_POOL_SIZE = int(os.environ.get("MARP_POOL_SIZE", "2"))  # 0でプール無効（都度CLI起動）
+MARP_WORKER_MAX_JOBS = int(os.environ.get("MARP_WORKER_MAX_JOBS", "50"))  # この回数変換したらワーカーを再起動
+MARP_WORKER_START_TIMEOUT = float(os.environ.get("MARP_WORKER_START_TIMEOUT", "30"))  # ワーカー起動待ち（秒）
+MARP_JOB_TIMEOUT = float(os.environ.get("MARP_JOB_TIMEOUT", "120"))  # 1変換あたりの上限（秒）
+MARP_QUEUE_TIMEOUT = float(os.environ.get("MARP_QUEUE_TIMEOUT", "60"))  # 空きワーカー待ちの上限（秒）
+MARP_HEALTH_CHECK_INTERVAL = 30.0  # アイドルワーカーのヘルスチェック間隔（秒）
+
+# エクスポートの同時実行制御（イベントループ外で実行）
+EXPORT_MAX_CONCURRENCY = int(os.environ.get("EXPORT_MAX_CONCURRENCY", str(max(MARP_POOL_SIZE, 1))))
+EXPORT_MAX_QUEUE_DEPTH = int(os.environ.get("EXPORT_MAX_QUEUE_DEPTH", "8"))  # これ以上待ちがあれば混雑として拒否
+
+# エクスポートの作業領域（一時ファイル）
+EXPORT_SCRATCH_DIR = os.environ.get("EXPORT_SCRATCH_DIR", "")  # 空なら既定（一時ディレクトリ配下）
+EXPORT_SCRATCH_TMPFS = os.environ.get("EXPORT_SCRATCH_TMPFS", "") == "1"  # 1ならtmpfs（/dev/shm）を使う
+SCRATCH_JANITOR_INTERVAL = float(os.environ.get("SCRATCH_JANITOR_INTERVAL", "300"))  # 孤児掃除の間隔（秒、0で無効）
+SCRATCH_ORPHAN_MAX_AGE = float(os.environ.get("SCRATCH_ORPHAN_MAX_AGE", "3600"))  # 自プロセスの作業領域で使用中でなければ、これより古いものは解放漏れとして削除
+
+# エクスポート結果の配信
+EXPORT_CHUNK_SIZE = 3 * 64 * 1024  # チャンク配信時の1チャンクのバイト数（3の倍数でBase64を連結可能にする）
+EXPORT_URL_EXPIRES = int(os.environ.get("EXPORT_URL_EXPIRES", "3600"))  # 署名付きURLの有効期限（秒）
+
+# エクスポート結果キャッシュ（ディスクLRU）
+EXPORT_CACHE_DIR = os.environ.get("EXPORT_CACHE_DIR", "/tmp/marp-export-cache")
+EXPORT_CACHE_MAX_BYTES = int(os.environ.get("EXPORT_CACHE_MAX_BYTES", str(256 * 1024 * 1024)))  # 0でキャッシュ無効
+EXPORT_CACHE_TTL = float(os.environ.get("EXPORT_CACHE_TTL", str(24 * 60 * 60)))  # 秒
+
+# PDFのスライド単位キャッシュ（変更されたスライドだけを再レンダリングして結合）
+INCREMENTAL_PDF_MIN_SLIDES = int(os.environ.get("INCREMENTAL_PDF_MIN_SLIDES", "4"))  # これ未満のデッキは全体を変換（0で無効）
+INCREMENTAL_PDF_MAX_CHANGED_RATIO = float(os.environ.get("INCREMENTAL_PDF_MAX_CHANGED_RATIO", "0.5"))  # これを超えて変更があれば全体を変換
+
+# デッキの事前チェック（output_slide の結果とエクスポート前）
+DECK_MAX_BODY_LINES = int(os.environ.get("DECK_MAX_BODY_LINES", "8"))  # タイトルを除いた本文の行数の上限（システムプロンプトのルール）
+
+# スライド共有のS3アップロード
+SHARE_UPLOAD_POOL_SIZE = int(os.environ.get("SHARE_UPLOAD_POOL_SIZE", "10"))  # S3接続プール・アップロードスレッド数
+SHARE_HTML_ENCODING = os.environ.get("SHARE_HTML_ENCODING", "gzip")  # "gzip" / ""（無圧縮）。CloudFrontはそのまま配信する
+
+# セッションストア（会話履歴を持つAgentの保持上限）
+SESSION_MAX_ENTRIES = int(os.environ.get("SESSION_MAX_ENTRIES", "200"))
+SESSION_IDLE_TTL = float(os.environ.get("SESSION_IDLE_TTL", str(60 * 60)))  # 最終アクセスからの保持時間（秒）
+SESSION_MEMORY_BUDGET_BYTES = int(os.environ.get("SESSION_MEMORY_BUDGET_BYTES", "0"))  # 会話履歴の合計上限（0で無効）
+
+# モデルクライアントのプール（model_typeごとにプロセスで共有）
+MODEL_CLIENT_MAX_CONNECTIONS = int(os.environ.get("MODEL_CLIENT_MAX_CONNECTIONS", "50"))  # 1クライアントあたりの接続プール上限
+MODEL_WARMUP_TYPES = [t for t in os.environ.get("MODEL_WARMUP_TYPES", "nova").split(",") if t]  # 起動時に作成・接続しておくモデル
+
+# Web検索（Tavily）
+TAVILY_API_BASE_URL = os.environ.get("TAVILY_API_BASE_URL") or None  # ローカルの偽Tavilyサーバー等に向ける場合に指定
+TAVILY_HEDGE_DELAY = float(os.environ.get("TAVILY_HEDGE_DELAY", "0"))  # この秒数応答がなければ別キーでも並行検索（0で無効。ヘッジした分も枠を消費する）
+TAVILY_KEY_COOLDOWN = float(os.environ.get("TAVILY_KEY_COOLDOWN", "60"))  # レート制限されたキーを休ませる秒数
+TAVILY_MONTHLY_QUOTA = int(os.environ.get("TAVILY_MONTHLY_QUOTA", "5000"))  # キー1本あたりの月間上限（無料枠、TAVILY_REQUEST_COSTと同じ単位）
+TAVILY_SEARCH_DEPTH = os.environ.get("TAVILY_SEARCH_DEPTH", "advanced")  # "basic" / "advanced"
+# 1リクエストで月間上限から差し引く量（advancedはbasicの2倍として計上）
+TAVILY_REQUEST_COST = int(os.environ.get("TAVILY_REQUEST_COST", "2" if TAVILY_SEARCH_DEPTH == "advanced" else "1"))
+TAVILY_QUOTA_HEADROOM = float(os.environ.get("TAVILY_QUOTA_HEADROOM", "0.95"))  # 上限のこの割合に達したら他のキーへ切り替え
+TAVILY_USAGE_PATH = os.environ.get("TAVILY_USAGE_PATH", "/tmp/tavily-usage.json")  # 月間カウンタの保存先（空なら保存しない）
+TAVILY_USAGE_FLUSH_INTERVAL = float(os.environ.get("TAVILY_USAGE_FLUSH_INTERVAL", "5"))  # 月間カウンタをまとめて保存する間隔（秒、0なら計上のたびに保存）
+
+# 検索結果キャッシュ
+SEARCH_CACHE_MAX_ENTRIES = int(os.environ.get("SEARCH_CACHE_MAX_ENTRIES", "500"))  # 0でキャッシュ無効
+SEARCH_CACHE_TTL = float(os.environ.get("SEARCH_CACHE_TTL", str(6 * 60 * 60)))  # 秒
+SEARCH_CACHE_PATH = os.environ.get("SEARCH_CACHE_PATH", "")  # SQLiteファイルのパス（空ならメモリのみ）
+
+# 会話履歴の圧縮
+HISTORY_TOKEN_BUDGET = int(os.environ.get("HISTORY_TOKEN_BUDGET", "20000"))  # これを超えた古いターンは要約
+HISTORY_SUMMARY_MAX_LINES = 30  # 要約に残す発言数の上限
+HISTORY_SUMMARY_LINE_CHARS = 100  # 要約の1発言あたりの最大文字数
 
 
 def get_model_config(model_type: str = "nova") -> dict:
@@ -107,8 +183,13 @@ web_searchツールがエラーを返した場合（「検索エラー」「API
 スライドを作成・編集したら、必ず output_slide ツールを使ってマークダウンを出力してください。
 テキストでマークダウンを直接書き出さないでください。output_slide ツールに渡すマークダウンには、フロントマターを含む完全なMarp形式のマークダウンを指定してください。
 
+既存のスライドの一部だけを修正する場合（誤字の修正、数枚の書き換え・追加・削除・並べ替え）は、デッキ全体を出力し直さず patch_slides ツールで変更するスライドだけを指定してください。
+スライド番号は現在のスライドの1始まりの番号です（同じターンで続けて修正する場合は、直前の修正後のデッキの番号）。フロントマターの変更やデッキの大部分の作り直しは output_slide を使ってください。
+
+ツールの結果に「次の問題が見つかりました」とある場合は、同じターンのうちに指摘されたスライドを patch_slides で修正してください。
+
 ## スライド出力後の返答について
-output_slide ツールでスライドを出力した直後は、以下の場合を除きテキストメッセージを生成しないでください：
+output_slide / patch_slides ツールでスライドを出力した直後は、以下の場合を除きテキストメッセージを生成しないでください：
 - Web検索などのツール実行がエラーで失敗した
 - ユーザーが追加で質問や修正指示をしている
 「スライドが完成しました」「以下の構成で〜」などのサマリーメッセージは不要です。
@@ -0,0 +1,18 @@
+"""Marpマークダウンのデッキ構造（フロントマター・スライド・ディレクティブ）"""
+
+from .parser import Deck, Slide, parse_deck
+from .patch import SlidePatchError, apply_slide_patch
+from .analyzer import DeckFinding, DeckValidationError, analyze_deck, check_exportable, format_findings
+
+__all__ = [
+    "Deck",
+    "Slide",
+    "parse_deck",
+    "SlidePatchError",
+    "apply_slide_patch",
+    "DeckFinding",
+    "DeckValidationError",
+    "analyze_deck",
+    "check_exportable",
+    "format_findings",
+]
@@ -0,0 +1,177 @@
+"""Marpマークダウンの事前チェック（レンダリング前に崩れやすい書き方を見つける）
+
+Marpを起動せずに、フロントマターの不備・本文のはみ出し・絵文字を検出する。
+output_slide の結果としてモデルに返して同じターンで直させるほか、
+エクスポート前に明らかに壊れたデッキを弾くのに使う。
+"""
+
+import re
+from dataclasses import dataclass
+
+from config import DECK_MAX_BODY_LINES
+from .parser import parse_deck
+
+_SEPARATOR = "---"
+_CODE_FENCE = re.compile(r"^ {0,3}(```|~~~)")
+_HEADING = re.compile(r"^ {0,3}#{1,6}(\s|$)")
+_FRONT_MATTER_LINE = re.compile(r"^(?:[A-Za-z_][\w-]*\s*:(?:\s.*)?|\s+\S.*|-\s.*|#.*)$")
+_MARP_ENABLED = re.compile(r"^marp\s*:\s*true\s*$", re.MULTILINE)
+# 表の区切り行・背景画像だけの行は本文の行として数えない
+_TABLE_DELIMITER = re.compile(r"^\s*\|?\s*:?-+:?\s*(\|\s*:?-+:?\s*)*\|?\s*$")
+_BACKGROUND_IMAGE = re.compile(r"^\s*(!\[bg[^\]]*\]\([^)]*\)\s*)+$")
+_STYLE_OPEN = re.compile(r"<style\b", re.IGNORECASE)
+_STYLE_CLOSE = re.compile(r"</style>", re.IGNORECASE)
+# Marpが絵文字画像に置き換える文字（Emoji_Presentationの文字と、異体字セレクタ付きの記号）
+_EMOJI = re.compile(
+    "[\U0001F000-\U0001FAFF]"
+    "|[\u2190-\u21FF\u2300-\u27BF\u2B00-\u2BFF]\uFE0F"
+    "|[\u231A\u231B\u23E9-\u23EC\u23F0\u23F3\u25FD\u25FE\u2614\u2615\u2648-\u2653\u267F\u2693"
+    "\u26A1\u26AA\u26AB\u26BD\u26BE\u26C4\u26C5\u26CE\u26D4\u26EA\u26F2\u26F3\u26F5\u26FA\u26FD"
+    "\u2705\u270A\u270B\u2728\u274C\u274E\u2753-\u2755\u2757\u2795-\u2797\u27B0\u27BF"
+    "\u2B1B\u2B1C\u2B50\u2B55]"
+)
+
+
+@dataclass
+class DeckFinding:
+    """事前チェックで見つかった問題"""
+
+    code: str  # front_matter / overflow / emoji / empty_slide
+    message: str
+    slide: int | None = None  # 1始まりのスライド番号（デッキ全体の問題ならNone）
+    # Trueならエクスポートしても崩れた出力にしかならない
+    blocking: bool = False
+
+    def describe(self) -> str:
+        return f"{self.slide}枚目: {self.message}" if self.slide is not None else self.message
+
+
+class DeckValidationError(ValueError):
+    """エクスポートできないデッキ（フロントマターが壊れているなど）"""
+
+    def __init__(self, findings: list[DeckFinding]):
+        self.findings = findings
+        super().__init__("スライドをエクスポートできません: " + " / ".join(f.describe() for f in findings))
+
+
+def _check_front_matter(lines: list[str]) -> list[DeckFinding]:
+    if not lines or lines[0].strip() != _SEPARATOR:
+        first = next((line for line in lines if line.strip()), "")
+        if first.strip() == _SEPARATOR:
+            # 先頭に空行があると --- はスライド区切りになり、フロントマターが1枚目の本文として表示される
+            return [DeckFinding("front_matter", "フロントマターの前に空行があります（1行目を --- にしてください）")]
+        return [DeckFinding("front_matter", "フロントマターがありません（marp: true などを --- で囲んで先頭に置いてください）")]
+
+    end = next((i for i in range(1, len(lines)) if lines[i].strip() == _SEPARATOR), None)
+    if end is None:
+        return [DeckFinding("front_matter", "フロントマターが --- で閉じられていません", blocking=True)]
+
+    findings = []
+    for line in lines[1:end]:
+        if line.strip() and not _FRONT_MATTER_LINE.match(line):
+            findings.append(DeckFinding(
+                "front_matter", f"フロントマターの行「{line.strip()[:30]}」が key: value の形式ではありません", blocking=True
+            ))
+    if not _MARP_ENABLED.search("\n".join(lines[1:end])):
+        findings.append(DeckFinding("front_matter", "フロントマターに marp: true がありません"))
+    return findings
+
+
+def _count_body_lines(body: str) -> int:
+    """タイトル（最初の見出し）・コメント・スタイル・空行を除いた行数"""
+    count = 0
+    title_seen = False
+    in_comment = in_style = False
+    fence: str | None = None
+    for line in body.split("\n"):
+        stripped = line.strip()
+        if not stripped:
+            continue
+        # 正規表現は先頭の文字で候補を絞ってから使う
+        head = stripped[0]
+        if head in "`~":
+            fence_match = _CODE_FENCE.match(line)
+            if fence_match:
+                # コードブロックは中身の行だけを数える
+                marker = fence_match.group(1)
+                fence = None if fence == marker else (fence or marker)
+                continue
+        if fence is not None:
+            count += 1
+            continue
+        if in_comment:
+            in_comment = "-->" not in stripped
+            continue
+        if in_style:
+            in_style = not _STYLE_CLOSE.search(stripped)
+            continue
+        if head == "<":
+            if stripped.startswith("<!--"):
+                in_comment = "-->" not in stripped
+                continue
+            if _STYLE_OPEN.match(stripped):
+                in_style = not _STYLE_CLOSE.search(stripped)
+                continue
+        elif head in "|:-" and _TABLE_DELIMITER.match(stripped):
+            continue
+        elif head == "!" and _BACKGROUND_IMAGE.match(stripped):
+            continue
+        elif head == "#" and not title_seen and _HEADING.match(line):
+            title_seen = True
+            continue
+        count += 1
+    return count
+
+
+def _find_emoji(body: str) -> list[str]:
+    # ほとんどのスライドには絵文字がないので、先に全体を1回だけ検索する
+    if not _EMOJI.search(body):
+        return []
+    found = []
+    fence: str | None = None
+    for line in body.split("\n"):
+        fence_match = _CODE_FENCE.match(line)
+        if fence_match:
+            marker = fence_match.group(1)
+            fence = None if fence == marker else (fence or marker)
+        elif fence is None:
+            found.extend(_EMOJI.findall(line))
+    return found
+
+
+def analyze_deck(markdown: str) -> list[DeckFinding]:
+    """デッキの問題を検出する（見つからなければ空のリスト）"""
+    lines = markdown.replace("\r\n", "\n").split("\n")
+    findings = _check_front_matter(lines)
+
+    deck = parse_deck(markdown)
+    for slide in deck.slides:
+        number = slide.index + 1
+        if not slide.body.strip():
+            # フロントマターとして読めなかった先頭の --- はフロントマターの問題として報告済み
+            if slide.index > 0 or deck.front_matter is not None:
+                findings.append(DeckFinding("empty_slide", "スライドが空です（不要な区切り線 --- があります）", number))
+            continue
+        body_lines = _count_body_lines(slide.body)
+        if body_lines > DECK_MAX_BODY_LINES:
+            findings.append(DeckFinding(
+                "overflow", f"本文が{body_lines}行あります（タイトルを除いて{DECK_MAX_BODY_LINES}行以内）", number
+            ))
+        emoji = _find_emoji(slide.body)
+        if emoji:
+            findings.append(DeckFinding("emoji", f"絵文字（{''.join(dict.fromkeys(emoji))}）が含まれています", number))
+    return findings
+
+
+def check_exportable(markdown: str) -> None:
+    """エクスポートしても崩れた出力にしかならないデッキなら DeckValidationError を送出"""
+    blocking = [finding for finding in analyze_deck(markdown) if finding.blocking]
+    if blocking:
+        raise DeckValidationError(blocking)
+
+
+def format_findings(findings: list[DeckFinding]) -> str:
+    """モデルに返す修正依頼（ツールの結果に付ける）"""
+    lines = ["次の問題が見つかりました。フロントマターは output_slide、スライドは patch_slides で修正してください。"]
+    lines.extend(f"- {finding.describe()}" for finding in findings)
+    return "\n".join(lines)
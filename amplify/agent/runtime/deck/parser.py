@@ -0,0 +1,178 @@
+"""Marpマークダウンをフロントマターとスライドに分割し、ディレクティブを読み取る
+
+スライド単位の処理（差分エクスポートなど）で使う。Marpと分割結果が食い違う
+可能性のある書き方を見つけた場合は Deck.issues に理由を残し、呼び出し側は
+デッキ全体での処理に切り替える。
+"""
+
+import re
+from dataclasses import dataclass, field
+
+# スライドごとに指定でき、以降のスライドにも引き継がれるディレクティブ
+LOCAL_DIRECTIVES = {
+    "paginate",
+    "header",
+    "footer",
+    "class",
+    "backgroundColor",
+    "backgroundImage",
+    "backgroundPosition",
+    "backgroundRepeat",
+    "backgroundSize",
+    "color",
+}
+# デッキ全体に効くディレクティブ（フロントマター以外に書かれるとスライド単位で扱えない）
+GLOBAL_DIRECTIVES = {
+    "theme",
+    "style",
+    "headingDivider",
+    "size",
+    "math",
+    "marp",
+    "lang",
+    "title",
+    "author",
+    "description",
+    "keywords",
+    "url",
+    "image",
+}
+
+_SEPARATOR = "---"
+_CODE_FENCE = re.compile(r"^ {0,3}(```|~~~)")
+# ---以外の水平線（***, ___, ----, - - - など）もMarpではスライド区切りになる
+_THEMATIC_BREAK = re.compile(r"^ {0,3}([-*_])(?: *\1){2,} *$")
+_COMMENT = re.compile(r"<!--(.*?)-->", re.DOTALL)
+_DIRECTIVE_LINE = re.compile(r"^\s*(_?)([A-Za-z]+)\s*:\s*(.*?)\s*$")
+_GLOBAL_STYLE = re.compile(r"<style(?![^>]*\bscoped\b)[^>]*>", re.IGNORECASE)
+
+
+@dataclass
+class Slide:
+    """1枚分のスライド"""
+
+    index: int
+    body: str
+    # このスライドで指定され、以降にも引き継がれるディレクティブ
+    directives: dict[str, str] = field(default_factory=dict)
+    # _付きでこのスライドだけに効くディレクティブ（キーは_なし）
+    spot_directives: dict[str, str] = field(default_factory=dict)
+
+
+@dataclass
+class Deck:
+    """フロントマターとスライドの列"""
+
+    front_matter: str | None
+    global_directives: dict[str, str]
+    slides: list[Slide]
+    # スライド単位で扱うとMarpの出力と食い違う可能性がある理由
+    issues: list[str] = field(default_factory=list)
+
+    @property
+    def splittable(self) -> bool:
+        return not self.issues
+
+    def inherited_directives(self, index: int) -> dict[str, str]:
+        """index番目のスライドの手前までに指定され、引き継がれているディレクティブ"""
+        inherited: dict[str, str] = {}
+        for slide in self.slides[:index]:
+            inherited.update(slide.directives)
+        return inherited
+
+    def effective_directive(self, index: int, name: str) -> str | None:
+        """index番目のスライドで有効なディレクティブの値"""
+        slide = self.slides[index]
+        if name in slide.spot_directives:
+            return slide.spot_directives[name]
+        if name in slide.directives:
+            return slide.directives[name]
+        inherited = self.inherited_directives(index)
+        if name in inherited:
+            return inherited[name]
+        return self.global_directives.get(name)
+
+    def standalone_slide(self, index: int, extra: str = "") -> str:
+        """index番目のスライドだけを、デッキ内と同じ見た目になる1枚のデッキとして返す
+
+        フロントマターと、手前のスライドから引き継がれるディレクティブを付ける。
+        """
+        parts = []
+        if self.front_matter is not None:
+            parts.append(f"{_SEPARATOR}\n{self.front_matter}\n{_SEPARATOR}\n")
+        inherited = self.inherited_directives(index)
+        if inherited:
+            lines = "\n".join(f"{name}: {value}" for name, value in inherited.items())
+            parts.append(f"<!--\n{lines}\n-->\n")
+        if extra:
+            parts.append(f"{extra}\n")
+        parts.append(self.slides[index].body)
+        return "\n".join(parts)
+
+
+def _parse_directives(text: str) -> dict[str, str]:
+    """key: value 形式の行を読み取る（YAMLのうちディレクティブで使う範囲のみ）"""
+    directives = {}
+    for line in text.split("\n"):
+        match = _DIRECTIVE_LINE.match(line)
+        if match:
+            directives[match.group(1) + match.group(2)] = match.group(3)
+    return directives
+
+
+def _read_slide(index: int, lines: list[str], issues: list[str]) -> Slide:
+    body = "\n".join(lines).strip("\n")
+    slide = Slide(index=index, body=body)
+    for comment in _COMMENT.finditer(body):
+        for name, value in _parse_directives(comment.group(1)).items():
+            spot = name.startswith("_")
+            key = name[1:] if spot else name
+            if key in GLOBAL_DIRECTIVES:
+                issues.append(f"slide {index + 1}: global directive '{key}' outside front matter")
+            elif key in LOCAL_DIRECTIVES:
+                if key == "paginate" and value not in ("true", "false"):
+                    issues.append(f"slide {index + 1}: paginate '{value}' changes page numbering")
+                (slide.spot_directives if spot else slide.directives)[key] = value
+    if _GLOBAL_STYLE.search(body):
+        issues.append(f"slide {index + 1}: <style> without scoped applies to the whole deck")
+    return slide
+
+
+def parse_deck(markdown: str) -> Deck:
+    """マークダウンをフロントマターとスライドに分割"""
+    lines = markdown.replace("\r\n", "\n").split("\n")
+    issues: list[str] = []
+    index = 0
+
+    front_matter = None
+    global_directives: dict[str, str] = {}
+    if lines and lines[0].strip() == _SEPARATOR:
+        end = next((i for i in range(1, len(lines)) if lines[i].strip() == _SEPARATOR), None)
+        if end is not None:
+            front_matter = "\n".join(lines[1:end])
+            global_directives = _parse_directives(front_matter)
+            index = end + 1
+    if "headingDivider" in global_directives:
+        issues.append("headingDivider splits slides at headings")
+
+    slides: list[Slide] = []
+    current: list[str] = []
+    fence: str | None = None
+    for line in lines[index:]:
+        fence_match = _CODE_FENCE.match(line)
+        if fence_match:
+            marker = fence_match.group(1)
+            fence = None if fence == marker else (fence or marker)
+        elif fence is None and _THEMATIC_BREAK.match(line):
+            if line.strip() != _SEPARATOR:
+                issues.append(f"slide {len(slides) + 1}: non-standard separator '{line.strip()}'")
+            elif current and current[-1].strip():
+                # 直前が空行でない --- は見出し（setext）になる
+                issues.append(f"slide {len(slides) + 1}: '---' directly after text")
+            slides.append(_read_slide(len(slides), current, issues))
+            current = []
+            continue
+        current.append(line)
+    slides.append(_read_slide(len(slides), current, issues))
+
+    return Deck(front_matter=front_matter, global_directives=global_directives, slides=slides, issues=issues)
@@ -0,0 +1,106 @@
+"""スライド単位の修正（置換・挿入・削除・並べ替え）をデッキに適用する"""
+
+from .parser import parse_deck
+
+_SEPARATOR = "---"
+
+
+class SlidePatchError(ValueError):
+    """修正操作が不正（スライド番号の範囲外・必須項目の不足など）"""
+
+
+def _slide_text(operation: dict, number: int) -> str:
+    text = operation.get("markdown")
+    if not isinstance(text, str) or not text.strip():
+        raise SlidePatchError(f"操作{number}: markdown を指定してください")
+    lines = text.strip().split("\n")
+    # 前後に付けられた区切り線は不要
+    while lines and lines[0].strip() == _SEPARATOR:
+        lines.pop(0)
+    while lines and lines[-1].strip() == _SEPARATOR:
+        lines.pop()
+    return "\n".join(lines).strip("\n")
+
+
+def _slide_index(operation: dict, number: int, upper: int) -> int:
+    index = operation.get("index")
+    if isinstance(index, bool) or not isinstance(index, int) or not 1 <= index <= upper:
+        raise SlidePatchError(f"操作{number}: index は1〜{upper}の整数で指定してください（指定値: {index!r}）")
+    return index
+
+
+def apply_slide_patch(markdown: str, operations: list[dict]) -> str:
+    """デッキに修正操作を適用した結果のマークダウンを返す
+
+    スライド番号（1始まり）はすべて修正前のデッキの番号で指定する。
+
+    - {"op": "replace", "index": n, "markdown": "..."}: n枚目を置き換え
+    - {"op": "insert", "index": n, "markdown": "..."}: n枚目の前に挿入（スライド数+1で末尾）
+    - {"op": "delete", "index": n}: n枚目を削除
+    - {"op": "reorder", "order": [...]}: 修正前のスライド番号を新しい順に並べる（全スライドを1回ずつ）
+
+    Raises:
+        SlidePatchError: 操作が不正な場合、またはスライド単位で分割できないデッキの場合
+    """
+    deck = parse_deck(markdown)
+    # setext見出しやスライド途中のグローバルディレクティブがあると、区切り線で分けたスライドがMarpの解釈と食い違う
+    if not deck.splittable:
+        raise SlidePatchError(
+            f"このデッキはスライド単位で修正できません（{'; '.join(deck.issues)}）。"
+            "output_slide でデッキ全体を出力してください"
+        )
+    count = len(deck.slides)
+    if not operations:
+        raise SlidePatchError("operations が空です")
+
+    replacements: dict[int, str] = {}
+    deletions: set[int] = set()
+    insertions: dict[int, list[str]] = {}
+    order = list(range(1, count + 1))
+    reordered = False
+
+    for number, operation in enumerate(operations, start=1):
+        if not isinstance(operation, dict):
+            raise SlidePatchError(f"操作{number}: オブジェクトで指定してください")
+        op = operation.get("op")
+        if op == "replace":
+            index = _slide_index(operation, number, count)
+            if index in replacements or index in deletions:
+                raise SlidePatchError(f"操作{number}: {index}枚目は既に変更されています")
+            replacements[index] = _slide_text(operation, number)
+        elif op == "insert":
+            index = _slide_index(operation, number, count + 1)
+            insertions.setdefault(index, []).append(_slide_text(operation, number))
+        elif op == "delete":
+            index = _slide_index(operation, number, count)
+            if index in replacements or index in deletions:
+                raise SlidePatchError(f"操作{number}: {index}枚目は既に変更されています")
+            deletions.add(index)
+        elif op == "reorder":
+            new_order = operation.get("order")
+            if reordered:
+                raise SlidePatchError(f"操作{number}: reorder は1回だけ指定できます")
+            if (
+                not isinstance(new_order, list)
+                or any(isinstance(value, bool) or not isinstance(value, int) for value in new_order)
+                or sorted(new_order) != order
+            ):
+                raise SlidePatchError(f"操作{number}: order には1〜{count}の整数を1回ずつ並べてください（指定値: {new_order!r}）")
+            order = new_order
+            reordered = True
+        else:
+            raise SlidePatchError(f"操作{number}: op は replace / insert / delete / reorder のいずれかです（指定値: {op!r}）")
+
+    # 挿入したスライドは、挿入位置に指定したスライドの直前に置く（並べ替え後も同じスライドに付いていく）
+    bodies: list[str] = []
+    for index in order:
+        bodies.extend(insertions.get(index, []))
+        if index in deletions:
+            continue
+        bodies.append(replacements.get(index, deck.slides[index - 1].body))
+    bodies.extend(insertions.get(count + 1, []))
+    if not bodies:
+        raise SlidePatchError("すべてのスライドを削除することはできません")
+
+    head = f"{_SEPARATOR}\n{deck.front_matter}\n{_SEPARATOR}\n\n" if deck.front_matter is not None else ""
+    return head + f"\n\n{_SEPARATOR}\n\n".join(bodies) + "\n"
@@ -5,11 +5,34 @@ from .slide_exporter import (
     generate_pptx,
     generate_standalone_html,
     generate_thumbnail,
+    generate_share_assets,
+    generate_batch,
+    open_export,
 )
+from .renderer_pool import get_renderer_pool
+from .export_cache import get_export_cache
+from .export_runner import ExportBusyError, run_export, get_export_stats
+from .delivery import stream_export_chunks, chunk_events
+from .batch import BATCH_FORMATS, stream_export_batch
+from .scratch import get_scratch_usage, sweep_orphans
 
 __all__ = [
     "generate_pdf",
     "generate_pptx",
     "generate_standalone_html",
     "generate_thumbnail",
+    "generate_share_assets",
+    "generate_batch",
+    "open_export",
+    "get_renderer_pool",
+    "get_export_cache",
+    "ExportBusyError",
+    "run_export",
+    "get_export_stats",
+    "stream_export_chunks",
+    "chunk_events",
+    "BATCH_FORMATS",
+    "stream_export_batch",
+    "get_scratch_usage",
+    "sweep_orphans",
 ]
@@ -0,0 +1,53 @@
+"""複数形式の一括エクスポート（1回のレンダラーセッションで変換し、形式ごとに揃った順に返す）"""
+
+import asyncio
+from typing import AsyncIterator
+
+from config import MARP_JOB_TIMEOUT
+from .export_runner import run_export
+from .slide_exporter import generate_batch
+
+# 一括エクスポートで扱える形式（HTMLタグを許可しない同じレンダラー設定で変換できるもの）
+BATCH_FORMATS = ("pdf", "pptx")
+
+
+async def stream_export_batch(markdown: str, formats: list[str], theme: str = 'gradient') -> AsyncIterator[tuple[str, bytes]]:
+    """同じデッキを複数の形式に変換し、変換が終わった形式から (形式, バイト列) を返す
+
+    変換はイベントループ外で実行し、エクスポートの同時実行数の枠は1つだけ使う。
+
+    Raises:
+        ExportBusyError: 待ち行列が上限に達している場合
+    """
+    loop = asyncio.get_running_loop()
+    completed: asyncio.Queue[tuple[int, bytes]] = asyncio.Queue()
+
+    def on_result(index: int, data: bytes) -> None:
+        loop.call_soon_threadsafe(completed.put_nowait, (index, data))
+
+    # 形式の数だけ変換するので、1形式分の上限に比例させる
+    timeout = MARP_JOB_TIMEOUT * (len(formats) + 1) + 10
+    task = asyncio.ensure_future(run_export(generate_batch, markdown, formats, theme, on_result, timeout=timeout))
+    # 途中で読むのをやめた場合も変換は最後まで続く（結果はキャッシュに残る）
+    task.add_done_callback(lambda t: t.cancelled() or t.exception())
+
+    emitted: set[int] = set()
+    while True:
+        getter = asyncio.ensure_future(completed.get())
+        try:
+            await asyncio.wait({getter, task}, return_when=asyncio.FIRST_COMPLETED)
+        except BaseException:
+            getter.cancel()
+            raise
+        if not getter.done():
+            getter.cancel()
+            break
+        index, data = getter.result()
+        emitted.add(index)
+        yield formats[index], data
+
+    # 変換の失敗はここで送出。通知より先に完了した分は結果のリストから返す
+    results = await task
+    for index, data in enumerate(results):
+        if index not in emitted:
+            yield formats[index], data
@@ -0,0 +1,57 @@
+"""エクスポート結果のチャンク配信（巨大なBase64イベント1つの代わりに固定サイズで分割）"""
+
+import asyncio
+import base64
+import hashlib
+import os
+from typing import AsyncIterator, BinaryIO
+
+from config import EXPORT_CHUNK_SIZE
+from .export_runner import run_export
+from .slide_exporter import open_export
+
+
+async def stream_export_chunks(markdown: str, output_format: str, theme: str = 'gradient') -> AsyncIterator[dict]:
+    """変換結果をBase64チャンクのイベント列として配信
+
+    イベント:
+        export_start: {"format", "size", "chunkSize"}
+        export_chunk: {"format", "seq", "data"}（dataは各チャンクのBase64）
+        export_end:   {"format", "chunks", "size", "sha256"}（元バイト列のSHA-256）
+
+    ファイルから1チャンクずつ読むため、ピークメモリはデッキのサイズによらない。
+    """
+    file = await run_export(open_export, markdown, output_format, theme)
+    try:
+        async for event in chunk_events(file, os.fstat(file.fileno()).st_size, output_format):
+            yield event
+    finally:
+        file.close()
+
+
+async def chunk_events(file: BinaryIO, size: int, output_format: str) -> AsyncIterator[dict]:
+    """開いたファイル（またはBytesIO）の内容をチャンクのイベント列にする（閉じるのは呼び出し側）"""
+    yield {"type": "export_start", "format": output_format, "size": size, "chunkSize": EXPORT_CHUNK_SIZE}
+
+    digest = hashlib.sha256()
+    seq = 0
+    while True:
+        chunk = await asyncio.to_thread(file.read, EXPORT_CHUNK_SIZE)
+        if not chunk:
+            break
+        digest.update(chunk)
+        yield {
+            "type": "export_chunk",
+            "format": output_format,
+            "seq": seq,
+            "data": base64.b64encode(chunk).decode("ascii"),
+        }
+        seq += 1
+
+    yield {
+        "type": "export_end",
+        "format": output_format,
+        "chunks": seq,
+        "size": size,
+        "sha256": digest.hexdigest(),
+    }
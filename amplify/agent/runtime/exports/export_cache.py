@@ -0,0 +1,183 @@
+"""エクスポート結果キャッシュ（マークダウン・テーマCSS・出力形式のハッシュをキーにしたディスクLRU）"""
+
+import hashlib
+import os
+import shutil
+import threading
+import time
+from collections import OrderedDict
+from pathlib import Path
+from typing import BinaryIO
+
+from config import EXPORT_CACHE_DIR, EXPORT_CACHE_MAX_BYTES, EXPORT_CACHE_TTL
+from .renderer_pool import resolve_theme_path
+
+
+def _sha256(data: bytes) -> str:
+    return hashlib.sha256(data).hexdigest()
+
+
+# テーマCSSのハッシュ（パスと更新時刻ごとにメモ化）
+_theme_hashes: dict[tuple[str, float], str] = {}
+
+
+def theme_hash(theme: str) -> str:
+    """テーマCSSの内容ハッシュを返す（CSSファイルがなければテーマ名のハッシュ）"""
+    theme_path = resolve_theme_path(theme)
+    if not theme_path:
+        return _sha256(f"theme:{theme}".encode("utf-8"))
+    memo_key = (str(theme_path), theme_path.stat().st_mtime)
+    if memo_key not in _theme_hashes:
+        _theme_hashes[memo_key] = _sha256(theme_path.read_bytes())
+    return _theme_hashes[memo_key]
+
+
+def make_cache_key(markdown: str, theme: str, output_format: str) -> str:
+    """キャッシュキーを生成（マークダウンのハッシュ + テーマCSSのハッシュ + 出力形式）"""
+    markdown_hash = _sha256(markdown.encode("utf-8"))
+    return f"{markdown_hash[:32]}-{theme_hash(theme)[:16]}-{output_format}"
+
+
+class ExportCache:
+    """レンダリング済みバイト列のディスクLRUキャッシュ（容量上限・TTL付き）"""
+
+    def __init__(
+        self,
+        cache_dir: str | Path = EXPORT_CACHE_DIR,
+        max_bytes: int = EXPORT_CACHE_MAX_BYTES,
+        ttl: float = EXPORT_CACHE_TTL,
+    ):
+        self._dir = Path(cache_dir)
+        self._dir.mkdir(parents=True, exist_ok=True)
+        self._max_bytes = max_bytes
+        self._ttl = ttl
+        self._lock = threading.Lock()
+        # キー -> (サイズ, 書き込み時刻)。先頭ほど古くアクセスされたもの
+        self._entries: OrderedDict[str, tuple[int, float]] = OrderedDict()
+        self._total_bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._load_index()
+
+    def _path(self, key: str) -> Path:
+        return self._dir / f"{key}.bin"
+
+    def _load_index(self) -> None:
+        """既存のキャッシュファイルを最終アクセス順に読み込む（再起動後も再利用）"""
+        files = []
+        for path in self._dir.glob("*.bin"):
+            stat = path.stat()
+            files.append((stat.st_atime, path.stem, stat.st_size, stat.st_mtime))
+        for _, key, size, written_at in sorted(files):
+            self._entries[key] = (size, written_at)
+            self._total_bytes += size
+        self._evict_locked()
+
+    def _remove_locked(self, key: str) -> None:
+        size, _ = self._entries.pop(key)
+        self._total_bytes -= size
+        self._path(key).unlink(missing_ok=True)
+
+    def _evict_locked(self) -> None:
+        """期限切れと容量超過のエントリを削除"""
+        now = time.time()
+        for key in [k for k, (_, written_at) in self._entries.items() if now - written_at > self._ttl]:
+            self._remove_locked(key)
+            self.evictions += 1
+        while self._entries and self._total_bytes > self._max_bytes:
+            self._remove_locked(next(iter(self._entries)))
+            self.evictions += 1
+
+    def _lookup_locked(self, key: str) -> bool:
+        """有効なエントリがあればLRU順を更新してTrue（期限切れ・ファイル消失は削除してFalse）"""
+        entry = self._entries.get(key)
+        if entry is not None and time.time() - entry[1] > self._ttl:
+            self._remove_locked(key)
+            self.evictions += 1
+            entry = None
+        if entry is not None and not self._path(key).exists():
+            self._remove_locked(key)
+            entry = None
+        if entry is None:
+            self.misses += 1
+            return False
+        # 再起動後のLRU順復元用にアクセス時刻だけ更新（TTL判定用の書き込み時刻は維持）
+        os.utime(self._path(key), (time.time(), entry[1]))
+        self._entries.move_to_end(key)
+        self.hits += 1
+        return True
+
+    def get(self, key: str) -> bytes | None:
+        """キャッシュ済みのバイト列を返す（なければNone）"""
+        with self._lock:
+            if not self._lookup_locked(key):
+                return None
+            return self._path(key).read_bytes()
+
+    def open(self, key: str) -> BinaryIO | None:
+        """キャッシュ済みのファイルを開く（なければNone）
+
+        開いた後に追い出されてもファイルハンドルからは最後まで読める。
+        """
+        with self._lock:
+            if not self._lookup_locked(key):
+                return None
+            return open(self._path(key), "rb")
+
+    def put_file(self, key: str, src_path: Path) -> None:
+        """ファイルの内容を保存（メモリに載せずにコピー）"""
+        size = src_path.stat().st_size
+        if size > self._max_bytes:
+            return
+        with self._lock:
+            if key in self._entries:
+                self._remove_locked(key)
+            tmp_path = self._path(key).with_suffix(f".{os.getpid()}.{threading.get_ident()}.tmp")
+            shutil.copyfile(src_path, tmp_path)
+            tmp_path.replace(self._path(key))
+            self._entries[key] = (size, time.time())
+            self._total_bytes += size
+            self._evict_locked()
+
+    def put(self, key: str, data: bytes) -> None:
+        """バイト列を保存（容量上限を超えるものは保存しない）"""
+        if len(data) > self._max_bytes:
+            return
+        with self._lock:
+            if key in self._entries:
+                self._remove_locked(key)
+            # 一時ファイルに書いてからリネーム（書き込み途中のファイルを読ませない）
+            tmp_path = self._path(key).with_suffix(f".{os.getpid()}.{threading.get_ident()}.tmp")
+            tmp_path.write_bytes(data)
+            tmp_path.replace(self._path(key))
+            self._entries[key] = (len(data), time.time())
+            self._total_bytes += len(data)
+            self._evict_locked()
+
+    def stats(self) -> dict:
+        """ヒット率などの統計を返す（メトリクス用）"""
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "entries": len(self._entries),
+                "bytes": self._total_bytes,
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "hit_rate": self.hits / lookups if lookups else 0.0,
+            }
+
+
+# キャッシュのシングルトン（遅延初期化）
+_export_cache: ExportCache | None = None
+_export_cache_lock = threading.Lock()
+
+
+def get_export_cache() -> ExportCache:
+    """エクスポートキャッシュを取得（遅延初期化）"""
+    global _export_cache
+    with _export_cache_lock:
+        if _export_cache is None:
+            _export_cache = ExportCache()
+        return _export_cache
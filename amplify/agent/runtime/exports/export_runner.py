@@ -0,0 +1,88 @@
+"""エクスポートの非同期実行（イベントループ外で実行・同時実行数と待ち行列の上限付き）"""
+
+import asyncio
+from typing import Any, Callable
+
+from config import EXPORT_MAX_CONCURRENCY, EXPORT_MAX_QUEUE_DEPTH, MARP_JOB_TIMEOUT
+
+
+class ExportBusyError(RuntimeError):
+    """待ち行列が上限に達していてエクスポートを受け付けられない"""
+
+
+class _ExportLimiter:
+    """同時実行数（セマフォ）と待ち行列の深さを管理"""
+
+    def __init__(self, max_concurrency: int, max_queue_depth: int):
+        self._max_concurrency = max_concurrency
+        self._max_queue_depth = max_queue_depth
+        self._semaphore: asyncio.Semaphore | None = None
+        self._loop: asyncio.AbstractEventLoop | None = None
+        self.running = 0
+        self.waiting = 0
+        self.rejected = 0
+
+    def _get_semaphore(self) -> asyncio.Semaphore:
+        # セマフォはイベントループに紐づくため、ループが変わったら作り直す
+        loop = asyncio.get_running_loop()
+        if self._semaphore is None or self._loop is not loop:
+            self._semaphore = asyncio.Semaphore(self._max_concurrency)
+            self._loop = loop
+        return self._semaphore
+
+    async def run(self, func: Callable[..., Any], *args: Any, timeout: float) -> Any:
+        if self.waiting >= self._max_queue_depth:
+            self.rejected += 1
+            raise ExportBusyError("エクスポートが混み合っています。しばらくしてから再度お試しください。")
+
+        semaphore = self._get_semaphore()
+        self.waiting += 1
+        try:
+            await semaphore.acquire()
+        finally:
+            self.waiting -= 1
+
+        self.running += 1
+        job = asyncio.ensure_future(asyncio.to_thread(func, *args))
+
+        def release(finished: asyncio.Future) -> None:
+            # 枠はスレッドの処理が実際に終わってから返す（タイムアウト・中断後も変換は続いているため）
+            self.running -= 1
+            semaphore.release()
+            if not finished.cancelled():
+                finished.exception()
+
+        job.add_done_callback(release)
+        try:
+            # ワーカー側でもMARP_JOB_TIMEOUTでChromiumごと停止するため、ここは呼び出し側の上限
+            return await asyncio.wait_for(asyncio.shield(job), timeout)
+        except asyncio.TimeoutError:
+            raise RuntimeError(f"エクスポートがタイムアウトしました（{timeout:.0f}秒）")
+
+    def stats(self) -> dict:
+        return {
+            "running": self.running,
+            "waiting": self.waiting,
+            "rejected": self.rejected,
+        }
+
+
+_export_limiter = _ExportLimiter(EXPORT_MAX_CONCURRENCY, EXPORT_MAX_QUEUE_DEPTH)
+
+
+async def run_export(func: Callable[..., Any], *args: Any, timeout: float | None = None) -> Any:
+    """同期のエクスポート関数をスレッドで実行
+
+    Raises:
+        ExportBusyError: 待ち行列が上限に達している場合
+        RuntimeError: タイムアウトした場合
+    """
+    if timeout is None:
+        # バッチ変換（共有のHTML+サムネイル）も収まるよう余裕を持たせる
+        timeout = MARP_JOB_TIMEOUT * 2 + 10
+    return await _export_limiter.run(func, *args, timeout=timeout)
+
+
+def get_export_stats() -> dict:
+    """実行中・待機中・拒否したエクスポート数を返す"""
+    return _export_limiter.stats()
@@ -0,0 +1,320 @@
+"""Marpレンダラーワーカープール（常駐Marp CLIサーバーで変換を高速化）
+
+`marp --server` を起動したままにしておき、変換ごとのNode起動・Marp CLIの
+モジュール読み込み・Chromium起動を省略する。ワーカーはテーマとHTML許可の
+組み合わせ（プロファイル）ごとに起動し、一定回数変換したら再起動する。
+"""
+
+import atexit
+import io
+import os
+import shutil
+import signal
+import socket
+import subprocess
+import threading
+import time
+import urllib.error
+import urllib.request
+import uuid
+from pathlib import Path
+from typing import BinaryIO, Callable
+
+from config import (
+    MARP_POOL_SIZE,
+    MARP_WORKER_MAX_JOBS,
+    MARP_WORKER_START_TIMEOUT,
+    MARP_JOB_TIMEOUT,
+    MARP_QUEUE_TIMEOUT,
+    MARP_HEALTH_CHECK_INTERVAL,
+)
+from .scratch import make_scratch_dir, release_scratch
+
+# 出力形式ごとのMarpサーバー変換クエリ（HTMLはクエリなし）
+_FORMAT_QUERIES = {
+    "pdf": "?pdf",
+    "pptx": "?pptx",
+    "html": "",
+    "png": "?png",
+}
+
+# ワーカー起動プロファイル: (テーマCSSパス, HTMLタグ許可)
+Profile = tuple[str | None, bool]
+
+
+def resolve_theme_path(theme: str) -> Path | None:
+    """テーマ名に対応するCSSファイルのパスを返す（存在しなければNone）"""
+    theme_path = Path(__file__).parent.parent / f"{theme}.css"
+    return theme_path if theme_path.exists() else None
+
+
+def _find_free_port() -> int:
+    """ローカルの空きポートを取得"""
+    with socket.socket(socket.AF_INET, socket.SOCK_STREAM) as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+class MarpWorker:
+    """常駐Marp CLIサーバー1プロセス分のワーカー"""
+
+    def __init__(self, worker_id: int):
+        self.worker_id = worker_id
+        self.profile: Profile | None = None
+        self.job_count = 0
+        self._process: subprocess.Popen | None = None
+        self._port: int | None = None
+        self._workdir: Path | None = None
+        self._last_health_check = 0.0
+
+    @property
+    def is_running(self) -> bool:
+        return self._process is not None and self._process.poll() is None
+
+    def start(self, profile: Profile) -> None:
+        """指定プロファイルでMarpサーバーを起動（起動済みなら再起動）"""
+        self.stop()
+        theme_path, allow_html = profile
+        self._workdir = make_scratch_dir(f"marp-worker-{self.worker_id}")
+        self._port = _find_free_port()
+
+        cmd = [
+            "marp",
+            "--server", str(self._workdir),
+            "--allow-local-files",
+        ]
+        if allow_html:
+            cmd.append("--html")
+        if theme_path:
+            cmd.extend(["--theme", theme_path])
+
+        # Marpサーバーの既定ポート8080はAgentCoreと衝突するため明示的に指定
+        env = {**os.environ, "PORT": str(self._port)}
+        self._process = subprocess.Popen(
+            cmd,
+            env=env,
+            stdout=subprocess.DEVNULL,
+            stderr=subprocess.DEVNULL,
+            start_new_session=True,  # Chromiumの子プロセスごと停止できるようにする
+        )
+        self.profile = profile
+        self.job_count = 0
+
+        deadline = time.monotonic() + MARP_WORKER_START_TIMEOUT
+        while time.monotonic() < deadline:
+            if not self.is_running:
+                self.stop()
+                raise RuntimeError("Marp worker exited during startup")
+            if self._ping():
+                self._last_health_check = time.monotonic()
+                print(f"[INFO] Marp worker {self.worker_id} started (port={self._port}, theme={theme_path})")
+                return
+            time.sleep(0.1)
+
+        self.stop()
+        raise RuntimeError("Marp worker startup timed out")
+
+    def stop(self) -> None:
+        """Marpサーバーを停止して作業ディレクトリを削除"""
+        if self._process is not None:
+            if self._process.poll() is None:
+                try:
+                    os.killpg(self._process.pid, signal.SIGTERM)
+                    self._process.wait(timeout=5)
+                except subprocess.TimeoutExpired:
+                    os.killpg(self._process.pid, signal.SIGKILL)
+                    self._process.wait()
+                except ProcessLookupError:
+                    pass
+            self._process = None
+        if self._workdir is not None:
+            release_scratch(self._workdir)
+            self._workdir = None
+        self.profile = None
+
+    def _ping(self) -> bool:
+        """サーバーが応答するか確認（インデックスページを取得）"""
+        try:
+            with urllib.request.urlopen(f"http://127.0.0.1:{self._port}/", timeout=2) as response:
+                return response.status == 200
+        except (urllib.error.URLError, OSError):
+            return False
+
+    def is_healthy(self) -> bool:
+        """ヘルスチェック（一定間隔ごとにのみ実際に問い合わせる）"""
+        if not self.is_running:
+            return False
+        if time.monotonic() - self._last_health_check < MARP_HEALTH_CHECK_INTERVAL:
+            return True
+        healthy = self._ping()
+        if healthy:
+            self._last_health_check = time.monotonic()
+        return healthy
+
+    def render(self, markdown: str, output_format: str, timeout: float = MARP_JOB_TIMEOUT) -> bytes:
+        """マークダウンを変換して出力バイト列を返す"""
+        buffer = io.BytesIO()
+        self.render_to(markdown, output_format, buffer, timeout)
+        return buffer.getvalue()
+
+    def render_to(
+        self,
+        markdown: str,
+        output_format: str,
+        dest: BinaryIO,
+        timeout: float = MARP_JOB_TIMEOUT,
+    ) -> None:
+        """マークダウンを変換して出力をdestに書き込む（レスポンスを全体メモリに載せない）"""
+        if not self.is_running:
+            raise RuntimeError("Marp worker is not running")
+        job_name = f"job-{uuid.uuid4().hex}.md"
+        md_path = self._workdir / job_name
+        url = f"http://127.0.0.1:{self._port}/{job_name}{_FORMAT_QUERIES[output_format]}"
+
+        try:
+            # 作業ディレクトリが消えていた場合（FileNotFoundError）もワーカーを停止して再起動させる
+            md_path.write_text(markdown, encoding="utf-8")
+            with urllib.request.urlopen(url, timeout=timeout) as response:
+                shutil.copyfileobj(response, dest)
+        except urllib.error.HTTPError as e:
+            detail = e.read().decode("utf-8", errors="replace")
+            raise RuntimeError(f"Marp CLI error: {detail}") from e
+        except (urllib.error.URLError, OSError) as e:
+            # タイムアウト・接続断は暴走したChromiumごとワーカーを停止
+            print(f"[WARN] Marp worker {self.worker_id} failed, stopping: {e}")
+            self.stop()
+            raise RuntimeError(f"Marp worker error: {e}") from e
+        finally:
+            md_path.unlink(missing_ok=True)
+
+        self.job_count += 1
+
+
+class MarpRendererPool:
+    """常駐Marpワーカーのプール（空きワーカー待ちのジョブキュー付き）"""
+
+    def __init__(
+        self,
+        size: int = MARP_POOL_SIZE,
+        max_jobs_per_worker: int = MARP_WORKER_MAX_JOBS,
+        queue_timeout: float = MARP_QUEUE_TIMEOUT,
+    ):
+        self._workers = [MarpWorker(i) for i in range(size)]
+        self._idle = list(self._workers)
+        self._cond = threading.Condition()
+        self._max_jobs = max_jobs_per_worker
+        self._queue_timeout = queue_timeout
+        self._queue_depth = 0
+        self._restarts = 0
+        self._jobs = 0
+
+    def _acquire(self, profile: Profile) -> MarpWorker:
+        """空きワーカーを取得（同じプロファイルで起動済みのものを優先）"""
+        deadline = time.monotonic() + self._queue_timeout
+        with self._cond:
+            self._queue_depth += 1
+            try:
+                while not self._idle:
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        raise RuntimeError("Marp renderer pool is busy")
+                    self._cond.wait(remaining)
+                worker = next(
+                    (w for w in self._idle if w.profile == profile and w.is_running),
+                    self._idle[0],
+                )
+                self._idle.remove(worker)
+                return worker
+            finally:
+                self._queue_depth -= 1
+
+    def _release(self, worker: MarpWorker) -> None:
+        with self._cond:
+            self._idle.append(worker)
+            self._cond.notify()
+
+    def _prepare(self, worker: MarpWorker, profile: Profile) -> None:
+        """プロファイル違い・不健全・変換回数超過のワーカーを再起動"""
+        if worker.profile == profile and worker.job_count < self._max_jobs and worker.is_healthy():
+            return
+        worker.start(profile)
+        self._restarts += 1
+
+    def render(self, markdown: str, output_format: str, theme: str = 'gradient') -> bytes:
+        """プール内のワーカーで変換して出力バイト列を返す"""
+        return self.render_batch([(markdown, output_format)], theme)[0]
+
+    def render_batch(
+        self,
+        jobs: list[tuple[str, str]],
+        theme: str = 'gradient',
+        allow_html: bool | None = None,
+        on_result: Callable[[int, bytes], None] | None = None,
+    ) -> list[bytes]:
+        """複数の変換を1つのワーカー（同一レンダラーセッション）で順に実行
+
+        on_result を指定すると、変換が1件終わるごとに (jobsの位置, 変換結果) で呼び出す。
+        """
+        if allow_html is None:
+            allow_html = any(output_format == "html" for _, output_format in jobs)
+        theme_path = resolve_theme_path(theme)
+        profile: Profile = (str(theme_path) if theme_path else None, allow_html)
+        worker = self._acquire(profile)
+        try:
+            self._prepare(worker, profile)
+            results = []
+            for i, (markdown, output_format) in enumerate(jobs):
+                results.append(worker.render(markdown, output_format))
+                with self._cond:
+                    self._jobs += 1
+                if on_result is not None:
+                    on_result(i, results[-1])
+            return results
+        finally:
+            self._release(worker)
+
+    def render_to_file(self, markdown: str, output_format: str, dest_path: Path, theme: str = 'gradient') -> None:
+        """プール内のワーカーで変換して出力をファイルに書き込む"""
+        theme_path = resolve_theme_path(theme)
+        profile: Profile = (str(theme_path) if theme_path else None, output_format == "html")
+        worker = self._acquire(profile)
+        try:
+            self._prepare(worker, profile)
+            with open(dest_path, "wb") as dest:
+                worker.render_to(markdown, output_format, dest)
+            with self._cond:
+                self._jobs += 1
+        finally:
+            self._release(worker)
+
+    def shutdown(self) -> None:
+        """全ワーカーを停止"""
+        for worker in self._workers:
+            worker.stop()
+
+    def stats(self) -> dict:
+        """プールの状態を返す（メトリクス用）"""
+        with self._cond:
+            return {
+                "size": len(self._workers),
+                "idle": len(self._idle),
+                "running": sum(1 for w in self._workers if w.is_running),
+                "queue_depth": self._queue_depth,
+                "jobs": self._jobs,
+                "restarts": self._restarts,
+            }
+
+
+# プールのシングルトン（遅延初期化）
+_renderer_pool: MarpRendererPool | None = None
+_renderer_pool_lock = threading.Lock()
+
+
+def get_renderer_pool() -> MarpRendererPool:
+    """レンダラープールを取得（遅延初期化）"""
+    global _renderer_pool
+    with _renderer_pool_lock:
+        if _renderer_pool is None:
+            _renderer_pool = MarpRendererPool()
+            atexit.register(_renderer_pool.shutdown)
+        return _renderer_pool
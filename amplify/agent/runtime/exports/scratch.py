@@ -0,0 +1,175 @@
+"""エクスポート用の作業領域（一時ディレクトリの作成・削除・孤児の掃除・使用量の計測）
+
+作業ディレクトリ・ファイルはすべて共通のルート配下に `<用途>-<PID>-<乱数>` の名前で作る。
+使い終わったら即座に削除し、クラッシュなどで残ったものはバックグラウンドの
+ジャニターが作成元プロセスの生死を見て削除する。作成元が生きている他プロセスの
+ものは（アイドル中のワーカーの作業ディレクトリなど）古くても削除しない。
+"""
+
+import os
+import re
+import shutil
+import tempfile
+import threading
+import time
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Iterator
+
+from config import (
+    EXPORT_SCRATCH_DIR,
+    EXPORT_SCRATCH_TMPFS,
+    SCRATCH_JANITOR_INTERVAL,
+    SCRATCH_ORPHAN_MAX_AGE,
+)
+
+# tmpfs（メモリ上のファイルシステム）のマウント先
+_TMPFS_PATH = Path("/dev/shm")
+
+# 作業領域の名前から作成元PIDを取り出す
+_OWNER_PID_PATTERN = re.compile(r"-(\d+)-[^-]+$")
+
+_scratch_root: Path | None = None
+_active_paths: set[Path] = set()
+_lock = threading.Lock()
+_janitor_thread: threading.Thread | None = None
+
+
+def scratch_root() -> Path:
+    """作業領域のルートを返す（初回呼び出し時に作成し、ジャニターを起動）"""
+    global _scratch_root
+    with _lock:
+        if _scratch_root is None:
+            if EXPORT_SCRATCH_DIR:
+                root = Path(EXPORT_SCRATCH_DIR)
+            elif EXPORT_SCRATCH_TMPFS and _TMPFS_PATH.is_dir():
+                root = _TMPFS_PATH / "marp-scratch"
+            else:
+                root = Path(tempfile.gettempdir()) / "marp-scratch"
+            root.mkdir(parents=True, exist_ok=True)
+            _scratch_root = root
+            _start_janitor()
+        return _scratch_root
+
+
+def make_scratch_dir(prefix: str) -> Path:
+    """作業ディレクトリを作成（削除は呼び出し側で release_scratch を呼ぶ）"""
+    path = Path(tempfile.mkdtemp(prefix=f"{prefix}-{os.getpid()}-", dir=scratch_root()))
+    with _lock:
+        _active_paths.add(path)
+    return path
+
+
+def make_scratch_file(prefix: str, suffix: str = "") -> Path:
+    """空の作業ファイルを作成（削除は呼び出し側で release_scratch を呼ぶ）"""
+    fd, name = tempfile.mkstemp(prefix=f"{prefix}-{os.getpid()}-", suffix=suffix, dir=scratch_root())
+    os.close(fd)
+    path = Path(name)
+    with _lock:
+        _active_paths.add(path)
+    return path
+
+
+def release_scratch(path: Path) -> None:
+    """作業ディレクトリ・ファイルを削除"""
+    with _lock:
+        _active_paths.discard(path)
+    if path.is_dir():
+        shutil.rmtree(path, ignore_errors=True)
+    else:
+        path.unlink(missing_ok=True)
+
+
+@contextmanager
+def scratch_dir(prefix: str) -> Iterator[Path]:
+    """withブロックの間だけ有効な作業ディレクトリ"""
+    path = make_scratch_dir(prefix)
+    try:
+        yield path
+    finally:
+        release_scratch(path)
+
+
+def _is_process_alive(pid: int) -> bool:
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True
+    return True
+
+
+def sweep_orphans(max_age: float = SCRATCH_ORPHAN_MAX_AGE) -> int:
+    """孤児になった作業領域を削除して削除数を返す
+
+    作成元プロセスが終了している（またはPIDが読み取れない）ものを削除する。
+    作成元が生きている他プロセスのものは、使用中かどうかをこのプロセスから
+    判断できないため残す。自プロセスのものは、使用中でなくmax_ageより古いもの
+    （解放漏れ）だけを削除する。
+    """
+    root = scratch_root()
+    now = time.time()
+    removed = 0
+    for path in root.iterdir():
+        with _lock:
+            if path in _active_paths:
+                continue
+        match = _OWNER_PID_PATTERN.search(path.name)
+        owner_pid = int(match.group(1)) if match else None
+        if owner_pid is not None and owner_pid != os.getpid() and _is_process_alive(owner_pid):
+            continue
+        if owner_pid == os.getpid():
+            try:
+                if now - path.stat().st_mtime <= max_age:
+                    continue
+            except FileNotFoundError:
+                continue
+        if path.is_dir():
+            shutil.rmtree(path, ignore_errors=True)
+        else:
+            path.unlink(missing_ok=True)
+        removed += 1
+    if removed:
+        print(f"[INFO] Scratch janitor removed {removed} orphaned entries")
+    return removed
+
+
+def _janitor_loop() -> None:
+    while True:
+        try:
+            sweep_orphans()
+        except Exception as e:
+            print(f"[WARN] Scratch janitor failed: {e}")
+        time.sleep(SCRATCH_JANITOR_INTERVAL)
+
+
+def _start_janitor() -> None:
+    """ジャニタースレッドを起動（_lock取得中に呼ぶ）"""
+    global _janitor_thread
+    if _janitor_thread is None and SCRATCH_JANITOR_INTERVAL > 0:
+        _janitor_thread = threading.Thread(target=_janitor_loop, name="scratch-janitor", daemon=True)
+        _janitor_thread.start()
+
+
+def get_scratch_usage() -> dict:
+    """作業領域の使用量（ゲージ用）"""
+    root = scratch_root()
+    total_bytes = 0
+    entries = 0
+    for dirpath, _, filenames in os.walk(root):
+        for filename in filenames:
+            try:
+                total_bytes += os.path.getsize(os.path.join(dirpath, filename))
+            except OSError:
+                pass
+    for _ in root.iterdir():
+        entries += 1
+    with _lock:
+        active = len(_active_paths)
+    return {
+        "root": str(root),
+        "bytes": total_bytes,
+        "entries": entries,
+        "active": active,
+    }
@@ -1,29 +1,46 @@
 """スライドエクスポート（PDF/PPTX/HTML/サムネイル生成）"""
 
+import os
+import shutil
+import signal
 import subprocess
-import tempfile
 from pathlib import Path
+from typing import BinaryIO, Callable
 
+from config import MARP_POOL_SIZE, MARP_JOB_TIMEOUT, EXPORT_CACHE_MAX_BYTES, INCREMENTAL_PDF_MAX_CHANGED_RATIO
+from .export_cache import ExportCache, get_export_cache, make_cache_key
+from .renderer_pool import get_renderer_pool, resolve_theme_path
+from .scratch import scratch_dir, make_scratch_file, release_scratch
+from .slide_pages import plan_slide_pages, count_pdf_pages, split_pdf_pages, merge_pdf_pages
+from telemetry import Stage
 
-def _run_marp_cli(markdown: str, output_format: str, theme: str = 'gradient') -> Path:
+
+def _run_marp_cli(
+    markdown: str,
+    output_format: str,
+    workdir: Path,
+    theme: str = 'gradient',
+    allow_html: bool | None = None,
+) -> Path:
     """Marp CLIを実行して出力ファイルのパスを返す（共通処理）
 
     Args:
         markdown: Marpマークダウン
         output_format: 出力形式（"pdf", "pptx", "html", "png"）
+        workdir: 入出力ファイルを置く作業ディレクトリ（削除は呼び出し側）
         theme: テーマ名
+        allow_html: HTMLタグを許可するか（Noneの場合はHTML出力時のみ許可）
 
     Returns:
-        出力ファイルのPath
+        出力ファイルのPath（PNGの場合は1枚目の画像）
     """
-    tmpdir = tempfile.mkdtemp()
-    md_path = Path(tmpdir) / "slide.md"
+    md_path = workdir / "slide.md"
 
     # 出力ファイル名の決定
     if output_format == "png":
-        output_path = Path(tmpdir) / "slide.png"
+        output_path = workdir / "slide.png"
     else:
-        output_path = Path(tmpdir) / f"slide.{output_format}"
+        output_path = workdir / f"slide.{output_format}"
 
     md_path.write_text(markdown, encoding="utf-8")
 
@@ -40,50 +57,308 @@ def _run_marp_cli(markdown: str, output_format: str, theme: str = 'gradient') ->
         cmd.append("--pdf")
     elif output_format == "pptx":
         cmd.append("--pptx")
-    elif output_format == "html":
-        cmd.append("--html")
     elif output_format == "png":
         cmd.extend(["--image", "png"])
 
+    if allow_html if allow_html is not None else output_format == "html":
+        cmd.append("--html")
+
     # テーマ設定
-    theme_path = Path(__file__).parent.parent / f"{theme}.css"
-    if theme_path.exists():
+    theme_path = resolve_theme_path(theme)
+    if theme_path:
         cmd.extend(["--theme", str(theme_path)])
 
-    result = subprocess.run(cmd, capture_output=True, text=True)
+    # タイムアウト時はChromiumの子プロセスごと停止できるよう新しいセッションで起動
+    process = subprocess.Popen(
+        cmd,
+        stdout=subprocess.PIPE,
+        stderr=subprocess.PIPE,
+        text=True,
+        start_new_session=True,
+    )
+    try:
+        _, stderr = process.communicate(timeout=MARP_JOB_TIMEOUT)
+    except subprocess.TimeoutExpired:
+        os.killpg(process.pid, signal.SIGKILL)
+        process.communicate()
+        raise RuntimeError(f"Marp CLI timed out after {MARP_JOB_TIMEOUT:.0f}s")
 
-    if result.returncode != 0:
-        raise RuntimeError(f"Marp CLI error: {result.stderr}")
+    if process.returncode != 0:
+        raise RuntimeError(f"Marp CLI error: {stderr}")
+
+    if output_format == "png":
+        # Marpは複数スライドの場合 slide.001.png, slide.002.png... を生成
+        # 1枚目のサムネイルを取得
+        png_files = sorted(workdir.glob("slide*.png"))
+        if not png_files:
+            raise RuntimeError("Thumbnail generation failed: no PNG files created")
+        return png_files[0]
 
     return output_path
 
 
+def extract_title_slide(markdown: str) -> str:
+    """フロントマターと1枚目のスライドだけを取り出す（サムネイル用）"""
+    lines = markdown.split("\n")
+    index = 0
+    # フロントマターはそのまま残す
+    if lines and lines[0].strip() == "---":
+        index = 1
+        while index < len(lines) and lines[index].strip() != "---":
+            index += 1
+        index += 1
+
+    in_code_block = False
+    while index < len(lines):
+        stripped = lines[index].strip()
+        if stripped.startswith("```"):
+            in_code_block = not in_code_block
+        elif stripped == "---" and not in_code_block:
+            break
+        index += 1
+    return "\n".join(lines[:index])
+
+
+def _cache_format(output_format: str, allow_html: bool) -> str:
+    """キャッシュキー用の出力形式ラベル（HTML出力以外でHTMLタグを許可した場合は区別）"""
+    if allow_html and output_format != "html":
+        return f"{output_format}+html"
+    return output_format
+
+
+def _render_batch(
+    jobs: list[tuple[str, str]],
+    theme: str = 'gradient',
+    allow_html: bool | None = None,
+    on_result: Callable[[int, bytes], None] | None = None,
+) -> list[bytes]:
+    """複数の変換をまとめて実行（キャッシュ済みのものは省略し、残りは1つのレンダラーセッションで変換）
+
+    Args:
+        jobs: (マークダウン, 出力形式) のリスト
+        theme: テーマ名
+        allow_html: HTMLタグを許可するか（Noneの場合はHTML出力を含む時のみ許可）
+        on_result: 1件揃うごとに (jobsの位置, 変換結果) で呼び出す（全件揃うのを待たずに配信するため）
+    """
+    if allow_html is None:
+        allow_html = any(output_format == "html" for _, output_format in jobs)
+
+    if EXPORT_CACHE_MAX_BYTES <= 0:
+        return _render_uncached_batch(jobs, theme, allow_html, on_result)
+
+    cache = get_export_cache()
+    cache_keys = [
+        make_cache_key(markdown, theme, _cache_format(output_format, allow_html))
+        for markdown, output_format in jobs
+    ]
+    results: list[bytes | None] = []
+    for (_, output_format), cache_key in zip(jobs, cache_keys):
+        cached = cache.get(cache_key)
+        if cached is not None:
+            print(f"[INFO] Export cache hit ({output_format})")
+            if on_result is not None:
+                on_result(len(results), cached)
+        results.append(cached)
+
+    # PDFはキャッシュ済みのスライドを使い、変更されたスライドだけを再レンダリング
+    for i, (markdown, output_format) in enumerate(jobs):
+        if results[i] is None and output_format == "pdf" and not allow_html:
+            results[i] = _assemble_pdf(markdown, theme, cache)
+            if results[i] is not None:
+                cache.put(cache_keys[i], results[i])
+                if on_result is not None:
+                    on_result(i, results[i])
+
+    pending = [i for i, data in enumerate(results) if data is None]
+    if pending:
+        def on_rendered(position: int, data: bytes) -> None:
+            if on_result is not None:
+                on_result(pending[position], data)
+
+        rendered = _render_uncached_batch([jobs[i] for i in pending], theme, allow_html, on_rendered)
+        for i, data in zip(pending, rendered):
+            cache.put(cache_keys[i], data)
+            results[i] = data
+            markdown, output_format = jobs[i]
+            if output_format == "pdf" and not allow_html:
+                _store_pdf_pages(markdown, theme, data, cache)
+    return results
+
+
+def _assemble_pdf(markdown: str, theme: str, cache: ExportCache) -> bytes | None:
+    """キャッシュ済みのスライドのページと、変更されたスライドだけを変換したページを結合してPDFを作る
+
+    スライド単位で扱えないデッキや、キャッシュ済みのページが少ない場合はNone（デッキ全体を変換する）。
+    """
+    plan = plan_slide_pages(markdown, theme)
+    if plan is None:
+        return None
+    pages = [cache.get(key) for key in plan.page_keys]
+    pending = [i for i, page in enumerate(pages) if page is None]
+    if len(pending) > len(pages) * INCREMENTAL_PDF_MAX_CHANGED_RATIO:
+        return None
+
+    if pending:
+        rendered = _render_uncached_batch([(plan.documents[i], "pdf") for i in pending], theme, False)
+        for i, page in zip(pending, rendered):
+            if count_pdf_pages(page) != 1:
+                print(f"[WARN] Incremental PDF: slide {i + 1} rendered to multiple pages, rendering whole deck")
+                return None
+            cache.put(plan.page_keys[i], page)
+            pages[i] = page
+    print(f"[INFO] Incremental PDF: rendered {len(pending)} of {len(pages)} slides")
+    return merge_pdf_pages(pages)
+
+
+def _store_pdf_pages(markdown: str, theme: str, pdf: bytes | Path, cache: ExportCache) -> None:
+    """デッキ全体のPDFをページに分けてスライド単位のキャッシュに保存（次回の差分変換用）"""
+    plan = plan_slide_pages(markdown, theme)
+    if plan is None:
+        return
+    try:
+        pages = split_pdf_pages(pdf)
+    except Exception as e:
+        print(f"[WARN] Failed to split PDF into pages: {e}")
+        return
+    if len(pages) != len(plan.page_keys):
+        print(f"[WARN] PDF has {len(pages)} pages for {len(plan.page_keys)} slides, skipping page cache")
+        return
+    for key, page in zip(plan.page_keys, pages):
+        cache.put(key, page)
+
+
+def _render_uncached_batch(
+    jobs: list[tuple[str, str]],
+    theme: str,
+    allow_html: bool,
+    on_result: Callable[[int, bytes], None] | None = None,
+) -> list[bytes]:
+    """常駐レンダラープール経由で変換（プール無効時はMarp CLIを都度起動）"""
+    formats = ",".join(output_format for _, output_format in jobs)
+    with Stage("marp.render", format=formats, theme=theme, jobs=len(jobs)):
+        if MARP_POOL_SIZE > 0:
+            return get_renderer_pool().render_batch(jobs, theme, allow_html, on_result=on_result)
+
+        results = []
+        for i, (markdown, output_format) in enumerate(jobs):
+            with scratch_dir("marp-cli") as workdir:
+                output_path = _run_marp_cli(markdown, output_format, workdir, theme, allow_html)
+                results.append(output_path.read_bytes())
+            if on_result is not None:
+                on_result(i, results[-1])
+        return results
+
+
+def _render_uncached_to_file(markdown: str, output_format: str, theme: str, dest_path: Path) -> None:
+    """変換結果をファイルに書き込む（レンダラープール経由・プール無効時はMarp CLIを都度起動）"""
+    with Stage("marp.render", format=output_format, theme=theme, jobs=1):
+        if MARP_POOL_SIZE > 0:
+            get_renderer_pool().render_to_file(markdown, output_format, dest_path, theme)
+            return
+
+        with scratch_dir("marp-cli") as workdir:
+            output_path = _run_marp_cli(markdown, output_format, workdir, theme)
+            shutil.move(output_path, dest_path)
+
+
+def open_export(markdown: str, output_format: str, theme: str = 'gradient') -> BinaryIO:
+    """変換結果をファイルとして開く（大きなPDF/PPTXをメモリに載せずに配信するため）
+
+    呼び出し側で閉じること。
+    """
+    cache = get_export_cache() if EXPORT_CACHE_MAX_BYTES > 0 else None
+    cache_key = make_cache_key(markdown, theme, output_format)
+    if cache is not None:
+        cached = cache.open(cache_key)
+        if cached is not None:
+            print(f"[INFO] Export cache hit ({output_format})")
+            return cached
+        if output_format == "pdf":
+            pdf = _assemble_pdf(markdown, theme, cache)
+            if pdf is not None:
+                cache.put(cache_key, pdf)
+                # 容量上限を超えて保存できなかった場合はデッキ全体を変換する
+                assembled = cache.open(cache_key)
+                if assembled is not None:
+                    return assembled
+
+    tmp_path = make_scratch_file("export", suffix=f".{output_format}")
+    try:
+        _render_uncached_to_file(markdown, output_format, theme, tmp_path)
+        file = open(tmp_path, "rb")
+        if cache is not None:
+            cache.put_file(cache_key, tmp_path)
+            if output_format == "pdf":
+                _store_pdf_pages(markdown, theme, tmp_path, cache)
+        return file
+    finally:
+        # 開いたファイルハンドルからは削除後も読める
+        release_scratch(tmp_path)
+
+
+def _render(markdown: str, output_format: str, theme: str = 'gradient') -> bytes:
+    """1形式分の変換（キャッシュ・レンダラープール経由）"""
+    return _render_batch([(markdown, output_format)], theme)[0]
+
+
 def generate_pdf(markdown: str, theme: str = 'gradient') -> bytes:
     """Marp CLIでPDFを生成"""
-    output_path = _run_marp_cli(markdown, "pdf", theme)
-    return output_path.read_bytes()
+    return _render(markdown, "pdf", theme)
 
 
 def generate_pptx(markdown: str, theme: str = 'gradient') -> bytes:
     """Marp CLIでPPTXを生成"""
-    output_path = _run_marp_cli(markdown, "pptx", theme)
-    return output_path.read_bytes()
+    return _render(markdown, "pptx", theme)
+
+
+def generate_batch(
+    markdown: str,
+    formats: list[str],
+    theme: str = 'gradient',
+    on_result: Callable[[int, bytes], None] | None = None,
+) -> list[bytes]:
+    """同じデッキを複数の形式（PDF/PPTX）に1回のレンダラーセッションで変換
+
+    on_result を指定すると、形式ごとに変換が終わった時点で (formatsの位置, 変換結果) で呼び出す。
+    """
+    return _render_batch([(markdown, output_format) for output_format in formats], theme, False, on_result)
 
 
 def generate_standalone_html(markdown: str, theme: str = 'gradient') -> str:
     """Marp CLIでスタンドアロンHTMLを生成（共有用）"""
-    output_path = _run_marp_cli(markdown, "html", theme)
-    return output_path.read_text(encoding="utf-8")
+    return _render(markdown, "html", theme).decode("utf-8")
 
 
 def generate_thumbnail(markdown: str, theme: str = 'gradient') -> bytes:
     """Marp CLIで1枚目のスライドをPNG画像として生成（OGP用サムネイル）"""
-    output_path = _run_marp_cli(markdown, "png", theme)
-
-    # Marpは複数スライドの場合 slide.001.png, slide.002.png... を生成
-    # 1枚目のサムネイルを取得
-    png_files = sorted(output_path.parent.glob("slide*.png"))
-    if not png_files:
+    thumbnail_bytes = _render(extract_title_slide(markdown), "png", theme)
+    if not thumbnail_bytes:
         raise RuntimeError("Thumbnail generation failed: no PNG files created")
+    return thumbnail_bytes
+
+
+def generate_share_assets(markdown: str, theme: str = 'gradient') -> tuple[str, bytes | None]:
+    """共有用のスタンドアロンHTMLとサムネイルPNGを1回のレンダラーセッションで生成
 
-    return png_files[0].read_bytes()
+    サムネイルはタイトルスライドだけをレンダリングする。HTMLの生成後にサムネイルの
+    生成だけが失敗した場合は、生成済みのHTMLを返し、サムネイルはNoneを返す。
+    HTMLを生成できなかった場合（混雑・タイムアウトを含む）は例外をそのまま送出する。
+
+    Returns:
+        (HTML文字列, サムネイルPNGのバイト列またはNone)
+    """
+    rendered: dict[int, bytes] = {}
+    try:
+        html_bytes, thumbnail_bytes = _render_batch(
+            [(markdown, "html"), (extract_title_slide(markdown), "png")],
+            theme,
+            allow_html=True,
+            on_result=rendered.__setitem__,
+        )
+        return html_bytes.decode("utf-8"), thumbnail_bytes or None
+    except Exception as e:
+        if 0 not in rendered:
+            raise
+        # サムネイル生成に失敗してもHTML共有は続行
+        print(f"[WARN] Thumbnail rendering failed, sharing HTML only: {e}")
+        return rendered[0].decode("utf-8"), None
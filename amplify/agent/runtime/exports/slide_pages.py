@@ -0,0 +1,98 @@
+"""PDFのスライド単位キャッシュ用の処理（スライドごとの文書作成・ページ分割・結合）
+
+デッキを1枚ずつの文書に分け、各文書のハッシュをページのキャッシュキーにする。
+フロントマターと手前のスライドから引き継がれるディレクティブを各文書に含めるため、
+あるスライドを変更しても他のスライドのキーは変わらない（ページ番号の総数を除く）。
+"""
+
+import io
+import re
+from dataclasses import dataclass
+from pathlib import Path
+
+try:
+    from pypdf import PdfReader, PdfWriter
+except ImportError:  # pypdfは任意依存（未インストール時は常にデッキ全体を変換）
+    PdfReader = PdfWriter = None
+
+from config import INCREMENTAL_PDF_MIN_SLIDES
+from deck import parse_deck
+from .export_cache import make_cache_key
+from .renderer_pool import resolve_theme_path
+
+# ページ単位のキャッシュはデッキ全体のPDFと区別する
+PAGE_CACHE_FORMAT = "pdf-page"
+
+_PAGINATION_TOTAL = "attr(data-marpit-pagination-total)"
+_PAGINATION = "attr(data-marpit-pagination)"
+_PAGINATION_CONTENT = re.compile(r"section::after\s*\{[^}]*?\bcontent\s*:\s*([^;}]+)")
+
+
+@dataclass
+class SlidePagePlan:
+    """デッキをスライド単位で変換するための文書とページのキャッシュキー"""
+
+    documents: list[str]
+    page_keys: list[str]
+
+
+def _pagination_content(theme: str) -> str:
+    """テーマCSSのページ番号表示（section::after の content）"""
+    theme_path = resolve_theme_path(theme)
+    if theme_path:
+        match = _PAGINATION_CONTENT.search(theme_path.read_text(encoding="utf-8"))
+        if match:
+            return match.group(1).strip()
+    return _PAGINATION
+
+
+def plan_slide_pages(markdown: str, theme: str) -> SlidePagePlan | None:
+    """スライド単位の文書を作る（スライド単位で扱えないデッキはNone）"""
+    if PdfReader is None or INCREMENTAL_PDF_MIN_SLIDES <= 0:
+        return None
+    deck = parse_deck(markdown)
+    if len(deck.slides) < INCREMENTAL_PDF_MIN_SLIDES:
+        return None
+    if not deck.splittable:
+        print(f"[INFO] Incremental PDF skipped: {deck.issues[0]}")
+        return None
+
+    pagination = _pagination_content(theme)
+    total = len(deck.slides)
+    documents = []
+    for index in range(total):
+        extra = ""
+        if deck.effective_directive(index, "paginate") == "true":
+            # 1枚だけの文書ではページ番号が 1 / 1 になるため、デッキ内の番号で上書き
+            label = pagination.replace(_PAGINATION_TOTAL, f'"{total}"').replace(_PAGINATION, f'"{index + 1}"')
+            extra = f"<style scoped>section::after {{ content: {label} !important; }}</style>"
+        documents.append(deck.standalone_slide(index, extra))
+    page_keys = [make_cache_key(document, theme, PAGE_CACHE_FORMAT) for document in documents]
+    return SlidePagePlan(documents=documents, page_keys=page_keys)
+
+
+def count_pdf_pages(pdf: bytes) -> int:
+    return len(PdfReader(io.BytesIO(pdf)).pages)
+
+
+def split_pdf_pages(source: bytes | Path) -> list[bytes]:
+    """PDFを1ページずつのPDFに分割"""
+    reader = PdfReader(io.BytesIO(source) if isinstance(source, bytes) else source)
+    pages = []
+    for page in reader.pages:
+        writer = PdfWriter()
+        writer.add_page(page)
+        buffer = io.BytesIO()
+        writer.write(buffer)
+        pages.append(buffer.getvalue())
+    return pages
+
+
+def merge_pdf_pages(pages: list[bytes]) -> bytes:
+    """1ページずつのPDFを順に結合"""
+    writer = PdfWriter()
+    for page in pages:
+        writer.append(PdfReader(io.BytesIO(page)))
+    buffer = io.BytesIO()
+    writer.write(buffer)
+    return buffer.getvalue()
@@ -4,12 +4,26 @@ from .kimi_adapter import (
     extract_markdown,
     is_tool_name_corrupted,
     remove_think_tags,
+    KimiStreamFilter,
+    MarpMarkdownExtractor,
     extract_marp_markdown_from_text,
 )
+from .slide_stream import SlideSplitter, JsonStringFieldReader, SlideEventStream
+from .retry import AttemptRecord, AttemptRecorder, backoff_delay, record_failover, get_retry_stats
 
 __all__ = [
     "extract_markdown",
     "is_tool_name_corrupted",
     "remove_think_tags",
+    "KimiStreamFilter",
+    "MarpMarkdownExtractor",
     "extract_marp_markdown_from_text",
+    "SlideSplitter",
+    "JsonStringFieldReader",
+    "SlideEventStream",
+    "AttemptRecord",
+    "AttemptRecorder",
+    "backoff_delay",
+    "record_failover",
+    "get_retry_stats",
 ]
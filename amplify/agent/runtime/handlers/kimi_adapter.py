@@ -1,9 +1,10 @@
-"""Kimi K2専用処理（thinkタグ除去、ツール名破損検出、マークダウン抽出）"""
+"""Kimi K2専用処理（thinkタグ除去、ストリームフィルタ、ツール名破損検出、マークダウン抽出）"""
 
 import re
 import json
 
 from config import VALID_TOOL_NAMES
+from .slide_stream import SlideSplitter
 
 
 def extract_markdown(text: str) -> str | None:
@@ -38,68 +39,289 @@ def remove_think_tags(text: str) -> str:
     return re.sub(r'<think>[\s\S]*?</think>', '', text)
 
 
-def extract_marp_markdown_from_text(text: str) -> str | None:
-    """テキストからMarpマークダウンを抽出（フォールバック用）
+_THINK_OPEN = "<think>"
+_THINK_CLOSE = "</think>"
+_MARP_MARKER = "marp: true"
+
+
+def _partial_tag_start(text: str, tag: str, pos: int) -> int:
+    """text[pos:]の末尾がタグの途中（チャンク境界で分割された可能性）なら、その開始位置を返す"""
+    lt = text.find("<", max(pos, len(text) - len(tag) + 1))
+    while lt != -1:
+        if tag.startswith(text[lt:]):
+            return lt
+        lt = text.find("<", lt + 1)
+    return len(text)
+
+
+class KimiStreamFilter:
+    """Kimi K2のテキストストリームを1チャンクずつ処理するフィルタ
+
+    - <think>...</think> の中身を除去（タグがチャンク境界で分割されても検出）
+    - "marp: true" を検出したら以降のテキストを出力しない（マークダウンはツール経由で送る）
+
+    受け取った文字は一度だけ走査し、チャンク間で持ち越すのはタグ・マーカーの
+    途中になりうる数文字だけなので、応答長に対して線形時間で動く。
+    """
+
+    def __init__(self):
+        self.in_think = False
+        self.marp_detected = False
+        self._carry = ""  # 分割されたタグの途中（未出力）
+        self._marp_tail = ""  # マーカー検出用に持ち越す末尾（小文字化済み）
+
+    def feed(self, chunk: str) -> str:
+        """チャンクを受け取り、チャット欄に出力してよいテキストを返す"""
+        if self.marp_detected:
+            return ""
+
+        window = self._marp_tail + chunk.lower()
+        if _MARP_MARKER in window:
+            self.marp_detected = True
+            self._carry = ""
+            print(f"[INFO] Kimi K2: Marp markdown detected in text stream, skipping text output")
+            return ""
+        self._marp_tail = window[-(len(_MARP_MARKER) - 1):]
+
+        return self._filter_think(self._carry + chunk)
+
+    def _filter_think(self, text: str) -> str:
+        output = []
+        pos = 0
+        while True:
+            if self.in_think:
+                end = text.find(_THINK_CLOSE, pos)
+                if end == -1:
+                    # 思考中のテキストは捨て、閉じタグの途中だけ持ち越す
+                    self._carry = text[_partial_tag_start(text, _THINK_CLOSE, pos):]
+                    break
+                self.in_think = False
+                pos = end + len(_THINK_CLOSE)
+                print(f"[INFO] Kimi K2: </think> tag detected, exiting think mode")
+                continue
+
+            lt = text.find("<", pos)
+            if lt == -1:
+                output.append(text[pos:])
+                self._carry = ""
+                break
+            if text.startswith(_THINK_OPEN, lt):
+                output.append(text[pos:lt])
+                self.in_think = True
+                pos = lt + len(_THINK_OPEN)
+                print(f"[INFO] Kimi K2: <think> tag detected, entering think mode")
+                continue
+            if text.startswith(_THINK_CLOSE, lt):
+                # 開きタグなしの閉じタグは除去だけする
+                output.append(text[pos:lt])
+                pos = lt + len(_THINK_CLOSE)
+                continue
+            tail = text[lt:]
+            if len(tail) < len(_THINK_CLOSE) and (_THINK_OPEN.startswith(tail) or _THINK_CLOSE.startswith(tail)):
+                # チャンク境界で分割されたタグの可能性: 次のチャンクまで出力を保留
+                output.append(text[pos:lt])
+                self._carry = tail
+                break
+            output.append(text[pos:lt + 1])
+            pos = lt + 1
+        return "".join(output)
+
+    def flush(self) -> str:
+        """ストリーム終了時に保留中のテキストを返す"""
+        remaining, self._carry = self._carry, ""
+        if self.marp_detected or self.in_think:
+            return ""
+        return remaining
+
+
+_ARGUMENT_BEGIN = "<|tool_call_argument_begin|>"
+_ARGUMENT_END = "<|tool_call_end|>"
+_TOOL_CALL_PREFIX = "<|tool_call"
+# 繰り返しに上限を付けてバックトラックを抑える
+_MARP_DIRECTIVE = re.compile(r"marp:\s{0,16}true", re.IGNORECASE)
+_MARP_DIRECTIVE_MAX_LEN = len("marp:") + 16 + len("true")
+_INTERNAL_TOKEN = re.compile(r"<\|[^<>|]{1,64}\|>")
+# チャンク間で持ち越す末尾（トークン検出とフロントマター区切りの遡り用）
+_HISTORY_CHARS = 64
+
+
+class MarpMarkdownExtractor:
+    """ストリームからMarpマークダウンを逐次抽出する（フォールバック用）
 
     Kimi K2がoutput_slideツールを呼ばずにテキストとしてマークダウンを出力した場合に使用。
-    以下の2パターンに対応：
-    1. 直接的なマークダウン: ---\nmarp: true\n...
-    2. JSON引数内のマークダウン: {"markdown": "---\\nmarp: true\\n..."}
+    以下の2パターンに対応し、チャンクを受け取るたびに処理するのでストリーム終了時点で結果が揃う：
+    1. JSON引数内のマークダウン: <|tool_call_argument_begin|> {"markdown": "---\\nmarp: true\\n..."} <|tool_call_end|>
+    2. 直接的なマークダウン: ---\nmarp: true\n...（<|tool_call までを取り出す）
+
+    直接的なマークダウンはフロントマターとスライド区切り（---）も逐次認識し、
+    完成したスライドを pop_slides() で取り出せる。
     """
-    if not text:
-        return None
 
-    # "marp: true" または "marp:" がない場合はスキップ（エスケープ版も考慮）
-    if "marp:" not in text and 'marp\\":' not in text:
-        return None
+    def __init__(self):
+        self.received = 0
+        self._history = ""
+        # JSON引数
+        self._json_markdown: str | None = None
+        self._argument_start: int | None = None
+        self._argument_parts: list[str] = []
+        # 直接的なマークダウン
+        self._markdown_start: int | None = None
+        self._markdown_prefix = ""
+        self._markdown_parts: list[str] = []
+        self._markdown_length: int | None = None
+        self._splitter = SlideSplitter()
+        self._completed_slides: list[str] = []
+        self._slides_finished = False
+        self._held_text = ""  # <|tool_call の途中かもしれない末尾（スライドにまだ含めない）
+
+    @property
+    def front_matter(self) -> str | None:
+        """閉じたフロントマター（まだならNone）"""
+        return self._splitter.front_matter
+
+    @property
+    def front_matter_closed(self) -> bool:
+        """フロントマターが閉じたか"""
+        return self._splitter.front_matter is not None
+
+    @property
+    def slide_boundaries(self) -> int:
+        """フロントマター以降に現れたスライド区切りの数"""
+        return self._splitter.separators
 
-    # ケース1: JSON引数内のマークダウンを抽出（Kimi K2がreasoningText内にツール呼び出しを埋め込んだ場合）
-    # パターン: <|tool_call_argument_begin|> {"markdown": "..."} <|tool_call_end|>
-    json_arg_pattern = r'<\|tool_call_argument_begin\|>\s*(\{[\s\S]*?\})\s*<\|tool_call_end\|>'
-    json_match = re.search(json_arg_pattern, text)
-    if json_match:
+    def pop_slides(self, final: bool = False) -> list[str]:
+        """前回以降に完成したスライドを返す（final=Trueなら書きかけの最後のスライドも含める）
+
+        JSON引数のマークダウンが見つかった場合はそちらを使うため、スライドは返さない。
+        """
+        if final and not self._slides_finished and self._markdown_start is not None:
+            self._slides_finished = True
+            self._completed_slides += self._splitter.feed(self._held_text) + self._splitter.finish()
+        slides, self._completed_slides = self._completed_slides, []
+        return slides if self._json_markdown is None else []
+
+    def feed(self, chunk: str) -> None:
+        if not chunk:
+            return
+        window = self._history + chunk
+        window_base = self.received - len(self._history)
+        first_new = len(self._history)
+        if self._json_markdown is None:
+            self._scan_arguments(chunk, window, window_base, first_new)
+        if self._json_markdown is None and self._markdown_length is None:
+            self._scan_markdown(chunk, window, window_base, first_new)
+        self.received += len(chunk)
+        self._history = window[-_HISTORY_CHARS:]
+
+    def _scan_arguments(self, chunk: str, window: str, window_base: int, first_new: int) -> None:
+        """<|tool_call_argument_begin|> ... <|tool_call_end|> を取り出してJSONとして解釈"""
+        if self._argument_start is not None:
+            self._argument_parts.append(chunk)
+        pos = 0
+        while True:
+            token = _ARGUMENT_END if self._argument_start is not None else _ARGUMENT_BEGIN
+            found = window.find(token, max(pos, first_new - len(token) + 1))
+            if found == -1:
+                return
+            pos = found + len(token)
+            if self._argument_start is None:
+                self._argument_start = window_base + pos
+                self._argument_parts = [window[pos:]]
+                continue
+            argument = "".join(self._argument_parts)[: window_base + found - self._argument_start].strip()
+            self._argument_start = None
+            self._argument_parts = []
+            markdown = self._parse_argument(argument)
+            if markdown:
+                self._json_markdown = markdown
+                print(f"[INFO] Extracted markdown from JSON tool argument")
+                return
+
+    @staticmethod
+    def _parse_argument(argument: str) -> str | None:
+        if not (argument.startswith("{") and argument.endswith("}")):
+            return None
         try:
-            json_str = json_match.group(1)
-            # エスケープされた改行を処理
-            data = json.loads(json_str)
-            if isinstance(data, dict) and "markdown" in data:
-                markdown = data["markdown"]
-                if markdown and "marp: true" in markdown:
-                    print(f"[INFO] Extracted markdown from JSON tool argument in reasoningText")
-                    return markdown
+            data = json.loads(argument)
         except json.JSONDecodeError as e:
             print(f"[WARN] Failed to parse JSON from tool argument: {e}")
+            return None
+        if isinstance(data, dict) and "markdown" in data:
+            markdown = data["markdown"]
+            if isinstance(markdown, str) and "marp: true" in markdown:
+                return markdown
+        return None
 
-    # ケース2: テキスト内に直接出力されたマークダウンを抽出
-    text_lower = text.lower()
-    if "marp: true" in text_lower:
-        # パターンA: 正規のフロントマター形式 "---\nmarp: true\n..."
-        pattern_with_frontmatter = r'(---\s*[\r\n]+marp:\s*true[\s\S]*?)(?:<\|tool_call|$)'
-        match = re.search(pattern_with_frontmatter, text, re.IGNORECASE)
-
-        if not match:
-            # パターンB: フロントマター区切り(---)なしで出力された場合
-            pattern_without_frontmatter = r'(marp:\s*true[\s\S]*?)(?:<\|tool_call|$)'
-            match = re.search(pattern_without_frontmatter, text, re.IGNORECASE)
-            if match:
-                # フロントマターの開始記号を補完
-                markdown = "---\n" + match.group(1).strip()
-                print(f"[INFO] Extracted markdown without frontmatter delimiter (added ---)")
+    def _scan_markdown(self, chunk: str, window: str, window_base: int, first_new: int) -> None:
+        """marp: true を含むフロントマターから <|tool_call までを取り出す"""
+        if self._markdown_start is None:
+            match = _MARP_DIRECTIVE.search(window, max(0, first_new - _MARP_DIRECTIVE_MAX_LEN + 1))
+            if not match:
+                return
+            # 直前がフロントマターの開始記号（---と改行）ならそこから、なければ---を補完
+            before = window[:match.start()]
+            stripped = before.rstrip()
+            if stripped.endswith("---") and before[-1:] in ("\n", "\r"):
+                start = len(stripped) - 3
             else:
-                # デバッグ: マッチしなかった場合、先頭100文字をログ出力
-                preview = text[:200].replace('\n', '\\n').replace('\r', '\\r')
-                print(f"[WARN] Marp markdown detected but extraction failed. Text preview: {preview}")
-                return None
+                start = match.start()
+                self._markdown_prefix = "---\n"
+                self._on_text(self._markdown_prefix)
+            self._markdown_start = window_base + start
+            piece_start = start
         else:
-            markdown = match.group(1).strip()
+            piece_start = first_new
+
+        # <|tool_call がチャンク境界で分割されていても検出（マークダウン開始より前は探さない）
+        search_from = max(0, self._markdown_start - window_base, first_new - len(_TOOL_CALL_PREFIX) + 1)
+        end = window.find(_TOOL_CALL_PREFIX, search_from)
+        piece = window[piece_start:] if end == -1 else window[piece_start:max(piece_start, end)]
+        self._markdown_parts.append(piece)
+        self._on_text(piece)
+        if end != -1:
+            self._markdown_length = window_base + end - self._markdown_start
+            # マークダウンの終わり: 最後のスライドも完成（保留中の末尾は <|tool_call の一部なので捨てる）
+            self._slides_finished = True
+            self._completed_slides += self._splitter.finish()
+
+    def _on_text(self, text: str) -> None:
+        if self._slides_finished:
+            return
+        text = self._held_text + text
+        held_from = _partial_tag_start(text, _TOOL_CALL_PREFIX, 0)
+        self._held_text = text[held_from:]
+        self._completed_slides += self._splitter.feed(text[:held_from])
+
+    def result(self) -> str | None:
+        """抽出したマークダウンを返す（見つからなければNone）"""
+        if self._json_markdown:
+            return self._json_markdown
+        if self._markdown_start is None:
+            return None
+        markdown = "".join(self._markdown_parts)
+        if self._markdown_length is not None:
+            markdown = markdown[: self._markdown_length]
+        markdown = (self._markdown_prefix + markdown).strip()
+        if self._markdown_prefix:
+            print(f"[INFO] Extracted markdown without frontmatter delimiter (added ---)")
 
         # 内部トークンが残っていたら除去
-        markdown = re.sub(r'<\|[^>]+\|>', '', markdown)
+        markdown = _INTERNAL_TOKEN.sub("", markdown)
         # 末尾の不完全な行を除去
-        lines = markdown.split('\n')
+        lines = markdown.split("\n")
         # 最後の行が不完全（閉じタグなど）なら除去
-        while lines and (lines[-1].strip().startswith('<|') or not lines[-1].strip()):
+        while lines and (lines[-1].strip().startswith("<|") or not lines[-1].strip()):
             lines.pop()
-        return '\n'.join(lines) if lines else None
+        return "\n".join(lines) if lines else None
 
-    return None
+
+def extract_marp_markdown_from_text(text: str) -> str | None:
+    """テキストからMarpマークダウンを抽出（フォールバック用、全文を一度に処理）
+
+    詳細は MarpMarkdownExtractor を参照。
+    """
+    if not text:
+        return None
+    extractor = MarpMarkdownExtractor()
+    extractor.feed(text)
+    return extractor.result()
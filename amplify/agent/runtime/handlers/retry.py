@@ -0,0 +1,116 @@
+"""ツール名破損時のリトライ制御（指数バックオフ・試行ごとの所要時間とトークン数の記録）"""
+
+import threading
+import time
+from dataclasses import dataclass
+
+from config import RETRY_BACKOFF_BASE, RETRY_BACKOFF_MAX
+from telemetry import Stage
+
+
+def backoff_delay(retry: int) -> float:
+    """retry回目（1始まり）のリトライ前に待つ秒数"""
+    return min(RETRY_BACKOFF_BASE * (2 ** (retry - 1)), RETRY_BACKOFF_MAX)
+
+
+def _usage_tokens(agent) -> tuple[int, int]:
+    """Agentの累計トークン数（入力, 出力）"""
+    metrics = getattr(agent, "event_loop_metrics", None)
+    usage = getattr(metrics, "accumulated_usage", None) or {}
+    return usage.get("inputTokens", 0), usage.get("outputTokens", 0)
+
+
+@dataclass
+class AttemptRecord:
+    """1回分の生成試行の記録"""
+
+    attempt: int
+    model_type: str
+    seconds: float
+    input_tokens: int
+    output_tokens: int
+    corrupted: bool
+    aborted: bool
+
+
+_stats_lock = threading.Lock()
+_retry_stats = {
+    "attempts": 0,
+    "retries": 0,
+    "aborted": 0,
+    "failovers": 0,
+    "wasted_seconds": 0.0,
+    "wasted_tokens": 0,
+}
+
+
+class AttemptRecorder:
+    """試行の開始時点の時刻とトークン数を覚えておき、終了時に差分を記録する
+
+    with文で使い、試行ごとに model.attempt スパンを開始して最初の出力までの時間も記録する。
+    finish() を呼ぶ前に例外・中断でwithを抜けた場合もスパンは終了する。
+    """
+
+    def __init__(self, agent, attempt: int, model_type: str):
+        self._agent = agent
+        self._attempt = attempt
+        self._model_type = model_type
+        self._started = time.monotonic()
+        self._start_tokens = _usage_tokens(agent)
+        self._stage = Stage("model.attempt", model_type=model_type, attempt=attempt)
+
+    def __enter__(self) -> "AttemptRecorder":
+        self._stage.start()
+        return self
+
+    def __exit__(self, exc_type, exc, tb) -> bool:
+        # finish() 済みなら何もしない（Stage.finish は2回目以降を無視する）
+        self._stage.finish(error=exc, aborted=exc is not None or None)
+        return False
+
+    def mark_first_token(self) -> None:
+        self._stage.mark_first_token()
+
+    def finish(self, corrupted: bool, aborted: bool) -> AttemptRecord:
+        input_tokens, output_tokens = _usage_tokens(self._agent)
+        record = AttemptRecord(
+            attempt=self._attempt,
+            model_type=self._model_type,
+            seconds=time.monotonic() - self._started,
+            input_tokens=input_tokens - self._start_tokens[0],
+            output_tokens=output_tokens - self._start_tokens[1],
+            corrupted=corrupted,
+            aborted=aborted,
+        )
+        self._stage.finish(
+            corrupted=corrupted,
+            aborted=aborted,
+            input_tokens=record.input_tokens,
+            output_tokens=record.output_tokens,
+        )
+        with _stats_lock:
+            _retry_stats["attempts"] += 1
+            if record.attempt > 0:
+                _retry_stats["retries"] += 1
+            if aborted:
+                _retry_stats["aborted"] += 1
+            if corrupted:
+                _retry_stats["wasted_seconds"] += record.seconds
+                _retry_stats["wasted_tokens"] += record.input_tokens + record.output_tokens
+        print(
+            f"[INFO] Attempt {record.attempt} ({record.model_type}): {record.seconds:.1f}s, "
+            f"tokens in={record.input_tokens} out={record.output_tokens}, "
+            f"corrupted={record.corrupted}, aborted={record.aborted}"
+        )
+        return record
+
+
+def record_failover() -> None:
+    with _stats_lock:
+        _retry_stats["failovers"] += 1
+
+
+def get_retry_stats() -> dict:
+    """リトライ・中断・モデル切り替えの回数と、破損した試行で消費した時間・トークン数"""
+    with _stats_lock:
+        return dict(_retry_stats)
@@ -0,0 +1,192 @@
+"""スライドの逐次配信（生成途中のマークダウンから完成したスライドを取り出す）"""
+
+import re
+
+_SEPARATOR = "---"
+_ESCAPES = {'"': '"', "\\": "\\", "/": "/", "b": "\b", "f": "\f", "n": "\n", "r": "\r", "t": "\t"}
+_PLAIN_RUN = re.compile(r'[^"\\]+')
+# フィールド名の検索は直前に読んだ位置の少し手前からだけ行う
+_FIELD_LOOKBACK = 64
+
+
+class SlideSplitter:
+    """Marpマークダウンを逐次受け取り、--- で閉じたスライドを返す
+
+    最初の --- から次の --- まではフロントマターとして扱い、コードブロック内の --- は区切りとみなさない。
+    """
+
+    def __init__(self):
+        self.front_matter: str | None = None
+        self.separators = 0
+        self._state = "start"  # start → front_matter → body
+        self._partial_line: list[str] = []
+        self._lines: list[str] = []
+        self._in_code_fence = False
+
+    def feed(self, text: str) -> list[str]:
+        """テキストを追加し、新たに完成したスライドを返す"""
+        completed = []
+        lines = text.split("\n")
+        for i, piece in enumerate(lines):
+            self._partial_line.append(piece)
+            if i == len(lines) - 1:
+                break
+            line = "".join(self._partial_line)
+            self._partial_line = []
+            slide = self._on_line(line)
+            if slide is not None:
+                completed.append(slide)
+        return completed
+
+    def _on_line(self, line: str) -> str | None:
+        stripped = line.strip()
+        if self._state == "start":
+            if not stripped:
+                return None
+            if stripped == _SEPARATOR:
+                self._state = "front_matter"
+                return None
+            # フロントマターなし
+            self.front_matter = ""
+            self._state = "body"
+
+        if self._state == "front_matter":
+            if stripped == _SEPARATOR:
+                self.front_matter = "\n".join(self._lines)
+                self._lines = []
+                self._state = "body"
+            else:
+                self._lines.append(line)
+            return None
+
+        if stripped.startswith("```"):
+            self._in_code_fence = not self._in_code_fence
+        elif stripped == _SEPARATOR and not self._in_code_fence:
+            self.separators += 1
+            return self._take_slide()
+        self._lines.append(line)
+        return None
+
+    def _take_slide(self) -> str | None:
+        slide = "\n".join(self._lines).strip()
+        self._lines = []
+        return slide or None
+
+    def finish(self) -> list[str]:
+        """入力の終わりに最後のスライドを返す"""
+        if self._partial_line:
+            slide = self._on_line("".join(self._partial_line))
+            self._partial_line = []
+            if slide is not None:
+                return [slide]
+        if self._state != "body":
+            return []
+        slide = self._take_slide()
+        return [slide] if slide else []
+
+
+class JsonStringFieldReader:
+    """生成途中のJSON（ツール入力）から、指定した文字列フィールドの値を逐次デコードする
+
+    入力は呼び出しごとに前回までの内容を含む累積文字列を想定する。
+    """
+
+    def __init__(self, field: str):
+        self._field_start = re.compile(r'"%s"\s{0,16}:\s{0,16}"' % re.escape(field))
+        self._pos: int | None = None
+        self._searched = 0
+        self.done = False
+
+    def feed(self, partial_json: str) -> str:
+        """新たにデコードできた部分を返す"""
+        if self.done:
+            return ""
+        if self._pos is None:
+            match = self._field_start.search(partial_json, max(0, self._searched - _FIELD_LOOKBACK))
+            self._searched = len(partial_json)
+            if not match:
+                return ""
+            self._pos = match.end()
+
+        output = []
+        i, n = self._pos, len(partial_json)
+        while i < n:
+            run = _PLAIN_RUN.match(partial_json, i)
+            if run:
+                output.append(run.group())
+                i = run.end()
+                continue
+            if partial_json[i] == '"':
+                self.done = True
+                i += 1
+                break
+            # エスケープ（途中で切れていたら次回に持ち越す）
+            if i + 1 >= n:
+                break
+            escaped = partial_json[i + 1]
+            if escaped != "u":
+                output.append(_ESCAPES.get(escaped, escaped))
+                i += 2
+                continue
+            if i + 6 > n:
+                break
+            code = _hex(partial_json[i + 2:i + 6])
+            length = 6
+            if 0xD800 <= code < 0xDC00:
+                # サロゲートペアは後半が揃うまで待つ
+                if i + 12 > n:
+                    break
+                low = _hex(partial_json[i + 8:i + 12]) if partial_json.startswith("\\u", i + 6) else -1
+                if 0xDC00 <= low < 0xE000:
+                    code = 0x10000 + ((code - 0xD800) << 10) + (low - 0xDC00)
+                    length = 12
+            output.append(chr(code) if code >= 0 else partial_json[i:i + 6])
+            i += length
+        self._pos = i
+        return "".join(output)
+
+
+def _hex(digits: str) -> int:
+    try:
+        return int(digits, 16)
+    except ValueError:
+        return -1
+
+
+class SlideEventStream:
+    """output_slideのツール入力・テキストストリームから slide イベントを作る
+
+    新しいデッキ（別のツール呼び出し）が始まるとindexは0に戻る。
+    """
+
+    def __init__(self):
+        self._tool_use_id: str | None = None
+        self._reader: JsonStringFieldReader | None = None
+        self._splitter: SlideSplitter | None = None
+        self._index = 0
+
+    def _start_deck(self) -> None:
+        self._splitter = SlideSplitter()
+        self._index = 0
+
+    def emit(self, slides: list[str], front_matter: str | None) -> list[dict]:
+        """完成したスライドを slide イベントにする"""
+        events = []
+        for slide in slides:
+            events.append({"type": "slide", "index": self._index, "data": slide, "frontMatter": front_matter or ""})
+            self._index += 1
+        return events
+
+    def feed_tool_input(self, tool_use_id: str | None, partial_input: str) -> list[dict]:
+        """output_slideの生成途中の入力（累積JSON文字列）を受け取る"""
+        if self._reader is None or tool_use_id != self._tool_use_id:
+            self._tool_use_id = tool_use_id
+            self._reader = JsonStringFieldReader("markdown")
+            self._start_deck()
+        if self._reader.done:
+            return []
+        text = self._reader.feed(partial_input)
+        slides = self._splitter.feed(text) if text else []
+        if self._reader.done:
+            slides += self._splitter.finish()
+        return self.emit(slides, self._splitter.front_matter)
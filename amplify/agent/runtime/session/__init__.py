@@ -1,5 +1,14 @@
 """セッション管理のエクスポート"""
 
-from .manager import get_or_create_agent
+from .manager import get_or_create_agent, get_session_stats, record_session_size, build_user_message, compact_history
+from .model_pool import get_model_pool, warm_up_models
 
-__all__ = ["get_or_create_agent"]
+__all__ = [
+    "get_or_create_agent",
+    "get_session_stats",
+    "record_session_size",
+    "build_user_message",
+    "compact_history",
+    "get_model_pool",
+    "warm_up_models",
+]
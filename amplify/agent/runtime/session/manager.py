@@ -1,51 +1,176 @@
 """セッション管理（Agent作成・キャッシュ）"""
 
 from strands import Agent
-from strands.models import BedrockModel
 
-from config import get_model_config, SYSTEM_PROMPT
-from tools import web_search, output_slide, generate_tweet_url
+from config import (
+    HISTORY_TOKEN_BUDGET,
+    HISTORY_SUMMARY_MAX_LINES,
+    HISTORY_SUMMARY_LINE_CHARS,
+)
+from .model_pool import get_model_pool
+from .store import SessionStore
 
-# セッションごとのAgentインスタンスを管理（会話履歴保持用）
-_agent_sessions: dict[str, Agent] = {}
+# セッションごとのAgentインスタンスを管理（会話履歴保持用・上限付き）
+_agent_sessions = SessionStore()
 
-
-def _create_bedrock_model(model_type: str = "nova") -> BedrockModel:
-    """モデル設定に基づいてBedrockModelを作成"""
-    config = get_model_config(model_type)
-    # cache_prompt/cache_toolsがNoneの場合は引数に含めない（Kimi K2対応）
-    if config["cache_prompt"] is None:
-        return BedrockModel(model_id=config["model_id"])
-    else:
-        return BedrockModel(
-            model_id=config["model_id"],
-            cache_prompt=config["cache_prompt"],
-            cache_tools=config["cache_tools"],
-        )
+# ユーザーメッセージに現在のスライドを付加する際の書式
+_DECK_CONTEXT_PREFIX = "現在のスライド:\n```markdown\n"
+_DECK_CONTEXT_SUFFIX = "\n```\n\nユーザーの指示: "
+_DECK_OMITTED_TEXT = "現在のスライド: （以前のバージョンのため省略。最新のスライドは最新のメッセージを参照）\n\nユーザーの指示: "
+_DECK_OMITTED_TOOL_INPUT = "（以前のバージョンのため省略）"
+_SUMMARY_PREFIX = "これまでの会話の要約:\n"
 
 
 def get_or_create_agent(session_id: str | None, model_type: str = "nova") -> Agent:
-    """セッションIDとモデルタイプに対応するAgentを取得または作成"""
+    """セッションIDとモデルタイプに対応するAgentを取得または作成
+
+    新しいAgentはmodel_typeごとのテンプレートから作る（モデルクライアントはプロセスで共有）。
+    """
     # セッションキーにモデルタイプを含める（モデル切り替え時に新しいAgentを作成）
     cache_key = f"{session_id}:{model_type}" if session_id else None
 
     # セッションIDがない場合は新規Agentを作成（履歴なし）
     if not cache_key:
-        return Agent(
-            model=_create_bedrock_model(model_type),
-            system_prompt=SYSTEM_PROMPT,
-            tools=[web_search, output_slide, generate_tweet_url],
-        )
+        return get_model_pool().get(model_type).clone()
 
     # 既存のセッションがあればそのAgentを返す
-    if cache_key in _agent_sessions:
-        return _agent_sessions[cache_key]
+    agent = _agent_sessions.get(cache_key)
+    if agent is not None:
+        return agent
 
     # 新規セッションの場合はAgentを作成して保存
-    agent = Agent(
-        model=_create_bedrock_model(model_type),
-        system_prompt=SYSTEM_PROMPT,
-        tools=[web_search, output_slide, generate_tweet_url],
-    )
-    _agent_sessions[cache_key] = agent
+    agent = get_model_pool().get(model_type).clone()
+    _agent_sessions.put(cache_key, agent)
     return agent
+
+
+def record_session_size(session_id: str | None, model_type: str = "nova") -> None:
+    """リクエスト完了後に呼び、増えた会話履歴のサイズをメモリ予算に反映する"""
+    if session_id:
+        _agent_sessions.update_size(f"{session_id}:{model_type}")
+
+
+def get_session_stats() -> dict:
+    """セッションストアのメトリクスを返す"""
+    return _agent_sessions.stats()
+
+
+def build_user_message(user_message: str, current_markdown: str = "") -> str:
+    """現在のスライドがある場合はユーザーメッセージに付加"""
+    if not current_markdown:
+        return user_message
+    return f"{_DECK_CONTEXT_PREFIX}{current_markdown}{_DECK_CONTEXT_SUFFIX}{user_message}"
+
+
+def estimate_tokens(text: str) -> int:
+    """おおよそのトークン数（UTF-8で4バイト≒1トークンとして概算）"""
+    return (len(text.encode("utf-8")) + 3) // 4
+
+
+def _block_text(block: dict) -> str:
+    """コンテンツブロック内のテキストを連結（トークン概算・要約用）"""
+    if "text" in block:
+        return block["text"]
+    if "toolUse" in block:
+        return str(block["toolUse"].get("input", ""))
+    if "toolResult" in block:
+        return "".join(c.get("text", "") for c in block["toolResult"].get("content", []))
+    return ""
+
+
+def _message_tokens(message: dict) -> int:
+    return sum(estimate_tokens(_block_text(block)) for block in message.get("content", []))
+
+
+def _omit_deck_snapshots(messages: list, keep_last_tool_deck: bool) -> None:
+    """古いスライド全文（ユーザーメッセージ内・output_slideの引数）を参照に置き換える"""
+    last_tool_deck = None
+    if keep_last_tool_deck:
+        for message in reversed(messages):
+            blocks = [b for b in message.get("content", []) if b.get("toolUse", {}).get("name") == "output_slide"]
+            if blocks:
+                last_tool_deck = blocks[-1]
+                break
+
+    for message in messages:
+        for block in message.get("content", []):
+            text = block.get("text")
+            if message.get("role") == "user" and text and text.startswith(_DECK_CONTEXT_PREFIX):
+                end = text.find(_DECK_CONTEXT_SUFFIX, len(_DECK_CONTEXT_PREFIX))
+                if end != -1:
+                    block["text"] = _DECK_OMITTED_TEXT + text[end + len(_DECK_CONTEXT_SUFFIX):]
+            tool_use = block.get("toolUse")
+            if tool_use and tool_use.get("name") == "output_slide" and block is not last_tool_deck:
+                tool_input = tool_use.get("input")
+                if isinstance(tool_input, dict) and tool_input.get("markdown") not in (None, _DECK_OMITTED_TOOL_INPUT):
+                    tool_use["input"] = {**tool_input, "markdown": _DECK_OMITTED_TOOL_INPUT}
+
+
+def _summary_lines(messages: list) -> list[str]:
+    """要約対象のメッセージから1発言1行の要約を作る"""
+    lines = []
+    for message in messages:
+        speaker = "ユーザー" if message.get("role") == "user" else "アシスタント"
+        for block in message.get("content", []):
+            text = block.get("text")
+            if text and text.startswith(_SUMMARY_PREFIX):
+                # 以前の要約はそのまま引き継ぐ
+                lines.extend(text[len(_SUMMARY_PREFIX):].split("\n"))
+            elif text:
+                if text.startswith(_DECK_OMITTED_TEXT):
+                    text = text[len(_DECK_OMITTED_TEXT):]
+                text = " ".join(text.split())
+                if len(text) > HISTORY_SUMMARY_LINE_CHARS:
+                    text = text[:HISTORY_SUMMARY_LINE_CHARS] + "…"
+                lines.append(f"- {speaker}: {text}")
+            elif "toolUse" in block:
+                lines.append(f"- {speaker}: （ツール実行: {block['toolUse'].get('name', 'unknown')}）")
+    return lines[-HISTORY_SUMMARY_MAX_LINES:]
+
+
+def _is_turn_start(message: dict) -> bool:
+    """ユーザーの発言で始まるターンの先頭か（ツール結果のメッセージは除く）"""
+    content = message.get("content", [])
+    return (
+        message.get("role") == "user"
+        and any("text" in block for block in content)
+        and not any("toolResult" in block for block in content)
+    )
+
+
+def _summarize_old_turns(messages: list, token_budget: int) -> None:
+    """トークン予算を超えた古いターンを要約に置き換える（ターン境界で切るのでツール呼び出しの対応は崩れない）"""
+    tokens = [_message_tokens(m) for m in messages]
+    if sum(tokens) <= token_budget:
+        return
+
+    boundaries = [i for i in range(1, len(messages)) if _is_turn_start(messages[i])]
+    if not boundaries:
+        return
+    # 予算に収まる最も古いターン境界で切る（最低でも直近のターンは残す）
+    cut = next((b for b in boundaries if sum(tokens[b:]) <= token_budget), boundaries[-1])
+
+    summary = _SUMMARY_PREFIX + "\n".join(_summary_lines(messages[:cut]))
+    del messages[:cut]
+    messages[0]["content"].insert(0, {"text": summary})
+
+
+def compact_history(agent: Agent, has_current_deck: bool, token_budget: int = HISTORY_TOKEN_BUDGET) -> int:
+    """次のリクエスト前に会話履歴を圧縮し、削減したおおよそのトークン数を返す
+
+    - 新しいメッセージに現在のスライドが付く場合、履歴内の古いスライド全文は参照に置き換える
+    - 付かない場合も最新のoutput_slideの引数以外は置き換える
+    - トークン予算を超えた古いターンは要約にまとめる
+    """
+    messages = agent.messages
+    if not messages:
+        return 0
+
+    before = sum(_message_tokens(m) for m in messages)
+    _omit_deck_snapshots(messages, keep_last_tool_deck=not has_current_deck)
+    _summarize_old_turns(messages, token_budget)
+    saved = before - sum(_message_tokens(m) for m in messages)
+
+    if saved > 0:
+        print(f"[INFO] History compacted: ~{saved} tokens saved ({len(messages)} messages kept)")
+    return saved
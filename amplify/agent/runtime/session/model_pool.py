@@ -0,0 +1,127 @@
+"""モデルクライアントとAgentテンプレートのプール（model_typeごとにプロセスで共有）
+
+BedrockModelはboto3クライアント（接続プール）を持つため、セッションごとに作らず
+model_typeごとに1つを共有する。boto3クライアントはスレッドセーフで、BedrockModel自体は
+リクエストごとの状態を持たない。Agentは会話履歴を持つので、セッションごとに
+テンプレートから作る（共有のモデル・ツール一覧を使うので作成は軽い）。
+"""
+
+import threading
+import time
+
+from botocore.config import Config as BotocoreConfig
+from botocore.exceptions import ClientError
+from strands import Agent
+from strands.models import BedrockModel
+from strands.models.bedrock import DEFAULT_READ_TIMEOUT
+
+from config import get_model_config, SYSTEM_PROMPT, MODEL_CLIENT_MAX_CONNECTIONS
+from tools import web_search, output_slide, patch_slides, generate_tweet_url
+
+_TOOLS = [web_search, output_slide, patch_slides, generate_tweet_url]
+
+
+def _create_bedrock_model(model_type: str = "nova") -> BedrockModel:
+    """モデル設定に基づいてBedrockModelを作成（キープアライブ付きの接続プール）"""
+    config = get_model_config(model_type)
+    client_config = BotocoreConfig(
+        read_timeout=DEFAULT_READ_TIMEOUT,
+        tcp_keepalive=True,
+        max_pool_connections=MODEL_CLIENT_MAX_CONNECTIONS,
+    )
+    # cache_prompt/cache_toolsがNoneの場合は引数に含めない（Kimi K2対応）
+    if config["cache_prompt"] is None:
+        return BedrockModel(model_id=config["model_id"], boto_client_config=client_config)
+    else:
+        return BedrockModel(
+            model_id=config["model_id"],
+            boto_client_config=client_config,
+            cache_prompt=config["cache_prompt"],
+            cache_tools=config["cache_tools"],
+        )
+
+
+class AgentTemplate:
+    """model_typeごとの共有モデル・システムプロンプト・ツール一覧（セッションごとのAgentの元）"""
+
+    def __init__(self, model_type: str, model: BedrockModel):
+        self.model_type = model_type
+        self.model = model
+
+    def clone(self) -> Agent:
+        """会話履歴が空の新しいAgentを作る（モデルクライアントは共有）
+
+        ツールレジストリはAgentごとに作り直す（1回0.3ms程度）。Agentがレジストリを
+        書き換えることがあるので、セッション間では共有しない。
+        """
+        return Agent(model=self.model, system_prompt=SYSTEM_PROMPT, tools=list(_TOOLS))
+
+
+class ModelPool:
+    """model_type -> AgentTemplate（初回に作成し、以降は共有）"""
+
+    def __init__(self, model_factory=_create_bedrock_model):
+        self._model_factory = model_factory
+        self._templates: dict[str, AgentTemplate] = {}
+        self._lock = threading.Lock()
+        self.created = 0
+
+    def get(self, model_type: str) -> AgentTemplate:
+        """テンプレートを取得（作成中なら完了を待つ）"""
+        template = self._templates.get(model_type)
+        if template is not None:
+            return template
+        with self._lock:
+            template = self._templates.get(model_type)
+            if template is None:
+                template = AgentTemplate(model_type, self._model_factory(model_type))
+                self._templates[model_type] = template
+                self.created += 1
+            return template
+
+    def warm_up(self, model_types: list[str]) -> None:
+        """クライアントを作成し、Bedrockへの接続（TLSハンドシェイク）を済ませておく"""
+        for model_type in model_types:
+            started = time.monotonic()
+            template = self.get(model_type)
+            try:
+                _open_connection(template.model)
+            except Exception as e:
+                # 接続できなくてもクライアントの作成は済んでいるので続行
+                print(f"[WARN] Model warm-up connection failed ({model_type}): {e}")
+            print(f"[INFO] Model client warmed up: {model_type} ({time.monotonic() - started:.2f}s)")
+
+    def stats(self) -> dict:
+        return {"model_types": sorted(self._templates), "created": self.created}
+
+
+def _open_connection(model: BedrockModel) -> None:
+    """軽いAPI（非同期呼び出しの一覧1件）を呼び、接続プールにTLS接続を作っておく
+
+    権限がない場合のエラー応答も接続はできているので成功として扱う。
+    以降のConverse呼び出しはこの接続を再利用する。
+    """
+    try:
+        model.client.list_async_invokes(maxResults=1)
+    except ClientError:
+        pass
+
+
+_model_pool = ModelPool()
+
+
+def get_model_pool() -> ModelPool:
+    return _model_pool
+
+
+def warm_up_models(model_types: list[str], background: bool = True) -> threading.Thread | None:
+    """起動時のウォームアップ（既定ではバックグラウンドで実行し、起動を遅らせない）
+
+    ウォームアップ中に届いたリクエストは、作成中のクライアントの完成を待って共有する。
+    """
+    if not background:
+        _model_pool.warm_up(model_types)
+        return None
+    thread = threading.Thread(target=_model_pool.warm_up, args=(model_types,), name="model-warmup", daemon=True)
+    thread.start()
+    return thread
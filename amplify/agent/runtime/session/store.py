@@ -0,0 +1,148 @@
+"""セッションストア（上限件数・アイドルTTL・LRU・メモリ予算による追い出し）"""
+
+import json
+import threading
+import time
+from collections import OrderedDict
+from typing import Any
+
+from config import SESSION_MAX_ENTRIES, SESSION_IDLE_TTL, SESSION_MEMORY_BUDGET_BYTES
+
+
+def estimate_history_bytes(messages: list) -> int:
+    """会話履歴のおおよそのサイズ（JSONシリアライズ時のバイト数）を返す"""
+    try:
+        return len(json.dumps(messages, ensure_ascii=False, default=str).encode("utf-8"))
+    except (TypeError, ValueError):
+        return 0
+
+
+class _Entry:
+    __slots__ = ("value", "last_access", "size")
+
+    def __init__(self, value: Any):
+        self.value = value
+        self.last_access = time.monotonic()
+        self.size = 0
+
+
+class SessionStore:
+    """セッションキー -> Agent のLRUストア
+
+    - max_entries: 保持するセッション数の上限（超えたら最も古く使われたものから削除）
+    - idle_ttl: 最終アクセスからこの秒数を過ぎたセッションを削除
+    - memory_budget: 会話履歴の合計サイズ上限（0で無効）
+    """
+
+    def __init__(
+        self,
+        max_entries: int = SESSION_MAX_ENTRIES,
+        idle_ttl: float = SESSION_IDLE_TTL,
+        memory_budget: int = SESSION_MEMORY_BUDGET_BYTES,
+    ):
+        self._max_entries = max_entries
+        self._idle_ttl = idle_ttl
+        self._memory_budget = memory_budget
+        self._entries: OrderedDict[str, _Entry] = OrderedDict()
+        self._lock = threading.Lock()
+        self._total_bytes = 0
+        self.evictions = 0
+
+    def __contains__(self, key: str) -> bool:
+        with self._lock:
+            return key in self._entries
+
+    def __len__(self) -> int:
+        with self._lock:
+            return len(self._entries)
+
+    def get(self, key: str) -> Any | None:
+        """セッションを取得（LRU順を更新し、期限切れなら削除してNone）"""
+        with self._lock:
+            self._evict_expired_locked()
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            entry.last_access = time.monotonic()
+            self._entries.move_to_end(key)
+            return entry.value
+
+    def put(self, key: str, value: Any) -> None:
+        """セッションを保存（上限を超えたら古いものから削除）"""
+        with self._lock:
+            if key in self._entries:
+                self._remove_locked(key)
+            entry = _Entry(value)
+            self._entries[key] = entry
+            self._set_size_locked(entry, estimate_history_bytes(getattr(value, "messages", [])))
+            self._evict_expired_locked()
+            while len(self._entries) > self._max_entries:
+                self._evict_locked(next(iter(self._entries)))
+            self._evict_over_budget_locked(keep=key)
+
+    def pop(self, key: str) -> Any | None:
+        """セッションを削除して返す"""
+        with self._lock:
+            if key not in self._entries:
+                return None
+            return self._remove_locked(key).value
+
+    def update_size(self, key: str) -> None:
+        """リクエスト完了後に会話履歴のサイズを測り直し、予算を超えていれば古いセッションを削除
+
+        サイズはメモリ予算が無効（0）でも測る（bytes_heldのメトリクス用）。
+        会話履歴は圧縮で上限があるので、シリアライズはロックの外で1回だけ行う。
+        """
+        with self._lock:
+            entry = self._entries.get(key)
+        if entry is None:
+            return
+        size = estimate_history_bytes(getattr(entry.value, "messages", []))
+        with self._lock:
+            # 測っている間に削除・置き換えられていたら反映しない
+            if self._entries.get(key) is not entry:
+                return
+            self._set_size_locked(entry, size)
+            self._evict_over_budget_locked(keep=key)
+
+    def _set_size_locked(self, entry: _Entry, size: int) -> None:
+        self._total_bytes += size - entry.size
+        entry.size = size
+
+    def _remove_locked(self, key: str) -> _Entry:
+        entry = self._entries.pop(key)
+        self._total_bytes -= entry.size
+        return entry
+
+    def _evict_locked(self, key: str) -> None:
+        self._remove_locked(key)
+        self.evictions += 1
+        print(f"[INFO] Session evicted: {key}")
+
+    def _evict_expired_locked(self) -> None:
+        """アイドルTTLを過ぎたセッションを削除（先頭ほど古いので途中で打ち切れる）"""
+        now = time.monotonic()
+        while self._entries:
+            key, entry = next(iter(self._entries.items()))
+            if now - entry.last_access <= self._idle_ttl:
+                break
+            self._evict_locked(key)
+
+    def _evict_over_budget_locked(self, keep: str) -> None:
+        """会話履歴の合計がメモリ予算を超えたら古いセッションから削除（使用中のセッションは残す）"""
+        if self._memory_budget <= 0:
+            return
+        while self._total_bytes > self._memory_budget and len(self._entries) > 1:
+            oldest = next(iter(self._entries))
+            if oldest == keep:
+                break
+            self._evict_locked(oldest)
+
+    def stats(self) -> dict:
+        """メトリクス（保持セッション数・追い出し回数・会話履歴の合計サイズ）"""
+        with self._lock:
+            return {
+                "live_sessions": len(self._entries),
+                "evictions": self.evictions,
+                "bytes_held": self._total_bytes,
+            }
@@ -1,5 +1,5 @@
 """スライド共有機能のエクスポート"""
 
-from .s3_uploader import share_slide
+from .s3_uploader import share_slide, upload_export
 
-__all__ = ["share_slide"]
+__all__ = ["share_slide", "upload_export"]
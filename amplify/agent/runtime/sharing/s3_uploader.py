@@ -1,27 +1,85 @@
 """スライド共有（S3アップロード・OGP生成）"""
 
+import asyncio
+import gzip
 import os
 import re
 import html as html_escape
 import uuid
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime, timedelta
+from typing import BinaryIO
 
 import boto3
+from botocore.config import Config
 
-from exports import generate_standalone_html, generate_thumbnail
+from config import SHARE_UPLOAD_POOL_SIZE, SHARE_HTML_ENCODING, EXPORT_URL_EXPIRES
+from exports import generate_share_assets, run_export
+from telemetry import Stage
+
+# エクスポートファイルのContent-Type
+_EXPORT_CONTENT_TYPES = {
+    "pdf": "application/pdf",
+    "pptx": "application/vnd.openxmlformats-officedocument.presentationml.presentation",
+}
 
 # S3クライアント（遅延初期化）
 _s3_client = None
 
+# アップロード用スレッドプール（boto3の同期呼び出しをイベントループ外で実行）
+_upload_executor = ThreadPoolExecutor(max_workers=SHARE_UPLOAD_POOL_SIZE, thread_name_prefix="s3-upload")
+
 
 def _get_s3_client():
-    """S3クライアントを取得（遅延初期化）"""
+    """S3クライアントを取得（遅延初期化・接続プールをプロセス内で再利用）"""
     global _s3_client
     if _s3_client is None:
-        _s3_client = boto3.client('s3')
+        _s3_client = boto3.client(
+            's3',
+            config=Config(
+                max_pool_connections=SHARE_UPLOAD_POOL_SIZE,
+                tcp_keepalive=True,
+                retries={'max_attempts': 3, 'mode': 'standard'},
+            ),
+        )
     return _s3_client
 
 
+def _encode_html(html_content: str, encoding: str = SHARE_HTML_ENCODING) -> tuple[bytes, str | None]:
+    """HTMLを事前圧縮してContent-Encodingと一緒に返す（無圧縮ならNone）
+
+    S3は保存したContent-Encodingのまま返し、CloudFrontもオリジンが圧縮済みの
+    レスポンスはAccept-Encodingに関係なくそのまま配信する（圧縮形式の出し分けはしない）。
+    共有URLを開くのはブラウザとOGPクローラーで、いずれもgzipに対応しているためgzipのみ使う。
+    Accept-Encodingを送らないクライアント（curlの既定など）には圧縮されたまま届くので、
+    その用途があればSHARE_HTML_ENCODING=""にする。
+    """
+    body = html_content.encode('utf-8')
+    if encoding == "gzip":
+        return gzip.compress(body, compresslevel=9), "gzip"
+    return body, None
+
+
+async def _put_object(**kwargs) -> None:
+    """put_objectをアップロード用スレッドプールで実行"""
+    s3_client = _get_s3_client()
+    loop = asyncio.get_running_loop()
+    await loop.run_in_executor(_upload_executor, lambda: s3_client.put_object(**kwargs))
+
+
+async def _upload_html(bucket_name: str, s3_key: str, html_content: str) -> None:
+    """HTMLを（事前圧縮して）アップロード"""
+    body, content_encoding = _encode_html(html_content)
+    extra_args = {'ContentEncoding': content_encoding} if content_encoding else {}
+    await _put_object(
+        Bucket=bucket_name,
+        Key=s3_key,
+        Body=body,
+        ContentType='text/html; charset=utf-8',
+        **extra_args,
+    )
+
+
 def _extract_slide_title(markdown: str) -> str | None:
     """マークダウンからスライドタイトルを抽出"""
     # 最初の # 見出しを探す
@@ -54,8 +112,11 @@ def _inject_ogp_tags(html: str, title: str, image_url: str, page_url: str) -> st
     return html.replace('</head>', f'{ogp_tags}</head>')
 
 
-def share_slide(markdown: str, theme: str = 'gradient') -> dict:
-    """スライドをHTML化してS3に保存し、公開URLを返す（OGP対応）"""
+async def share_slide(markdown: str, theme: str = 'gradient') -> dict:
+    """スライドをHTML化してS3に保存し、公開URLを返す（OGP対応）
+
+    サムネイルとHTMLのアップロードは並行して実行する。
+    """
     bucket_name = os.environ.get('SHARED_SLIDES_BUCKET')
     cloudfront_domain = os.environ.get('CLOUDFRONT_DOMAIN')
 
@@ -64,44 +125,42 @@ def share_slide(markdown: str, theme: str = 'gradient') -> dict:
 
     # スライドID生成（UUID v4）
     slide_id = str(uuid.uuid4())
-    s3_client = _get_s3_client()
 
-    # サムネイル生成・アップロード
-    thumbnail_url = None
-    try:
-        thumbnail_bytes = generate_thumbnail(markdown, theme)
-        thumbnail_key = f"slides/{slide_id}/thumbnail.png"
-        s3_client.put_object(
-            Bucket=bucket_name,
-            Key=thumbnail_key,
-            Body=thumbnail_bytes,
-            ContentType='image/png',
-        )
-        thumbnail_url = f"https://{cloudfront_domain}/{thumbnail_key}"
-        print(f"[INFO] Thumbnail uploaded: {thumbnail_url}")
-    except Exception as e:
-        # サムネイル生成に失敗してもHTML共有は続行
-        print(f"[WARN] Thumbnail generation failed: {e}")
-
-    # 共有URL（OGPタグ挿入前に決定）
-    share_url = f"https://{cloudfront_domain}/slides/{slide_id}/index.html"
-
-    # HTML生成
-    html_content = generate_standalone_html(markdown, theme)
+    # HTMLとサムネイルを1回のレンダラーセッションで生成（イベントループ外で実行）
+    with Stage("share.render", theme=theme):
+        html_content, thumbnail_bytes = await run_export(generate_share_assets, markdown, theme)
 
-    # OGPタグ挿入（サムネイルがある場合のみ）
-    if thumbnail_url:
-        title = _extract_slide_title(markdown) or "スライド"
-        html_content = _inject_ogp_tags(html_content, title, thumbnail_url, share_url)
-
-    # S3にHTMLアップロード
+    # 共有URL・サムネイルURL（アップロード前に決定）
     s3_key = f"slides/{slide_id}/index.html"
-    s3_client.put_object(
-        Bucket=bucket_name,
-        Key=s3_key,
-        Body=html_content.encode('utf-8'),
-        ContentType='text/html; charset=utf-8',
-    )
+    share_url = f"https://{cloudfront_domain}/{s3_key}"
+    thumbnail_key = f"slides/{slide_id}/thumbnail.png"
+    thumbnail_url = f"https://{cloudfront_domain}/{thumbnail_key}"
+
+    with Stage("share.upload", thumbnail=bool(thumbnail_bytes)):
+        if not thumbnail_bytes:
+            await _upload_html(bucket_name, s3_key, html_content)
+        else:
+            # OGPタグ挿入済みのHTMLとサムネイルを並行アップロード
+            title = _extract_slide_title(markdown) or "スライド"
+            html_with_ogp = _inject_ogp_tags(html_content, title, thumbnail_url, share_url)
+            thumbnail_result, html_result = await asyncio.gather(
+                _put_object(
+                    Bucket=bucket_name,
+                    Key=thumbnail_key,
+                    Body=thumbnail_bytes,
+                    ContentType='image/png',
+                ),
+                _upload_html(bucket_name, s3_key, html_with_ogp),
+                return_exceptions=True,
+            )
+            if isinstance(html_result, BaseException):
+                raise html_result
+            if isinstance(thumbnail_result, BaseException):
+                # サムネイルのアップロードに失敗してもHTML共有は続行（OGPタグなしで上書き）
+                print(f"[WARN] Thumbnail upload failed: {thumbnail_result}")
+                await _upload_html(bucket_name, s3_key, html_content)
+            else:
+                print(f"[INFO] Thumbnail uploaded: {thumbnail_url}")
 
     # 有効期限（7日後）
     expires_at = int((datetime.utcnow() + timedelta(days=7)).timestamp())
@@ -113,3 +172,34 @@ def share_slide(markdown: str, theme: str = 'gradient') -> dict:
         'url': share_url,
         'expiresAt': expires_at,
     }
+
+
+async def upload_export(file: BinaryIO, output_format: str) -> dict:
+    """エクスポートファイルをS3にアップロードし、ダウンロード用の署名付きURLを返す
+
+    ファイルはマルチパートで分割アップロードするため、メモリに全体を載せない。
+    """
+    bucket_name = os.environ.get('SHARED_SLIDES_BUCKET')
+    if not bucket_name:
+        raise RuntimeError("ダウンロードURL機能が設定されていません（環境変数未設定）")
+
+    s3_client = _get_s3_client()
+    s3_key = f"exports/{uuid.uuid4()}/slide.{output_format}"
+    extra_args = {
+        'ContentType': _EXPORT_CONTENT_TYPES.get(output_format, 'application/octet-stream'),
+        'ContentDisposition': f'attachment; filename="slide.{output_format}"',
+    }
+    loop = asyncio.get_running_loop()
+    with Stage("export.upload", format=output_format):
+        await loop.run_in_executor(
+            _upload_executor,
+            lambda: s3_client.upload_fileobj(file, bucket_name, s3_key, ExtraArgs=extra_args),
+        )
+    url = s3_client.generate_presigned_url(
+        'get_object',
+        Params={'Bucket': bucket_name, 'Key': s3_key},
+        ExpiresIn=EXPORT_URL_EXPIRES,
+    )
+    expires_at = int((datetime.utcnow() + timedelta(seconds=EXPORT_URL_EXPIRES)).timestamp())
+    print(f"[INFO] Export uploaded for download: s3://{bucket_name}/{s3_key}")
+    return {'url': url, 'expiresAt': expires_at}
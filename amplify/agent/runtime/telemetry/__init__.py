@@ -0,0 +1,10 @@
+"""処理段階ごとの計測（OpenTelemetryのスパン・ヒストグラム）のエクスポート"""
+
+from .stages import Stage, deck_attributes, capture_telemetry, TelemetryCapture
+
+__all__ = [
+    "Stage",
+    "deck_attributes",
+    "capture_telemetry",
+    "TelemetryCapture",
+]
@@ -0,0 +1,86 @@
+"""実行時の状態のゲージ（セッション数・エクスポートの待ち行列・作業領域・検索の枠など）
+
+各モジュールの統計関数をメトリクスの収集時に読む ObservableGauge。
+起動時間を延ばさないよう、まだ読み込まれていないモジュールは観測しない
+（exports などは最初に使われてから値が出る）。
+"""
+
+import sys
+import threading
+import time
+from typing import Callable, Iterable
+
+from opentelemetry.metrics import CallbackOptions, Meter, Observation
+
+# (メトリクス名の接頭辞, モジュール, 統計関数, 数値の項目)
+_SOURCES = (
+    ("marp_agent.sessions", "session.manager", "get_session_stats", ("live_sessions", "evictions", "bytes_held")),
+    ("marp_agent.exports", "exports.export_runner", "get_export_stats", ("running", "waiting", "rejected")),
+    ("marp_agent.scratch", "exports.scratch", "get_scratch_usage", ("bytes", "entries", "active")),
+    (
+        "marp_agent.search_cache", "tools.web_search", "get_search_cache_stats",
+        ("entries", "hits", "misses", "evictions", "hit_rate"),
+    ),
+    (
+        "marp_agent.retry", "handlers.retry", "get_retry_stats",
+        ("attempts", "retries", "aborted", "failovers", "wasted_seconds", "wasted_tokens"),
+    ),
+)
+# Tavilyのキーごとの値（key属性にキーの環境変数名を付ける）
+_SEARCH_KEY_PREFIX = "marp_agent.search_key"
+_SEARCH_KEY_FIELDS = ("used_this_month", "monthly_quota", "successes", "failures")
+
+# 1回の収集で同じ統計関数を項目の数だけ呼ばないよう、この秒数だけ結果を使い回す
+_SNAPSHOT_TTL = 1.0
+
+
+class _Snapshot:
+    """統計関数の結果を短時間キャッシュする（作業領域の走査などを収集ごとに1回にする）"""
+
+    def __init__(self, module: str, accessor: str):
+        self._module = module
+        self._accessor = accessor
+        self._lock = threading.Lock()
+        self._value: dict | None = None
+        self._read_at = 0.0
+
+    def read(self) -> dict | None:
+        module = sys.modules.get(self._module)
+        if module is None:
+            return None
+        with self._lock:
+            now = time.monotonic()
+            if self._value is None or now - self._read_at > _SNAPSHOT_TTL:
+                self._value = getattr(module, self._accessor)()
+                self._read_at = now
+            return self._value
+
+
+def _field_callback(snapshot: _Snapshot, field: str) -> Callable[[CallbackOptions], Iterable[Observation]]:
+    def callback(options: CallbackOptions) -> Iterable[Observation]:
+        stats = snapshot.read()
+        if stats is None or field not in stats:
+            return []
+        return [Observation(stats[field])]
+    return callback
+
+
+def _search_key_callback(snapshot: _Snapshot, field: str) -> Callable[[CallbackOptions], Iterable[Observation]]:
+    def callback(options: CallbackOptions) -> Iterable[Observation]:
+        keys = snapshot.read() or {}
+        return [Observation(values[field], {"key": name}) for name, values in keys.items()]
+    return callback
+
+
+def register_runtime_gauges(meter: Meter) -> None:
+    """統計関数を読むゲージを meter に登録する"""
+    for prefix, module, accessor, fields in _SOURCES:
+        snapshot = _Snapshot(module, accessor)
+        for field in fields:
+            meter.create_observable_gauge(f"{prefix}.{field}", callbacks=[_field_callback(snapshot, field)])
+
+    search_keys = _Snapshot("tools.web_search", "get_search_metrics")
+    for field in _SEARCH_KEY_FIELDS:
+        meter.create_observable_gauge(
+            f"{_SEARCH_KEY_PREFIX}.{field}", callbacks=[_search_key_callback(search_keys, field)]
+        )
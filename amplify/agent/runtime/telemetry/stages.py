@@ -0,0 +1,200 @@
+"""処理段階ごとのスパンと所要時間ヒストグラム
+
+opentelemetry-instrument で起動した場合は自動計装と同じプロバイダ（ADOT）に送られる。
+テストでは capture_telemetry() でプロセス内のエクスポーターに切り替えて検証する。
+"""
+
+import time
+from contextlib import contextmanager
+from typing import Iterator
+
+from opentelemetry import context, metrics, trace
+from opentelemetry.trace import Status, StatusCode
+
+from deck import parse_deck
+from .gauges import register_runtime_gauges
+
+_INSTRUMENTATION_NAME = "marp-agent"
+
+STAGE_DURATION = "marp_agent.stage.duration"
+TIME_TO_FIRST_TOKEN = "marp_agent.model.time_to_first_token"
+
+# ヒストグラムに付ける属性（値の種類が少ないものだけ。デッキのサイズは区分に丸める）
+_METRIC_ATTRIBUTES = ("model_type", "theme", "format", "delivery", "action", "cached")
+_DECK_SIZE_CLASSES = (5, 10, 20)
+
+
+class _Instruments:
+    """トレーサー・ヒストグラム・実行時の状態のゲージ（プロバイダごとに作る）"""
+
+    def __init__(self, tracer_provider=None, meter_provider=None):
+        self.tracer = trace.get_tracer(_INSTRUMENTATION_NAME, tracer_provider=tracer_provider)
+        meter = metrics.get_meter(_INSTRUMENTATION_NAME, meter_provider=meter_provider)
+        self.stage_duration = meter.create_histogram(
+            STAGE_DURATION, unit="s", description="処理段階ごとの所要時間"
+        )
+        self.time_to_first_token = meter.create_histogram(
+            TIME_TO_FIRST_TOKEN, unit="s", description="モデル呼び出しから最初の出力までの時間"
+        )
+        register_runtime_gauges(meter)
+
+
+# 未設定のうちはグローバルプロバイダのプロキシ（起動後に設定されたプロバイダに委譲される）
+_instruments = _Instruments()
+
+
+def deck_attributes(markdown: str | None) -> dict:
+    """デッキのサイズの属性（スライド数・バイト数）"""
+    if not markdown:
+        return {}
+    return {"deck.slides": len(parse_deck(markdown).slides), "deck.bytes": len(markdown.encode("utf-8"))}
+
+
+def _deck_size_class(slides: int) -> str:
+    for limit in _DECK_SIZE_CLASSES:
+        if slides <= limit:
+            return f"<={limit}"
+    return f">{_DECK_SIZE_CLASSES[-1]}"
+
+
+def _metric_attributes(stage: str, attributes: dict, outcome: str) -> dict:
+    result = {"stage": stage, "outcome": outcome}
+    for name in _METRIC_ATTRIBUTES:
+        if name in attributes:
+            result[name] = attributes[name]
+    if "deck.slides" in attributes:
+        result["deck.size"] = _deck_size_class(attributes["deck.slides"])
+    return result
+
+
+class Stage:
+    """1つの処理段階のスパン（終了時に所要時間をヒストグラムに記録）
+
+    with文で使うか、開始と終了を別の場所で呼ぶ場合は start() と finish() を呼ぶ。
+    開始するとこのスパンが現在のスパンになり、中で開始した段階は子スパンになる。
+    現在のスパンの設定はコンテキスト変数なので、finish() は start() と同じタスクで呼ぶこと。
+    """
+
+    def __init__(self, name: str, **attributes):
+        self.name = name
+        self._attributes = {k: v for k, v in attributes.items() if v is not None}
+        self._instruments = _instruments
+        self._span = None
+        self._token = None
+        self._started = 0.0
+        self._first_token_recorded = False
+        self._finished = False
+
+    def start(self) -> "Stage":
+        """スパンを開始して現在のスパンにする（2回目以降は何もしない）"""
+        if self._span is None:
+            self._span = self._instruments.tracer.start_span(self.name, attributes=self._attributes)
+            self._token = context.attach(trace.set_span_in_context(self._span))
+            self._started = time.perf_counter()
+        return self
+
+    def set(self, **attributes) -> None:
+        """属性を追加"""
+        attributes = {k: v for k, v in attributes.items() if v is not None}
+        self._attributes.update(attributes)
+        if self._span is not None:
+            self._span.set_attributes(attributes)
+
+    def mark_first_token(self) -> None:
+        """最初の出力（テキスト・ツール呼び出し）を受け取った時点を記録（2回目以降は無視）"""
+        if self._first_token_recorded or self._span is None:
+            return
+        self._first_token_recorded = True
+        seconds = time.perf_counter() - self._started
+        self._span.add_event("first_token", {"seconds": seconds})
+        self._instruments.time_to_first_token.record(seconds, _metric_attributes(self.name, self._attributes, "ok"))
+
+    def finish(self, error: BaseException | None = None, **attributes) -> float:
+        """スパンを終了し、所要時間（秒）を返す（開始していなければ何もしない）"""
+        if self._span is None:
+            return 0.0
+        seconds = time.perf_counter() - self._started
+        if self._finished:
+            return seconds
+        self._finished = True
+        self.set(**attributes)
+        if error is not None:
+            self._span.record_exception(error)
+            self._span.set_status(Status(StatusCode.ERROR, str(error)))
+        context.detach(self._token)
+        self._span.end()
+        outcome = "error" if error is not None else "ok"
+        self._instruments.stage_duration.record(seconds, _metric_attributes(self.name, self._attributes, outcome))
+        return seconds
+
+    def __enter__(self) -> "Stage":
+        return self.start()
+
+    def __exit__(self, exc_type, exc, tb) -> bool:
+        self.finish(error=exc)
+        return False
+
+
+class TelemetryCapture:
+    """プロセス内に記録したスパンとヒストグラム"""
+
+    def __init__(self, span_exporter, metric_reader):
+        self._span_exporter = span_exporter
+        self._metric_reader = metric_reader
+
+    def spans(self, name: str | None = None) -> list:
+        """終了したスパン（nameを指定するとその段階のみ）"""
+        spans = self._span_exporter.get_finished_spans()
+        return [span for span in spans if name is None or span.name == name]
+
+    def histogram(self, name: str) -> list[dict]:
+        """ヒストグラムのデータポイント（属性・件数・合計）"""
+        data = self._metric_reader.get_metrics_data()
+        points = []
+        for resource_metrics in data.resource_metrics if data else []:
+            for scope_metrics in resource_metrics.scope_metrics:
+                for metric in scope_metrics.metrics:
+                    if metric.name != name:
+                        continue
+                    for point in metric.data.data_points:
+                        points.append({"attributes": dict(point.attributes), "count": point.count, "sum": point.sum})
+        return points
+
+    def gauge(self, name: str) -> list[dict]:
+        """ゲージの現在値（属性・値）。読むたびに統計関数を呼び直す"""
+        data = self._metric_reader.get_metrics_data()
+        points = []
+        for resource_metrics in data.resource_metrics if data else []:
+            for scope_metrics in resource_metrics.scope_metrics:
+                for metric in scope_metrics.metrics:
+                    if metric.name != name:
+                        continue
+                    for point in metric.data.data_points:
+                        points.append({"attributes": dict(point.attributes), "value": point.value})
+        return points
+
+
+@contextmanager
+def capture_telemetry() -> Iterator[TelemetryCapture]:
+    """計測の送り先をプロセス内のエクスポーターに切り替える（テスト・ベンチマーク用）"""
+    from opentelemetry.sdk.metrics import MeterProvider
+    from opentelemetry.sdk.metrics.export import InMemoryMetricReader
+    from opentelemetry.sdk.trace import TracerProvider
+    from opentelemetry.sdk.trace.export import SimpleSpanProcessor
+    from opentelemetry.sdk.trace.export.in_memory_span_exporter import InMemorySpanExporter
+
+    global _instruments
+    span_exporter = InMemorySpanExporter()
+    tracer_provider = TracerProvider()
+    tracer_provider.add_span_processor(SimpleSpanProcessor(span_exporter))
+    metric_reader = InMemoryMetricReader()
+    meter_provider = MeterProvider(metric_readers=[metric_reader])
+
+    previous = _instruments
+    _instruments = _Instruments(tracer_provider, meter_provider)
+    try:
+        yield TelemetryCapture(span_exporter, metric_reader)
+    finally:
+        _instruments = previous
+        tracer_provider.shutdown()
+        meter_provider.shutdown()
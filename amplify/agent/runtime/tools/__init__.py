@@ -1,16 +1,24 @@
 """ツール定義のエクスポート"""
 
-from .web_search import web_search, tavily_clients
-from .output_slide import output_slide, get_generated_markdown, reset_generated_markdown
-from .generate_tweet import generate_tweet_url, get_generated_tweet_url, reset_generated_tweet_url
+from .web_search import web_search, get_tavily_keys, get_last_search_result, get_search_metrics, get_search_cache_stats
+from .output_slide import output_slide, get_generated_markdown
+from .patch_slides import patch_slides
+from .generate_tweet import generate_tweet_url, get_generated_tweet_url
+from .request_state import RequestState, REQUEST_STATE_KEY, begin_request, current_request_state
 
 __all__ = [
     "web_search",
-    "tavily_clients",
+    "get_tavily_keys",
+    "get_last_search_result",
+    "get_search_metrics",
+    "get_search_cache_stats",
     "output_slide",
     "get_generated_markdown",
-    "reset_generated_markdown",
+    "patch_slides",
     "generate_tweet_url",
     "get_generated_tweet_url",
-    "reset_generated_tweet_url",
+    "RequestState",
+    "REQUEST_STATE_KEY",
+    "begin_request",
+    "current_request_state",
 ]
@@ -1,25 +1,18 @@
 """ツイートURL生成ツール"""
 
 import urllib.parse
-from strands import tool
+from strands import tool, ToolContext
 
-# ツイートURL用のグローバル変数
-_generated_tweet_url: str | None = None
+from .request_state import current_request_state, resolve_request_state
 
 
 def get_generated_tweet_url() -> str | None:
-    """生成されたツイートURLを取得"""
-    return _generated_tweet_url
+    """現在のリクエストで生成されたツイートURLを取得"""
+    return current_request_state().generated_tweet_url
 
 
-def reset_generated_tweet_url() -> None:
-    """ツイートURLをリセット"""
-    global _generated_tweet_url
-    _generated_tweet_url = None
-
-
-@tool
-def generate_tweet_url(tweet_text: str) -> str:
+@tool(context=True)
+def generate_tweet_url(tweet_text: str, tool_context: ToolContext | None = None) -> str:
     """ツイート投稿用のURLを生成します。ユーザーがXでシェアしたい場合に使用してください。
 
     Args:
@@ -28,9 +21,8 @@ def generate_tweet_url(tweet_text: str) -> str:
     Returns:
         生成完了メッセージ
     """
-    global _generated_tweet_url
     # 日本語をURLエンコード
     encoded_text = urllib.parse.quote(tweet_text, safe='')
     # Twitter Web Intent（compose/postではtextパラメータが無視される）
-    _generated_tweet_url = f"https://twitter.com/intent/tweet?text={encoded_text}"
+    resolve_request_state(tool_context).generated_tweet_url = f"https://twitter.com/intent/tweet?text={encoded_text}"
     return "ツイートURLを生成しました。"
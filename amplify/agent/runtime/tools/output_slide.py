@@ -1,32 +1,32 @@
 """スライド出力ツール"""
 
-from strands import tool
+from strands import tool, ToolContext
 
-# スライド出力用のグローバル変数（invokeで参照）
-_generated_markdown: str | None = None
+from deck import analyze_deck, format_findings
+from telemetry import Stage, deck_attributes
+from .request_state import current_request_state, resolve_request_state
 
 
 def get_generated_markdown() -> str | None:
-    """生成されたマークダウンを取得"""
-    return _generated_markdown
+    """現在のリクエストで生成されたマークダウンを取得"""
+    return current_request_state().generated_markdown
 
 
-def reset_generated_markdown() -> None:
-    """マークダウンをリセット"""
-    global _generated_markdown
-    _generated_markdown = None
-
-
-@tool
-def output_slide(markdown: str) -> str:
+@tool(context=True)
+def output_slide(markdown: str, tool_context: ToolContext | None = None) -> str:
     """生成したスライドのマークダウンを出力します。スライドを作成・編集したら必ずこのツールを使って出力してください。
 
     Args:
         markdown: Marp形式のマークダウン全文（フロントマターを含む）
 
     Returns:
-        出力完了メッセージ
+        出力完了メッセージ（崩れやすい書き方が見つかった場合は修正依頼を含む）
     """
-    global _generated_markdown
-    _generated_markdown = markdown
+    with Stage("tool.output_slide", **deck_attributes(markdown)) as stage:
+        resolve_request_state(tool_context).generated_markdown = markdown
+        # Marpでレンダリングする前に問題を返し、同じターンのうちに直させる
+        findings = analyze_deck(markdown)
+        stage.set(findings=len(findings))
+    if findings:
+        return "スライドを出力しました。\n\n" + format_findings(findings)
     return "スライドを出力しました。"
@@ -0,0 +1,51 @@
+"""スライド部分修正ツール（変更するスライドだけを受け取り、サーバー側で現在のデッキに適用する）"""
+
+from strands import tool, ToolContext
+
+from deck import SlidePatchError, analyze_deck, apply_slide_patch, format_findings, parse_deck
+from telemetry import Stage, deck_attributes
+from .request_state import resolve_request_state
+
+
+@tool(context=True)
+def patch_slides(operations: list[dict], tool_context: ToolContext | None = None) -> str:
+    """現在のスライドの一部だけを修正します。数枚の修正・追加・削除・並べ替えでは output_slide ではなくこのツールを使ってください。
+
+    スライド番号は1始まりで、1回の呼び出しの中ではすべて修正前のデッキの番号で指定します。
+    修正前のデッキは、このターンで output_slide / patch_slides を既に実行していればその結果、
+    そうでなければ現在のスライドです（続けて呼び出す場合は前回の修正後の番号で指定してください）。
+    フロントマターは変更できません（変更する場合は output_slide でデッキ全体を出力してください）。
+
+    Args:
+        operations: 修正操作のリスト。各操作は次のいずれか
+            {"op": "replace", "index": 3, "markdown": "## 新しい3枚目"}: 3枚目を置き換え
+            {"op": "insert", "index": 3, "markdown": "## 追加するスライド"}: 3枚目の前に挿入（スライド数+1で末尾に追加）
+            {"op": "delete", "index": 3}: 3枚目を削除
+            {"op": "reorder", "order": [1, 3, 2, 4]}: 全スライドを新しい順に並べる
+            markdownには区切り線（---）を含めず、1枚分の内容だけを指定してください。
+
+    Returns:
+        適用結果のメッセージ
+    """
+    request_state = resolve_request_state(tool_context)
+    # 同じリクエスト内で出力済みのデッキがあればそれに重ねて適用
+    base_markdown = request_state.generated_markdown or request_state.current_markdown
+    if not base_markdown:
+        return "修正対象のスライドがありません。output_slide でデッキ全体を出力してください。"
+
+    with Stage("tool.patch_slides", operations=len(operations), **deck_attributes(base_markdown)) as stage:
+        try:
+            merged = apply_slide_patch(base_markdown, operations)
+        except SlidePatchError as e:
+            return f"スライドの修正に失敗しました: {e}"
+        findings = analyze_deck(merged)
+        stage.set(findings=len(findings))
+    request_state.generated_markdown = merged
+    slide_count = len(parse_deck(merged).slides)
+    message = (
+        f"スライドを修正しました（{len(operations)}件の操作を適用、修正後は{slide_count}枚）。"
+        "続けて修正する場合は、この修正後のデッキのスライド番号で指定してください。"
+    )
+    if findings:
+        return message + "\n\n" + format_findings(findings)
+    return message
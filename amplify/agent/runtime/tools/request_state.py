@@ -0,0 +1,53 @@
+"""リクエスト単位のツール状態（同一プロセスで複数ストリームを並行処理するため）
+
+ツールの実行結果はモジュールのグローバル変数ではなく、invokeごとに作る
+RequestStateに保存する。invokeはstream_asyncのinvocation_stateで明示的に
+渡し、ツールはtool_context経由で受け取る。invocation_stateがない呼び出し
+（ツールの単体実行など）ではcontextvarsの現在の状態を使う。
+"""
+
+from contextvars import ContextVar
+from dataclasses import dataclass
+
+from strands import ToolContext
+
+# invocation_stateに格納する際のキー
+REQUEST_STATE_KEY = "request_state"
+
+
+@dataclass
+class RequestState:
+    """1回のinvokeでツールが生成した結果"""
+
+    generated_markdown: str | None = None
+    generated_tweet_url: str | None = None
+    last_search_result: str | None = None
+    # フロントエンドから送られた現在のスライド（patch_slidesの適用対象）
+    current_markdown: str = ""
+
+
+_current_request_state: ContextVar[RequestState | None] = ContextVar("request_state", default=None)
+
+
+def begin_request() -> RequestState:
+    """新しいリクエスト状態を作成して現在のコンテキストに設定"""
+    state = RequestState()
+    _current_request_state.set(state)
+    return state
+
+
+def current_request_state() -> RequestState:
+    """現在のコンテキストのリクエスト状態を取得（未設定なら作成）"""
+    state = _current_request_state.get()
+    if state is None:
+        state = begin_request()
+    return state
+
+
+def resolve_request_state(tool_context: ToolContext | None) -> RequestState:
+    """ツール実行時のリクエスト状態を取得（invocation_state優先）"""
+    if tool_context is not None:
+        state = tool_context.invocation_state.get(REQUEST_STATE_KEY)
+        if isinstance(state, RequestState):
+            return state
+    return current_request_state()
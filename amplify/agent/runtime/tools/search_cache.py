@@ -0,0 +1,155 @@
+"""検索結果キャッシュ（正規化したクエリをキーにしたLRU・TTL付き、任意でSQLiteに永続化）"""
+
+import atexit
+import sqlite3
+import threading
+import time
+import unicodedata
+from collections import OrderedDict
+
+from config import SEARCH_CACHE_MAX_ENTRIES, SEARCH_CACHE_PATH, SEARCH_CACHE_TTL
+
+
+def normalize_query(query: str) -> str:
+    """クエリを正規化（全角/半角の統一・大文字小文字の無視・空白の圧縮）
+
+    NFKCで全角英数字・全角スペースを半角に、半角カナを全角に揃える。
+    """
+    normalized = unicodedata.normalize("NFKC", query).casefold()
+    return " ".join(normalized.split())
+
+
+class SearchCache:
+    """整形済み検索結果のLRUキャッシュ（件数上限・TTL付き）
+
+    db_pathを指定するとSQLiteにも書き込み、再起動後も有効期限内の結果を再利用する。
+    getはメモリだけを見る（イベントループ上で呼ばれるため）。ヒット時のアクセス時刻と期限切れの削除は
+    溜めておき、次のput（スレッドで実行）か終了時にまとめてコミットする。
+    """
+
+    def __init__(
+        self,
+        max_entries: int = SEARCH_CACHE_MAX_ENTRIES,
+        ttl: float = SEARCH_CACHE_TTL,
+        db_path: str = SEARCH_CACHE_PATH,
+    ):
+        self._max_entries = max_entries
+        self._ttl = ttl
+        self._lock = threading.Lock()
+        # 正規化クエリ -> (結果テキスト, 書き込み時刻)。先頭ほど古くアクセスされたもの
+        self._entries: OrderedDict[str, tuple[str, float]] = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._db: sqlite3.Connection | None = None
+        # SQLiteに未反映のアクセス時刻と削除
+        self._pending_access: dict[str, float] = {}
+        self._pending_deletes: set[str] = set()
+        if db_path and max_entries > 0:
+            self._db = sqlite3.connect(db_path, check_same_thread=False)
+            self._db.execute(
+                "CREATE TABLE IF NOT EXISTS search_cache ("
+                "query TEXT PRIMARY KEY, result TEXT NOT NULL, written_at REAL NOT NULL, accessed_at REAL NOT NULL)"
+            )
+            self._db.commit()
+            self._load_index()
+            atexit.register(self.flush)
+
+    def _load_index(self) -> None:
+        """永続化済みのエントリを最終アクセス順に読み込む（期限切れは削除）"""
+        now = time.time()
+        self._db.execute("DELETE FROM search_cache WHERE written_at < ?", (now - self._ttl,))
+        rows = self._db.execute(
+            "SELECT query, result, written_at FROM search_cache ORDER BY accessed_at DESC LIMIT ?",
+            (self._max_entries,),
+        ).fetchall()
+        for query, result, written_at in reversed(rows):
+            self._entries[query] = (result, written_at)
+        # 件数上限からあふれた分も削除
+        self._db.execute(
+            "DELETE FROM search_cache WHERE query NOT IN (SELECT query FROM search_cache ORDER BY accessed_at DESC LIMIT ?)",
+            (self._max_entries,),
+        )
+        self._db.commit()
+
+    def _remove_locked(self, key: str) -> None:
+        self._entries.pop(key, None)
+        if self._db is not None:
+            self._pending_access.pop(key, None)
+            self._pending_deletes.add(key)
+
+    def _flush_locked(self) -> None:
+        """溜めたアクセス時刻の更新と削除を1回のコミットで反映"""
+        if self._pending_deletes:
+            self._db.executemany("DELETE FROM search_cache WHERE query = ?", [(key,) for key in self._pending_deletes])
+        if self._pending_access:
+            self._db.executemany(
+                "UPDATE search_cache SET accessed_at = ? WHERE query = ?",
+                [(accessed_at, key) for key, accessed_at in self._pending_access.items()],
+            )
+        self._db.commit()
+        self._pending_deletes.clear()
+        self._pending_access.clear()
+
+    def flush(self) -> None:
+        """未反映のアクセス時刻と削除をSQLiteに書き込む（ブロッキングI/O）"""
+        with self._lock:
+            if self._db is not None:
+                self._flush_locked()
+
+    def get(self, query: str) -> str | None:
+        """キャッシュ済みの検索結果を返す（なければNone）"""
+        if self._max_entries <= 0:
+            return None
+        key = normalize_query(query)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and time.time() - entry[1] > self._ttl:
+                self._remove_locked(key)
+                self.evictions += 1
+                entry = None
+            if entry is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            if self._db is not None:
+                self._pending_access[key] = time.time()
+            self.hits += 1
+            return entry[0]
+
+    def put(self, query: str, result: str) -> None:
+        """検索結果を保存（件数上限を超えたら最も古くアクセスされたものを削除）
+
+        永続化する場合はSQLiteに書き込むため、イベントループからはスレッドで呼ぶこと。
+        """
+        if self._max_entries <= 0:
+            return
+        key = normalize_query(query)
+        now = time.time()
+        with self._lock:
+            self._entries[key] = (result, now)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self._max_entries:
+                self._remove_locked(next(iter(self._entries)))
+                self.evictions += 1
+            if self._db is not None:
+                self._pending_deletes.discard(key)
+                self._pending_access.pop(key, None)
+                self._db.execute(
+                    "INSERT OR REPLACE INTO search_cache (query, result, written_at, accessed_at) VALUES (?, ?, ?, ?)",
+                    (key, result, now, now),
+                )
+                self._flush_locked()
+
+    def stats(self) -> dict:
+        """ヒット率などの統計を返す（メトリクス用）"""
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "entries": len(self._entries),
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "hit_rate": self.hits / lookups if lookups else 0.0,
+                "persistent": self._db is not None,
+            }
@@ -0,0 +1,273 @@
+"""Tavily APIキーごとの状態管理（クールダウン・月間枠の計上と枯渇・レイテンシ計測・キーの選択）"""
+
+import atexit
+import hashlib
+import json
+import os
+import re
+import threading
+import time
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import TYPE_CHECKING, Mapping
+
+from config import (
+    TAVILY_KEY_COOLDOWN,
+    TAVILY_MONTHLY_QUOTA,
+    TAVILY_QUOTA_HEADROOM,
+    TAVILY_REQUEST_COST,
+    TAVILY_USAGE_FLUSH_INTERVAL,
+)
+
+if TYPE_CHECKING:
+    from tavily import AsyncTavilyClient
+
+# TAVILY_API_KEY, TAVILY_API_KEY2, TAVILY_API_KEY3, ...
+_API_KEY_ENV_PATTERN = re.compile(r"^TAVILY_API_KEY(\d*)$")
+
+# レイテンシヒストグラムのバケット上限（秒）
+LATENCY_BUCKETS = (0.25, 0.5, 1.0, 2.0, 4.0, 8.0, 16.0, float("inf"))
+
+
+class LatencyHistogram:
+    """累積バケット方式のレイテンシヒストグラム"""
+
+    def __init__(self, buckets: tuple[float, ...] = LATENCY_BUCKETS):
+        self.buckets = buckets
+        self.counts = [0] * len(buckets)
+        self.count = 0
+        self.total = 0.0
+
+    def observe(self, seconds: float) -> None:
+        for i, upper in enumerate(self.buckets):
+            if seconds <= upper:
+                self.counts[i] += 1
+                break
+        self.count += 1
+        self.total += seconds
+
+    def snapshot(self) -> dict:
+        return {
+            "buckets": {("+Inf" if upper == float("inf") else str(upper)): n for upper, n in zip(self.buckets, self.counts)},
+            "count": self.count,
+            "sum": self.total,
+        }
+
+
+def _next_month_start(now: float) -> float:
+    """次の月初（UTC）のUNIX時刻"""
+    current = datetime.fromtimestamp(now, tz=timezone.utc)
+    year, month = (current.year + 1, 1) if current.month == 12 else (current.year, current.month + 1)
+    return datetime(year, month, 1, tzinfo=timezone.utc).timestamp()
+
+
+def _month_label(now: float) -> str:
+    return datetime.fromtimestamp(now, tz=timezone.utc).strftime("%Y-%m")
+
+
+class QuotaLedger:
+    """APIキーごとの月間リクエスト数（月が変わるとリセット、任意でJSONファイルに永続化）
+
+    キーはAPIキー文字列そのものではなくハッシュで記録する。
+    計上はイベントループ上で行われるため、ファイルへの書き込みはflush_interval秒ごとに
+    タイマースレッドでまとめて行う（終了時にも保存する）。
+    """
+
+    def __init__(self, path: str | Path | None = None, flush_interval: float = TAVILY_USAGE_FLUSH_INTERVAL):
+        self._path = Path(path) if path else None
+        self._flush_interval = flush_interval
+        self._lock = threading.Lock()
+        self._month = _month_label(time.time())
+        self._counts: dict[str, int] = {}
+        self._dirty = False
+        self._flush_timer: threading.Timer | None = None
+        self._load()
+        if self._path is not None:
+            atexit.register(self.flush)
+
+    def _load(self) -> None:
+        if self._path is None or not self._path.exists():
+            return
+        try:
+            data = json.loads(self._path.read_text())
+        except (OSError, ValueError) as e:
+            print(f"[WARN] Failed to load Tavily usage counters: {e}")
+            return
+        if data.get("month") == self._month:
+            self._counts = {k: int(v) for k, v in data.get("counts", {}).items()}
+
+    def _save_locked(self) -> None:
+        if self._path is None:
+            return
+        # 一時ファイルに書いてからリネーム（書き込み途中で落ちても壊れない）
+        tmp_path = self._path.with_suffix(f".{os.getpid()}.tmp")
+        try:
+            tmp_path.write_text(json.dumps({"month": self._month, "counts": self._counts}))
+            tmp_path.replace(self._path)
+        except OSError as e:
+            print(f"[WARN] Failed to save Tavily usage counters: {e}")
+        self._dirty = False
+
+    def _schedule_save_locked(self) -> None:
+        if self._path is None:
+            return
+        if self._flush_interval <= 0:
+            self._save_locked()
+            return
+        self._dirty = True
+        if self._flush_timer is None:
+            self._flush_timer = threading.Timer(self._flush_interval, self.flush)
+            self._flush_timer.daemon = True
+            self._flush_timer.start()
+
+    def flush(self) -> None:
+        """未保存のカウンタをファイルに書き込む（ブロッキングI/O。タイマースレッドと終了時に呼ばれる）"""
+        with self._lock:
+            if self._flush_timer is not None:
+                self._flush_timer.cancel()
+                self._flush_timer = None
+            if self._dirty:
+                self._save_locked()
+
+    def _roll_month_locked(self) -> None:
+        month = _month_label(time.time())
+        if month != self._month:
+            self._month = month
+            self._counts = {}
+
+    def used(self, key_id: str) -> int:
+        with self._lock:
+            self._roll_month_locked()
+            return self._counts.get(key_id, 0)
+
+    def record(self, key_id: str, cost: int = 1) -> int:
+        """1リクエスト分（cost）を計上して今月の累計を返す"""
+        with self._lock:
+            self._roll_month_locked()
+            self._counts[key_id] = self._counts.get(key_id, 0) + cost
+            self._schedule_save_locked()
+            return self._counts[key_id]
+
+    def saturate(self, key_id: str, quota: int) -> None:
+        """APIから枯渇を告げられたキーを上限まで使い切った扱いにする（再起動後も避ける）"""
+        with self._lock:
+            self._roll_month_locked()
+            self._counts[key_id] = max(self._counts.get(key_id, 0), quota)
+            self._schedule_save_locked()
+
+
+class TavilyKey:
+    """APIキー1本分のクライアントと状態"""
+
+    def __init__(
+        self,
+        name: str,
+        client: "AsyncTavilyClient",
+        key_id: str,
+        ledger: QuotaLedger,
+        monthly_quota: int = TAVILY_MONTHLY_QUOTA,
+    ):
+        self.name = name
+        self.client = client
+        self.key_id = key_id
+        self.ledger = ledger
+        self.monthly_quota = monthly_quota
+        self.unavailable_until = 0.0
+        self.latency = LatencyHistogram()
+        self.successes = 0
+        self.failures = 0
+
+    @property
+    def used_this_month(self) -> int:
+        return self.ledger.used(self.key_id)
+
+    def quota_ratio(self) -> float:
+        """今月の利用率（0.0〜）"""
+        return self.used_this_month / self.monthly_quota if self.monthly_quota > 0 else 0.0
+
+    def is_available(self, now: float | None = None) -> bool:
+        """クールダウン中・枯渇中・上限間近でなければTrue"""
+        if (now if now is not None else time.time()) < self.unavailable_until:
+            return False
+        return self.monthly_quota <= 0 or self.quota_ratio() < TAVILY_QUOTA_HEADROOM
+
+    def record_request(self, cost: int = TAVILY_REQUEST_COST) -> None:
+        """リクエストを送る直前に呼ぶ（月間カウンタを加算）"""
+        used = self.ledger.record(self.key_id, cost)
+        threshold = int(self.monthly_quota * TAVILY_QUOTA_HEADROOM)
+        if self.monthly_quota > 0 and used - cost < threshold <= used:
+            print(f"[INFO] Tavily key {self.name} reached {used}/{self.monthly_quota} this month, switching away")
+
+    def mark_rate_limited(self) -> None:
+        """レート制限: しばらく使わない"""
+        self.failures += 1
+        self.unavailable_until = max(self.unavailable_until, time.time() + TAVILY_KEY_COOLDOWN)
+        print(f"[WARN] Tavily key {self.name} rate limited, cooling down for {TAVILY_KEY_COOLDOWN:.0f}s")
+
+    def mark_exhausted(self) -> None:
+        """月間の無料枠を使い切った: 翌月まで使わない"""
+        self.failures += 1
+        self.unavailable_until = max(self.unavailable_until, _next_month_start(time.time()))
+        self.ledger.saturate(self.key_id, self.monthly_quota)
+        print(f"[WARN] Tavily key {self.name} exhausted until next month")
+
+    def record_success(self, seconds: float) -> None:
+        self.successes += 1
+        self.latency.observe(seconds)
+
+    def snapshot(self) -> dict:
+        return {
+            "available": self.is_available(),
+            "unavailable_until": self.unavailable_until,
+            "successes": self.successes,
+            "failures": self.failures,
+            "used_this_month": self.used_this_month,
+            "monthly_quota": self.monthly_quota,
+            "latency": self.latency.snapshot(),
+        }
+
+
+def discover_api_keys(environ: Mapping[str, str] = os.environ) -> list[tuple[str, str]]:
+    """環境変数から TAVILY_API_KEY, TAVILY_API_KEY2, ... を番号順に集める（本数の制限なし）"""
+    found = []
+    for name, value in environ.items():
+        match = _API_KEY_ENV_PATTERN.match(name)
+        if match and value:
+            found.append((int(match.group(1) or 1), name, value))
+    return [(name, value) for _, name, value in sorted(found)]
+
+
+def build_tavily_keys(
+    api_keys: list[tuple[str, str]],
+    api_base_url: str | None = None,
+    ledger: QuotaLedger | None = None,
+) -> list[TavilyKey]:
+    """(キー名, APIキー) のリストからTavilyKeyを作成（空のキーは除外）
+
+    ledgerを省略した場合は月間カウンタをメモリ上だけで持つ。
+    """
+    # tavilyは検索を使うまで読み込まない（起動時間短縮）
+    from tavily import AsyncTavilyClient
+
+    ledger = ledger or QuotaLedger()
+    return [
+        TavilyKey(
+            name,
+            AsyncTavilyClient(api_key=api_key, api_base_url=api_base_url),
+            key_id=hashlib.sha256(api_key.encode("utf-8")).hexdigest()[:16],
+            ledger=ledger,
+        )
+        for name, api_key in api_keys
+        if api_key
+    ]
+
+
+def schedule_keys(keys: list[TavilyKey], now: float | None = None) -> list[TavilyKey]:
+    """今回の検索で試すキーを優先順に返す
+
+    使えるキーのうち今月の利用率が低い順（同率なら登録順）に並べ、
+    負荷を全キーに分散させる。
+    """
+    now = now if now is not None else time.time()
+    available = [key for key in keys if key.is_available(now)]
+    return sorted(available, key=lambda key: key.quota_ratio())
@@ -1,33 +1,176 @@
 """Web検索ツール（Tavily API）"""
 
-import os
-from strands import tool
-from tavily import TavilyClient
+import asyncio
+import threading
+import time
 
-# Tavilyクライアント初期化（複数キーでフォールバック対応）
-tavily_clients: list[TavilyClient] = []
-for _key_name in ["TAVILY_API_KEY", "TAVILY_API_KEY2", "TAVILY_API_KEY3"]:
-    _key = os.environ.get(_key_name, "")
-    if _key:
-        tavily_clients.append(TavilyClient(api_key=_key))
+from strands import tool, ToolContext
 
-# Web検索結果用のグローバル変数（フォールバック用）
-_last_search_result: str | None = None
+from config import TAVILY_API_BASE_URL, TAVILY_HEDGE_DELAY, TAVILY_SEARCH_DEPTH, TAVILY_USAGE_PATH
+from telemetry import Stage
+from .request_state import current_request_state, resolve_request_state
+from .search_cache import SearchCache
+from .tavily_keys import QuotaLedger, TavilyKey, build_tavily_keys, discover_api_keys, schedule_keys
+
+# Tavilyクライアント（TAVILY_API_KEY, TAVILY_API_KEY2, ... の全キーで負荷分散）
+# 起動時間を短くするため最初の検索時に作成する
+tavily_keys: list[TavilyKey] | None = None
+_tavily_keys_lock = threading.Lock()
+
+# 全セッション共通の検索結果キャッシュ（同じ話題の再検索でTavilyの枠を消費しない）
+search_cache = SearchCache()
+
+# ヘッジ先のキーの利用率がこれ未満のときだけヘッジする（枠に余裕のないキーを二重消費しない）
+_HEDGE_MAX_QUOTA_RATIO = 0.5
+
+_EXHAUSTED_MESSAGE = "現在、利用殺到でみのるんの検索API無料枠が枯渇したようです。修正をお待ちください"
+
+
+def get_tavily_keys() -> list[TavilyKey]:
+    """Tavilyクライアントを取得（初回に環境変数のキーから作成）"""
+    global tavily_keys
+    if tavily_keys is None:
+        with _tavily_keys_lock:
+            if tavily_keys is None:
+                tavily_keys = build_tavily_keys(
+                    discover_api_keys(),
+                    TAVILY_API_BASE_URL,
+                    ledger=QuotaLedger(TAVILY_USAGE_PATH),
+                )
+    return tavily_keys
 
 
 def get_last_search_result() -> str | None:
-    """最後の検索結果を取得"""
-    return _last_search_result
+    """現在のリクエストで最後に取得した検索結果を取得（フォールバック用）"""
+    return current_request_state().last_search_result
+
+
+def get_search_metrics() -> dict:
+    """APIキーごとの状態とレイテンシヒストグラムを返す"""
+    return {key.name: key.snapshot() for key in tavily_keys or []}
+
 
+def get_search_cache_stats() -> dict:
+    """検索結果キャッシュのヒット率などを返す"""
+    return search_cache.stats()
 
-def reset_last_search_result() -> None:
-    """検索結果をリセット"""
-    global _last_search_result
-    _last_search_result = None
 
+def _format_results(results: dict) -> str:
+    """検索結果をテキストに整形"""
+    formatted_results = []
+    for result in results.get("results", []):
+        title = result.get("title", "")
+        content = result.get("content", "")
+        url = result.get("url", "")
+        formatted_results.append(f"**{title}**\n{content}\nURL: {url}")
+    return "\n\n---\n\n".join(formatted_results) if formatted_results else "検索結果がありませんでした"
 
-@tool
-def web_search(query: str) -> str:
+
+async def _attempt(key: TavilyKey, query: str) -> tuple[str, object]:
+    """1本のキーで検索し、("ok", 結果) / ("retry", 例外) / ("error", 例外) を返す"""
+    from tavily.errors import ForbiddenError, UsageLimitExceededError
+
+    key.record_request()
+    started = time.monotonic()
+    try:
+        results = await key.client.search(
+            query=query,
+            max_results=5,
+            search_depth=TAVILY_SEARCH_DEPTH,
+        )
+    except UsageLimitExceededError as e:
+        key.mark_rate_limited()
+        return "retry", e
+    except ForbiddenError as e:
+        # 432/433: プランの利用上限（月間枠）。それ以外の403はエラー
+        error_str = str(e).lower()
+        if "limit" in error_str or "plan" in error_str or "quota" in error_str:
+            key.mark_exhausted()
+            return "retry", e
+        return "error", e
+    except Exception as e:
+        # rate limit系のエラーなら次のキーで再試行、それ以外は即座にエラー返却
+        error_str = str(e).lower()
+        if "usage limit" in error_str or "quota" in error_str:
+            key.mark_exhausted()
+            return "retry", e
+        if "rate limit" in error_str or "429" in error_str:
+            key.mark_rate_limited()
+            return "retry", e
+        return "error", e
+
+    key.record_success(time.monotonic() - started)
+    return "ok", results
+
+
+async def search_tavily(query: str) -> tuple[str, bool]:
+    """利用可能なキーで検索（遅い場合は別キーでヘッジ、制限時は即座に次のキーへ）
+
+    - クールダウン中・枯渇中・月間上限間近のキーは試さず、今月の利用率が低いキーから使う
+    - 最初のキーがTAVILY_HEDGE_DELAY秒以内に応答しなければ次のキーも並行して実行し、
+      先に成功した結果を使う（次のキーの利用率が_HEDGE_MAX_QUOTA_RATIO未満のときのみ）
+    - 制限以外のエラーでも、並行中の検索が残っていればその結果を待ってから返す
+
+    Returns:
+        (検索結果またはエラーメッセージのテキスト, 成功したか)
+    """
+    candidates = schedule_keys(get_tavily_keys())
+    if not candidates:
+        return _EXHAUSTED_MESSAGE, False
+
+    next_index = 0
+    pending: set[asyncio.Task] = set()
+    error: Exception | None = None
+
+    def launch_next() -> None:
+        nonlocal next_index
+        key = candidates[next_index]
+        next_index += 1
+        pending.add(asyncio.create_task(_attempt(key, query)))
+
+    launch_next()
+    try:
+        while pending:
+            # 候補は利用率の低い順なので、次のキーが半分未満なら2本以上のキーに余裕がある
+            can_hedge = (
+                error is None
+                and TAVILY_HEDGE_DELAY > 0
+                and next_index < len(candidates)
+                and candidates[next_index].quota_ratio() < _HEDGE_MAX_QUOTA_RATIO
+            )
+            done, _ = await asyncio.wait(
+                pending,
+                timeout=TAVILY_HEDGE_DELAY if can_hedge else None,
+                return_when=asyncio.FIRST_COMPLETED,
+            )
+            if not done:
+                print(f"[INFO] Tavily search slow, hedging with key {candidates[next_index].name}")
+                launch_next()
+                continue
+
+            for task in done:
+                pending.discard(task)
+                status, value = task.result()
+                if status == "ok":
+                    return _format_results(value), True
+                if status == "error" and error is None:
+                    error = value
+
+            # 制限系のエラー: 次のキーをすぐに試す（制限以外のエラー後は新しいキーを使わない）
+            if error is None and not pending and next_index < len(candidates):
+                launch_next()
+    finally:
+        for task in pending:
+            task.cancel()
+
+    if error is not None:
+        return f"検索エラー: {str(error)}", False
+    # 全キー枯渇
+    return _EXHAUSTED_MESSAGE, False
+
+
+@tool(context=True)
+async def web_search(query: str, tool_context: ToolContext | None = None) -> str:
     """Web検索を実行して最新情報を取得します。スライド作成に必要な情報を調べる際に使用してください。
 
     Args:
@@ -36,39 +179,20 @@ def web_search(query: str) -> str:
     Returns:
         検索結果のテキスト
     """
-    global _last_search_result
-
-    if not tavily_clients:
-        return "Web検索機能は現在利用できません（APIキー未設定）"
-
-    # 複数APIキーで順番に試行（無料枠の月5000リクエスト制限対策）
-    for client in tavily_clients:
-        try:
-            results = client.search(
-                query=query,
-                max_results=5,
-                search_depth="advanced",
-            )
-            # レスポンス内に利用制限エラーが含まれていたら次のキーで再試行
-            results_str = str(results).lower()
-            if "usage limit" in results_str or "exceeds your plan" in results_str:
-                continue
-            # 検索結果をテキストに整形
-            formatted_results = []
-            for result in results.get("results", []):
-                title = result.get("title", "")
-                content = result.get("content", "")
-                url = result.get("url", "")
-                formatted_results.append(f"**{title}**\n{content}\nURL: {url}")
-            search_result = "\n\n---\n\n".join(formatted_results) if formatted_results else "検索結果がありませんでした"
-            _last_search_result = search_result  # フォールバック用に保存
-            return search_result
-        except Exception as e:
-            # rate limit系のエラーなら次のキーで再試行、それ以外は即座にエラー返却
-            error_str = str(e).lower()
-            if "rate limit" in error_str or "429" in error_str or "quota" in error_str or "usage limit" in error_str:
-                continue
-            return f"検索エラー: {str(e)}"
+    with Stage("tool.web_search") as stage:
+        cached = search_cache.get(query)
+        stage.set(cached=cached is not None)
+        if cached is not None:
+            resolve_request_state(tool_context).last_search_result = cached  # フォールバック用に保存
+            return cached
 
-    # 全キー枯渇
-    return "現在、利用殺到でみのるんの検索API無料枠が枯渇したようです。修正をお待ちください"
+        if not get_tavily_keys():
+            return "Web検索機能は現在利用できません（APIキー未設定）"
+
+        search_result, succeeded = await search_tavily(query)
+        stage.set(succeeded=succeeded)
+        if succeeded:
+            # SQLiteへの書き込みでイベントループを止めない
+            await asyncio.to_thread(search_cache.put, query, search_result)
+            resolve_request_state(tool_context).last_search_result = search_result  # フォールバック用に保存
+        return search_result
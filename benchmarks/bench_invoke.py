@@ -0,0 +1,273 @@
+"""invoke のオフラインベンチマーク（偽のモデルストリーム・検索・Marpを使用）
+
+stream_async のイベント列（合成、または記録したJSONL）を invoke に流し、
+シナリオ・デッキサイズ・同時実行数ごとに以下を表示する。
+
+- throughput: 1秒あたりに完了したリクエスト数
+- p50 / p99: 1リクエストの所要時間
+- per-event: モデルのイベント1件あたりの処理時間（全体の経過時間 / 処理したイベント数）
+- peak: tracemalloc で計測したピークメモリ
+- busy: エクスポートの待ち行列が上限に達して断ったリクエスト数（同時実行数が多い場合）
+
+混雑で断られたリクエストはすぐに返るので、throughput・p50 / p99・per-event には含めず busy にだけ数える。
+
+    python benchmarks/bench_invoke.py
+    python benchmarks/bench_invoke.py recorded.jsonl   # 記録したイベント列（1行1イベント）も計測
+
+記録したイベント列は kimi として流す（model_type はファイル名に "claude" を含めば claude）。
+"""
+
+import asyncio
+import contextlib
+import importlib
+import io
+import json
+import math
+import sys
+import time
+import tracemalloc
+from dataclasses import dataclass
+from pathlib import Path
+from types import SimpleNamespace
+
+sys.path.insert(0, str(Path(__file__).parent.parent / "amplify" / "agent" / "runtime"))
+
+import agent as agent_module  # noqa: E402
+from exports import slide_exporter  # noqa: E402
+from tools import output_slide, web_search  # noqa: E402
+from tools.search_cache import SearchCache  # noqa: E402
+
+web_search_module = importlib.import_module("tools.web_search")
+
+DECK_SIZES = (5, 20, 60)
+CONCURRENCY_LEVELS = (1, 8, 32)
+INVOCATIONS_PER_LEVEL = 64
+TEXT_CHUNK_SIZE = 8  # テキストストリームの1チャンクの文字数
+TOOL_INPUT_CHUNK_SIZE = 32  # ツール入力（累積JSON）が1イベントで伸びる文字数
+
+
+@dataclass
+class RunTool:
+    """偽Agentがこの位置でツールを実行する"""
+
+    tool: object
+    tool_input: dict
+
+
+class ScriptedAgent:
+    """試行ごとのイベント列を順に返す偽Agent（最後の試行はリトライ後も繰り返す）"""
+
+    def __init__(self, attempts: list[list]):
+        self.messages = []
+        self._attempts = attempts
+        self._calls = 0
+
+    async def stream_async(self, prompt, invocation_state=None, cancel_signal=None):
+        steps = self._attempts[min(self._calls, len(self._attempts) - 1)]
+        self._calls += 1
+        for step in steps:
+            if cancel_signal is not None and cancel_signal.is_set():
+                return
+            if isinstance(step, RunTool):
+                tool_use = {"toolUseId": "tooluse_bench", "name": step.tool.tool_name, "input": step.tool_input}
+                async for _ in step.tool.stream(tool_use, {**invocation_state, "agent": self}):
+                    pass
+            else:
+                yield step
+            # 実際のストリームと同様に他のリクエストへ制御を渡す
+            await asyncio.sleep(0)
+
+
+class FakeRendererPool:
+    """入力サイズに比例したバイト列を返すレンダラー"""
+
+    def render_batch(self, jobs, theme, allow_html, on_result=None):
+        return [b"%PDF-" + b"\0" * (len(markdown) * 20) for markdown, _ in jobs]
+
+
+async def _fake_search_tavily(query: str) -> tuple[str, bool]:
+    return f"## 検索結果: {query}\n\n" + "検索結果の本文です。" * 100, True
+
+
+# ---- イベント列の生成 ----
+
+def make_deck(slides: int) -> str:
+    body = "\n\n---\n\n".join(
+        f"# スライド{i + 1}\n\n- ポイントA: 説明文\n- ポイントB: 説明文\n- ポイントC: 説明文" for i in range(slides)
+    )
+    return f"---\nmarp: true\ntheme: gradient\npaginate: true\n---\n\n{body}\n"
+
+
+def text_events(text: str, key: str = "data") -> list[dict]:
+    events = []
+    for i in range(0, len(text), TEXT_CHUNK_SIZE):
+        chunk = text[i:i + TEXT_CHUNK_SIZE]
+        events.append({"reasoningText": chunk, "reasoning": True} if key == "reasoning" else {"data": chunk})
+    return events
+
+
+def tool_events(tool, tool_input: dict, tool_use_id: str) -> list:
+    """生成途中のツール入力（累積JSON文字列）のイベントと、最後にツールの実行"""
+    raw = json.dumps(tool_input, ensure_ascii=False)
+    events = [
+        {"current_tool_use": {"toolUseId": tool_use_id, "name": tool.tool_name, "input": raw[:end]}}
+        for end in range(TOOL_INPUT_CHUNK_SIZE, len(raw) + TOOL_INPUT_CHUNK_SIZE, TOOL_INPUT_CHUNK_SIZE)
+    ]
+    return events + [RunTool(tool, tool_input)]
+
+
+def claude_scenario(deck: str) -> tuple[str, list[list]]:
+    steps = text_events("最新情報を調べてからスライドを作成します。")
+    steps += tool_events(web_search, {"query": "AWS 最新アップデート"}, "tooluse_search")
+    steps += tool_events(output_slide, {"markdown": deck}, "tooluse_slide")
+    steps += text_events("スライドを作成しました。")
+    return "claude", [steps]
+
+
+def kimi_think_scenario(deck: str) -> tuple[str, list[list]]:
+    thinking = "<think>" + "構成を考えています。" * 40 + "</think>"
+    steps = text_events(thinking + "スライドを作成します。\n\n" + deck)
+    return "kimi", [steps]
+
+
+def kimi_corrupted_scenario(deck: str) -> tuple[str, list[list]]:
+    corrupted = text_events("作成します。") + [
+        {"current_tool_use": {"name": "functions.output_slide:0<|tool_call_argument_begin|>", "input": {}}}
+    ] + text_events(deck)
+    healthy = tool_events(output_slide, {"markdown": deck}, "tooluse_slide")
+    return "kimi", [corrupted, healthy]
+
+
+def reasoning_scenario(deck: str) -> tuple[str, list[list]]:
+    reasoning = "構成を検討します。" * 200 + "\n" + deck
+    content = SimpleNamespace(reasoningContent=SimpleNamespace(reasoningText=SimpleNamespace(text=reasoning)))
+    result = SimpleNamespace(message=SimpleNamespace(content=[content]))
+    steps = text_events(reasoning, key="reasoning") + [{"result": result}]
+    return "kimi", [steps]
+
+
+def recorded_scenario(path: Path):
+    events = [json.loads(line) for line in path.read_text(encoding="utf-8").splitlines() if line.strip()]
+    model_type = "claude" if "claude" in path.name else "kimi"
+    return lambda deck: (model_type, [events])
+
+
+SCENARIOS = {
+    "claude": claude_scenario,
+    "kimi-think": kimi_think_scenario,
+    "kimi-corrupted": kimi_corrupted_scenario,
+    "reasoning": reasoning_scenario,
+}
+
+
+# ---- 計測 ----
+
+@contextlib.contextmanager
+def stubbed():
+    """検索・レンダラー・リトライ待ちを差し替える"""
+    patches = [
+        (web_search_module, "search_tavily", _fake_search_tavily),
+        (web_search_module, "tavily_keys", [object()]),
+        (web_search_module, "search_cache", SearchCache(max_entries=0)),
+        (slide_exporter, "EXPORT_CACHE_MAX_BYTES", 0),
+        (slide_exporter, "MARP_POOL_SIZE", 1),
+        (slide_exporter, "get_renderer_pool", lambda: FakeRendererPool()),
+        (agent_module, "backoff_delay", lambda retry: 0),
+    ]
+    originals = [(target, name, getattr(target, name)) for target, name, _ in patches]
+    for target, name, value in patches:
+        setattr(target, name, value)
+    try:
+        with contextlib.redirect_stdout(io.StringIO()):
+            yield
+    finally:
+        for target, name, value in originals:
+            setattr(target, name, value)
+
+
+def percentile(values: list[float], p: float) -> float:
+    if not values:
+        return math.nan
+    ordered = sorted(values)
+    return ordered[max(0, math.ceil(len(ordered) * p / 100) - 1)]
+
+
+async def _invoke_once(payload: dict, latencies: list[float]) -> bool:
+    """1リクエストを最後まで読み、混雑で断られたかを返す（断られたものは所要時間に含めない）"""
+    started = time.perf_counter()
+    busy = False
+    async for event in agent_module.invoke(dict(payload)):
+        busy = busy or event.get("type") == "busy"
+    if not busy:
+        latencies.append(time.perf_counter() - started)
+    return busy
+
+
+async def _run_level(payload: dict, concurrency: int, rounds: int) -> tuple[list[float], float, int]:
+    latencies: list[float] = []
+    busy = 0
+    started = time.perf_counter()
+    for _ in range(rounds):
+        results = await asyncio.gather(*(_invoke_once(payload, latencies) for _ in range(concurrency)))
+        busy += sum(results)
+    return latencies, time.perf_counter() - started, busy
+
+
+def measure(payload: dict, agent_factory, events_per_invocation: int, concurrency: int) -> dict:
+    agent_module.get_or_create_agent = lambda session_id, model_type: agent_factory()
+    rounds = math.ceil(INVOCATIONS_PER_LEVEL / concurrency)
+    latencies, wall, busy = asyncio.run(_run_level(payload, concurrency, rounds))
+
+    # ピークメモリは計測のオーバーヘッドがあるため別に1ラウンドだけ流す
+    tracemalloc.start()
+    asyncio.run(_run_level(payload, concurrency, 1))
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    return {
+        "throughput": len(latencies) / wall,
+        "p50": percentile(latencies, 50),
+        "p99": percentile(latencies, 99),
+        "per_event": wall / (len(latencies) * max(events_per_invocation, 1)) if latencies else math.nan,
+        "peak": peak,
+        "busy": busy,
+    }
+
+
+def main() -> None:
+    scenarios = dict(SCENARIOS)
+    for arg in sys.argv[1:]:
+        scenarios[Path(arg).stem] = recorded_scenario(Path(arg))
+
+    original_factory = agent_module.get_or_create_agent
+    print(
+        f"{'scenario':>16} {'slides':>6} {'conc':>5} {'req/s':>9} {'p50 (ms)':>9} {'p99 (ms)':>9} "
+        f"{'us/event':>9} {'peak (MiB)':>10} {'busy':>5}"
+    )
+    try:
+        with stubbed():
+            for deck_size in DECK_SIZES:
+                deck = make_deck(deck_size)
+                runs = []
+                for name, scenario in scenarios.items():
+                    model_type, attempts = scenario(deck)
+                    events = sum(len(steps) for steps in attempts)
+                    payload = {"prompt": "AWSのスライドを作って", "model_type": model_type}
+                    runs.append((name, payload, lambda attempts=attempts: ScriptedAgent(attempts), events))
+                # エクスポートはモデルを呼ばない（1リクエスト = 1イベントとして扱う）
+                runs.append(("export-pdf", {"action": "export_pdf", "markdown": deck}, lambda: None, 1))
+
+                for name, payload, agent_factory, events in runs:
+                    for concurrency in CONCURRENCY_LEVELS:
+                        result = measure(payload, agent_factory, events, concurrency)
+                        sys.__stdout__.write(
+                            f"{name:>16} {deck_size:>6} {concurrency:>5} {result['throughput']:>9.1f} "
+                            f"{result['p50'] * 1000:>9.2f} {result['p99'] * 1000:>9.2f} "
+                            f"{result['per_event'] * 1e6:>9.1f} {result['peak'] / 2**20:>10.2f} {result['busy']:>5}\n"
+                        )
+    finally:
+        agent_module.get_or_create_agent = original_factory
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,81 @@
+"""Kimi K2ストリームフィルタのマイクロベンチマーク
+
+長い合成ストリーム（思考タグ・HTMLタグ混じりのテキスト）を小さなチャンクで流し、
+旧実装（毎チャンクでバッファ全体を検索）と KimiStreamFilter の処理時間を比較する。
+
+    python benchmarks/bench_kimi_stream.py
+"""
+
+import contextlib
+import io
+import sys
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).parent.parent / "amplify" / "agent" / "runtime"))
+
+from handlers import KimiStreamFilter  # noqa: E402
+
+CHUNK_SIZE = 8
+STREAM_LENGTHS = (10_000, 40_000, 160_000)
+
+
+def make_stream(length: int) -> list[str]:
+    """<think>ブロックと通常のタグを含む合成テキストをチャンクに分割"""
+    unit = "説明テキストです。a < b の比較と <b>強調</b> を含みます。<think>内部の思考</think>\n"
+    text = (unit * (length // len(unit) + 1))[:length]
+    return [text[i:i + CHUNK_SIZE] for i in range(0, len(text), CHUNK_SIZE)]
+
+
+def legacy_filter(chunks: list[str]) -> int:
+    """旧実装（agent.py にあったバッファ全体の再検索）"""
+    buffer, pending, skip, in_think, emitted = "", "", False, False, 0
+    for chunk in chunks:
+        buffer += chunk
+        if not skip and "marp: true" in buffer.lower():
+            skip = True
+        if skip:
+            continue
+        pending += chunk
+        while "<think>" in pending:
+            before, _, pending = pending.partition("<think>")
+            emitted += len(before)
+            in_think = True
+        while "</think>" in pending:
+            _, _, pending = pending.partition("</think>")
+            in_think = False
+        if not in_think:
+            safe_end = len(pending)
+            last_lt = pending.rfind("<")
+            if last_lt != -1 and len(pending) - last_lt <= 7:
+                safe_end = last_lt
+            emitted += safe_end
+            pending = pending[safe_end:]
+    return emitted
+
+
+def state_machine_filter(chunks: list[str]) -> int:
+    stream_filter = KimiStreamFilter()
+    emitted = sum(len(stream_filter.feed(chunk)) for chunk in chunks)
+    return emitted + len(stream_filter.flush())
+
+
+def bench(func, chunks: list[str]) -> float:
+    # タグ検出時のログ出力は計測から除く
+    with contextlib.redirect_stdout(io.StringIO()):
+        started = time.perf_counter()
+        func(chunks)
+        return time.perf_counter() - started
+
+
+def main() -> None:
+    print(f"{'chars':>10} {'chunks':>8} {'legacy (ms)':>12} {'filter (ms)':>12} {'filter ns/char':>15}")
+    for length in STREAM_LENGTHS:
+        chunks = make_stream(length)
+        legacy = bench(legacy_filter, chunks)
+        current = bench(state_machine_filter, chunks)
+        print(f"{length:>10} {len(chunks):>8} {legacy * 1000:>12.1f} {current * 1000:>12.1f} {current / length * 1e9:>15.1f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,85 @@
+"""ランタイムの起動時間の内訳（python -X importtime の集計）
+
+新しいPythonプロセスで agent をインポートし、app.run() を呼べるようになるまでの時間と、
+agent が直接インポートしているモジュールごとの累積時間、パッケージごとの自己時間を表示する。
+遅延インポートにしているサブシステム（エクスポート・共有・検索クライアント）が
+起動時に読み込まれていないことも確認する。
+
+    python benchmarks/startup_report.py
+"""
+
+import json
+import re
+import subprocess
+import sys
+from collections import defaultdict
+from pathlib import Path
+
+RUNTIME_DIR = Path(__file__).parent.parent / "amplify" / "agent" / "runtime"
+
+# 起動時には読み込まないモジュール（最初に使うリクエストで読み込む）
+LAZY_MODULES = ("exports", "sharing", "tavily", "pypdf")
+TOP_ENTRIES = 15
+
+_IMPORT_LINE = re.compile(r"^import time:\s+(\d+) \|\s+(\d+) \|( *)(\S+)$")
+
+_PROBE = f"""
+import json, sys, time
+started = time.perf_counter()
+import agent
+elapsed = time.perf_counter() - started
+print(json.dumps({{"seconds": elapsed, "loaded": [m for m in {LAZY_MODULES!r} if m in sys.modules]}}))
+"""
+
+
+def probe_startup(importtime: bool = False) -> tuple[dict, str]:
+    """新しいプロセスで agent をインポートし、(計測結果, importtimeの出力) を返す"""
+    command = [sys.executable] + (["-X", "importtime"] if importtime else []) + ["-c", _PROBE]
+    completed = subprocess.run(command, cwd=RUNTIME_DIR, capture_output=True, text=True, check=True)
+    return json.loads(completed.stdout.strip().splitlines()[-1]), completed.stderr
+
+
+def parse_importtime(output: str) -> list[tuple[int, int, int, str]]:
+    """(自己時間μs, 累積時間μs, 深さ, モジュール名) のリスト"""
+    entries = []
+    for line in output.splitlines():
+        match = _IMPORT_LINE.match(line)
+        if match:
+            depth = (len(match.group(3)) - 1) // 2
+            entries.append((int(match.group(1)), int(match.group(2)), depth, match.group(4)))
+    return entries
+
+
+def main() -> None:
+    result, _ = probe_startup()
+    _, importtime_output = probe_startup(importtime=True)
+    entries = parse_importtime(importtime_output)
+
+    print(f"import agent: {result['seconds'] * 1000:.0f} ms")
+    print(f"lazy subsystems loaded at startup: {', '.join(result['loaded']) or 'none'}")
+
+    # agent が直接インポートしているモジュール（累積時間）。子は親より先に出力される
+    direct: list[tuple[int, str]] = []
+    children: list[tuple[int, str]] = []
+    for _, cumulative, depth, name in entries:
+        if depth == 1:
+            children.append((cumulative, name))
+        elif depth == 0:
+            if name == "agent":
+                direct = children
+            children = []
+    print(f"\n{'direct import of agent':<40} {'cumulative (ms)':>16}")
+    for cumulative, name in sorted(direct, reverse=True)[:TOP_ENTRIES]:
+        print(f"{name:<40} {cumulative / 1000:>16.1f}")
+
+    # トップレベルのパッケージごとの自己時間の合計（どのライブラリに時間がかかっているか）
+    by_package: dict[str, int] = defaultdict(int)
+    for self_time, _, _, name in entries:
+        by_package[name.split(".")[0]] += self_time
+    print(f"\n{'package':<40} {'self total (ms)':>16}")
+    for package, self_time in sorted(by_package.items(), key=lambda item: item[1], reverse=True)[:TOP_ENTRIES]:
+        print(f"{package:<40} {self_time / 1000:>16.1f}")
+
+
+if __name__ == "__main__":
+    main()
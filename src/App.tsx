@@ -5,7 +5,7 @@ import { Chat } from './components/Chat';
 import { SlidePreview } from './components/SlidePreview';
 import { ShareConfirmModal } from './components/ShareConfirmModal';
 import { ShareResultModal } from './components/ShareResultModal';
-import { exportPdf, exportPdfMock, exportPptx, exportPptxMock, shareSlide, shareSlideMock } from './hooks/useAgentCore';
+import { exportPdf, exportPdfMock, exportPptx, exportPptxMock, exportSlideBatch, exportSlideBatchMock, shareSlide, shareSlideMock } from './hooks/useAgentCore';
 import type { ShareResult } from './hooks/useAgentCore';
 
 // モック使用フラグ（ローカル開発用：認証スキップ＆モックAPI）
@@ -78,6 +78,8 @@ function App() {
 function MainApp({ signOut }: { signOut?: () => void }) {
   const [activeTab, setActiveTab] = useState<Tab>('chat');
   const [markdown, setMarkdown] = useState('');
+  // 生成途中のスライド（プレビュー専用。確定したら markdown に反映）
+  const [streamingMarkdown, setStreamingMarkdown] = useState<string | null>(null);
   const [isDownloading, setIsDownloading] = useState(false);
   const [editPromptTrigger, setEditPromptTrigger] = useState(0);
   const [sharePromptTrigger, setSharePromptTrigger] = useState(0);
@@ -92,10 +94,23 @@ function MainApp({ signOut }: { signOut?: () => void }) {
   const [shareResult, setShareResult] = useState<ShareResult | null>(null);
   const [pendingShareTheme, setPendingShareTheme] = useState<string>('gradient');
 
+  // 生成途中のスライドでプレビュータブに切り替え済みか（1回の生成で1回だけ切り替える）
+  const isStreamingSlidesRef = useRef(false);
+
   const handleMarkdownGenerated = (newMarkdown: string) => {
     setMarkdown(newMarkdown);
     // スライド生成後、自動でプレビュータブに切り替え
-    setActiveTab('preview');
+    if (!isStreamingSlidesRef.current) {
+      setActiveTab('preview');
+    }
+  };
+
+  const handleSlidesStreamed = (partialMarkdown: string | null) => {
+    if (partialMarkdown !== null && !isStreamingSlidesRef.current) {
+      setActiveTab('preview');
+    }
+    isStreamingSlidesRef.current = partialMarkdown !== null;
+    setStreamingMarkdown(partialMarkdown);
   };
 
   const handleRequestEdit = () => {
@@ -188,6 +203,43 @@ function MainApp({ signOut }: { signOut?: () => void }) {
     }
   };
 
+  // PDF/PPTXを1リクエストで変換し、届いた形式から順にダウンロード
+  // ※ 複数タブを開くとポップアップブロックされるため、ダウンロードリンクで保存する
+  const handleDownloadAll = async (theme: string) => {
+    if (!markdown) return;
+
+    setIsDownloading(true);
+    try {
+      const exportFn = useMock ? exportSlideBatchMock : exportSlideBatch;
+      await exportFn(markdown, ['pdf', 'pptx'], (format, result) => {
+        if (!(result instanceof Blob)) return;
+        const url = URL.createObjectURL(result);
+        const a = document.createElement('a');
+        a.href = url;
+        a.download = `slide.${format}`;
+        document.body.appendChild(a);
+        a.click();
+        document.body.removeChild(a);
+        setTimeout(() => URL.revokeObjectURL(url), 1000);
+      }, theme);
+
+      if (useMock) {
+        alert('モックモード: マークダウンファイルをダウンロードしました。');
+      }
+
+      setActiveTab('chat');
+      if (!hasShownSharePrompt) {
+        setSharePromptTrigger(prev => prev + 1);
+        setHasShownSharePrompt(true);
+      }
+    } catch (error) {
+      console.error('Download error:', error);
+      alert(`ダウンロードに失敗しました: ${error instanceof Error ? error.message : '不明なエラー'}`);
+    } finally {
+      setIsDownloading(false);
+    }
+  };
+
   // スライド共有リクエスト（確認モーダルを表示）
   const handleShareRequest = (theme: string) => {
     setPendingShareTheme(theme);
@@ -268,6 +320,7 @@ function MainApp({ signOut }: { signOut?: () => void }) {
         <div className={`h-full ${activeTab === 'chat' ? '' : 'hidden'}`}>
           <Chat
             onMarkdownGenerated={handleMarkdownGenerated}
+            onSlidesStreamed={handleSlidesStreamed}
             currentMarkdown={markdown}
             inputRef={chatInputRef}
             editPromptTrigger={editPromptTrigger}
@@ -277,9 +330,10 @@ function MainApp({ signOut }: { signOut?: () => void }) {
         </div>
         <div className={`h-full ${activeTab === 'preview' ? '' : 'hidden'}`}>
           <SlidePreview
-            markdown={markdown}
+            markdown={streamingMarkdown ?? markdown}
             onDownloadPdf={handleDownloadPdf}
             onDownloadPptx={handleDownloadPptx}
+            onDownloadAll={handleDownloadAll}
             onShareSlide={handleShareRequest}
             isDownloading={isDownloading}
             isSharing={isSharing}
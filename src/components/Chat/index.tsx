@@ -7,7 +7,7 @@ import { useStreamingText } from './hooks/useStreamingText';
 import { MessageList } from './MessageList';
 import { ChatInput } from './ChatInput';
 
-export function Chat({ onMarkdownGenerated, currentMarkdown, inputRef, editPromptTrigger, sharePromptTrigger, sessionId }: ChatProps) {
+export function Chat({ onMarkdownGenerated, onSlidesStreamed, currentMarkdown, inputRef, editPromptTrigger, sharePromptTrigger, sessionId }: ChatProps) {
   const [messages, setMessages] = useState<Message[]>([]);
   const [input, setInput] = useState('');
   const [isLoading, setIsLoading] = useState(false);
@@ -139,6 +139,8 @@ export function Chat({ onMarkdownGenerated, currentMarkdown, inputRef, editPromp
 
     try {
       const invoke = useMock ? invokeAgentMock : invokeAgent;
+      // 生成途中に届いたスライド（完成した順にプレビューへ反映）
+      let streamedSlides: string[] = [];
 
       await invoke(userMessage, currentMarkdown, {
         // テキストストリーム受信時の処理
@@ -188,7 +190,7 @@ export function Chat({ onMarkdownGenerated, currentMarkdown, inputRef, editPromp
             )
           );
 
-          if (toolName === 'output_slide') {
+          if (toolName === 'output_slide' || toolName === 'patch_slides') {
             setMessages(prev => {
               const hasExisting = prev.some(
                 msg => msg.isStatus && msg.statusText?.startsWith(MESSAGES.SLIDE_GENERATING_PREFIX)
@@ -227,8 +229,15 @@ export function Chat({ onMarkdownGenerated, currentMarkdown, inputRef, editPromp
             });
           }
         },
+        onSlide: (index, slide, frontMatter) => {
+          // index 0 は新しいデッキの始まり
+          streamedSlides = index === 0 ? [slide] : [...streamedSlides.slice(0, index), slide];
+          // 確定したデッキ（次のターンの送信・エクスポート対象）は markdown イベントまで変えない
+          onSlidesStreamed?.(`---\n${frontMatter}\n---\n\n${streamedSlides.join('\n\n---\n\n')}`);
+        },
         onMarkdown: (markdown) => {
           onMarkdownGenerated(markdown);
+          onSlidesStreamed?.(null);
           stopTipRotation();
           // output_slideのステータスを完了状態に更新
           setMessages(prev =>
@@ -296,6 +305,8 @@ export function Chat({ onMarkdownGenerated, currentMarkdown, inputRef, editPromp
         }
       });
     } finally {
+      // エラー・中断で markdown イベントが届かなかった場合は確定前のデッキの表示に戻す
+      onSlidesStreamed?.(null);
       setIsLoading(false);
       setStatus('');
       stopTipRotation();
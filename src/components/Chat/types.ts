@@ -11,6 +11,8 @@ export interface Message {
 
 export interface ChatProps {
   onMarkdownGenerated: (markdown: string) => void;
+  // 生成途中のスライド（プレビュー表示のみ。nullで終了し、確定前のデッキに戻す）
+  onSlidesStreamed?: (markdown: string | null) => void;
   currentMarkdown: string;
   inputRef?: React.RefObject<HTMLInputElement | null>;
   editPromptTrigger?: number;  // 値が変わるたびに修正用メッセージを表示
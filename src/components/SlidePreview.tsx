@@ -19,13 +19,14 @@ interface SlidePreviewProps {
   markdown: string;
   onDownloadPdf: (theme: string) => void;
   onDownloadPptx: (theme: string) => void;
+  onDownloadAll: (theme: string) => void;
   onShareSlide: (theme: string) => void;
   isDownloading: boolean;
   isSharing: boolean;
   onRequestEdit?: () => void;
 }
 
-export function SlidePreview({ markdown, onDownloadPdf, onDownloadPptx, onShareSlide, isDownloading, isSharing: _isSharing, onRequestEdit }: SlidePreviewProps) {
+export function SlidePreview({ markdown, onDownloadPdf, onDownloadPptx, onDownloadAll, onShareSlide, isDownloading, isSharing: _isSharing, onRequestEdit }: SlidePreviewProps) {
   void _isSharing; // propsとして受け取るが、このコンポーネントでは使用しない
   const containerRef = useRef<HTMLDivElement>(null);
   const dropdownRef = useRef<HTMLDivElement>(null);
@@ -189,6 +190,15 @@ export function SlidePreview({ markdown, onDownloadPdf, onDownloadPptx, onShareS
                 >
                   PPTX形式でダウンロード
                 </button>
+                <button
+                  onClick={() => {
+                    setIsDropdownOpen(false);
+                    onDownloadAll(selectedTheme);
+                  }}
+                  className="block w-full px-4 py-2 text-sm text-gray-700 hover:bg-gray-100 active:bg-gray-200 text-left border-t whitespace-nowrap"
+                >
+                  PDF・PPTXをまとめてダウンロード
+                </button>
                 <button
                   onClick={() => {
                     setIsDropdownOpen(false);
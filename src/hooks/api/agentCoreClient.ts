@@ -10,6 +10,7 @@ export interface AgentCoreCallbacks {
   onText: (text: string) => void;
   onStatus: (status: string) => void;
   onMarkdown: (markdown: string) => void;
+  onSlide?: (index: number, slide: string, frontMatter: string) => void;
   onTweetUrl?: (url: string) => void;
   onToolUse: (toolName: string, query?: string) => void;
   onError: (error: Error) => void;
@@ -49,7 +50,7 @@ export async function getAgentCoreConfig() {
  * イベントをコールバックに振り分け
  */
 function handleEvent(
-  event: { type?: string; content?: string; data?: string; error?: string; message?: string; query?: string },
+  event: { type?: string; content?: string; data?: string; error?: string; message?: string; query?: string; index?: number; frontMatter?: string },
   callbacks: AgentCoreCallbacks
 ) {
   const textValue = event.content || event.data;
@@ -64,6 +65,12 @@ function handleEvent(
     case 'markdown':
       if (textValue) callbacks.onMarkdown(textValue);
       break;
+    case 'slide':
+      // 生成途中の完成済みスライド（最終的なマークダウンは markdown イベントで届く）
+      if (textValue && typeof event.index === 'number' && callbacks.onSlide) {
+        callbacks.onSlide(event.index, textValue, event.frontMatter || '');
+      }
+      break;
     case 'tweet_url':
       if (textValue && callbacks.onTweetUrl) callbacks.onTweetUrl(textValue);
       break;
@@ -109,6 +116,7 @@ export async function invokeAgent(
         prompt,
         markdown: currentMarkdown,
         model_type: modelType,
+        stream_slides: true,
       }),
     });
 
@@ -4,7 +4,7 @@
  */
 
 import { getAgentCoreConfig } from './agentCoreClient';
-import { readSSEStream, base64ToBlob } from '../streaming/sseParser';
+import { readSSEStream, base64ToBlob, base64ToBytes } from '../streaming/sseParser';
 
 export type ExportFormat = 'pdf' | 'pptx';
 
@@ -13,8 +13,30 @@ const MIME_TYPES: Record<ExportFormat, string> = {
   pptx: 'application/vnd.openxmlformats-officedocument.presentationml.presentation',
 };
 
+/**
+ * チャンク配信されたバイト列を検証してBlobにまとめる
+ */
+async function assembleChunks(
+  chunks: Uint8Array<ArrayBuffer>[],
+  expectedCount: number,
+  expectedSha256: string,
+  mimeType: string
+): Promise<Blob> {
+  if (chunks.length !== expectedCount || chunks.some((chunk) => !chunk)) {
+    throw new Error('エクスポートデータの受信が不完全です');
+  }
+  const blob = new Blob(chunks, { type: mimeType });
+  const digest = await crypto.subtle.digest('SHA-256', await blob.arrayBuffer());
+  const sha256 = Array.from(new Uint8Array(digest), (b) => b.toString(16).padStart(2, '0')).join('');
+  if (sha256 !== expectedSha256) {
+    throw new Error('エクスポートデータのチェックサムが一致しません');
+  }
+  return blob;
+}
+
 /**
  * スライドをエクスポート（PDF/PPTX共通処理）
+ * ※ 大きなデッキでも1イベントが巨大にならないようチャンク配信を要求する
  */
 export async function exportSlide(
   markdown: string,
@@ -34,6 +56,7 @@ export async function exportSlide(
       action: `export_${format}`,
       markdown,
       theme,
+      delivery: 'chunked',
     }),
   });
 
@@ -47,16 +70,30 @@ export async function exportSlide(
   }
 
   let resultBlob: Blob | null = null;
+  const chunks: Uint8Array<ArrayBuffer>[] = [];
+  // コールバック内で代入するため、null初期値による型の絞り込みを避ける
+  let chunkEnd = null as { chunks: number; sha256: string } | null;
 
   await readSSEStream(reader, (event) => {
-    if (event.type === format && event.data) {
+    if (event.type === 'export_chunk' && event.format === format) {
+      chunks[event.seq as number] = base64ToBytes(event.data as string);
+    } else if (event.type === 'export_end' && event.format === format) {
+      chunkEnd = { chunks: event.chunks as number, sha256: event.sha256 as string };
+      return 'stop';
+    } else if (event.type === format && event.data) {
+      // 一括配信（旧形式）
       resultBlob = base64ToBlob(event.data as string, MIME_TYPES[format]);
       return 'stop';
-    } else if (event.type === 'error') {
+    } else if (event.type === 'error' || event.type === 'busy') {
       throw new Error((event.message || event.error || `${format.toUpperCase()}生成エラー`) as string);
     }
   });
 
+  if (chunkEnd) {
+    const { chunks: expectedCount, sha256 } = chunkEnd;
+    resultBlob = await assembleChunks(chunks, expectedCount, sha256, MIME_TYPES[format]);
+  }
+
   if (!resultBlob) {
     throw new Error(`${format.toUpperCase()}生成に失敗しました`);
   }
@@ -119,7 +156,7 @@ export async function shareSlide(markdown: string, theme: string = 'gradient'):
         expiresAt: event.expiresAt as number,
       };
       return 'stop';
-    } else if (event.type === 'error') {
+    } else if (event.type === 'error' || event.type === 'busy') {
       throw new Error((event.message || event.error || 'スライド共有エラー') as string);
     }
   });
@@ -130,3 +167,75 @@ export async function shareSlide(markdown: string, theme: string = 'gradient'):
 
   return result;
 }
+
+export type BatchExportFormat = ExportFormat | 'share';
+
+/**
+ * 複数形式を1リクエストでエクスポート
+ * ※ PDF/PPTXは1回のレンダリングでまとめて変換され、揃った形式から onResult が呼ばれる
+ */
+export async function exportSlideBatch(
+  markdown: string,
+  formats: BatchExportFormat[],
+  onResult: (format: BatchExportFormat, result: Blob | ShareResult) => void,
+  theme: string = 'gradient'
+): Promise<void> {
+  const { url, accessToken } = await getAgentCoreConfig();
+
+  const response = await fetch(url, {
+    method: 'POST',
+    headers: {
+      'Content-Type': 'application/json',
+      'Accept': 'text/event-stream',
+      'Authorization': `Bearer ${accessToken}`,
+    },
+    body: JSON.stringify({
+      action: 'export_batch',
+      markdown,
+      formats,
+      theme,
+      delivery: 'chunked',
+    }),
+  });
+
+  if (!response.ok) {
+    throw new Error(`API Error: ${response.status} ${response.statusText}`);
+  }
+
+  const reader = response.body?.getReader();
+  if (!reader) {
+    throw new Error('Response body is not readable');
+  }
+
+  const chunksByFormat: Partial<Record<ExportFormat, Uint8Array<ArrayBuffer>[]>> = {};
+  const pending: Promise<void>[] = [];
+  const received = new Set<BatchExportFormat>();
+
+  await readSSEStream(reader, (event) => {
+    const format = event.format as ExportFormat;
+    if (event.type === 'export_start') {
+      chunksByFormat[format] = [];
+    } else if (event.type === 'export_chunk') {
+      chunksByFormat[format]![event.seq as number] = base64ToBytes(event.data as string);
+    } else if (event.type === 'export_end') {
+      const chunks = chunksByFormat[format]!;
+      received.add(format);
+      pending.push(
+        assembleChunks(chunks, event.chunks as number, event.sha256 as string, MIME_TYPES[format]).then((blob) =>
+          onResult(format, blob)
+        )
+      );
+    } else if (event.type === 'share_result' && event.url) {
+      received.add('share');
+      onResult('share', { url: event.url as string, expiresAt: event.expiresAt as number });
+    } else if (event.type === 'error' || event.type === 'busy') {
+      throw new Error((event.message || event.error || 'エクスポートエラー') as string);
+    }
+  });
+
+  await Promise.all(pending);
+  const missing = formats.filter((format) => !received.has(format));
+  if (missing.length > 0) {
+    throw new Error(`${missing.join(', ').toUpperCase()}のエクスポートに失敗しました`);
+  }
+}
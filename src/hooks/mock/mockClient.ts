@@ -3,7 +3,7 @@
  */
 
 import type { AgentCoreCallbacks, ModelType } from '../api/agentCoreClient';
-import type { ShareResult } from '../api/exportClient';
+import type { BatchExportFormat, ShareResult } from '../api/exportClient';
 
 const sleep = (ms: number) => new Promise(resolve => setTimeout(resolve, ms));
 
@@ -96,3 +96,18 @@ export async function shareSlideMock(_markdown: string, _theme: string = 'gradie
     expiresAt: Math.floor(Date.now() / 1000) + 7 * 24 * 60 * 60,
   };
 }
+
+/**
+ * 一括エクスポートモック
+ */
+export async function exportSlideBatchMock(
+  markdown: string,
+  formats: BatchExportFormat[],
+  onResult: (format: BatchExportFormat, result: Blob | ShareResult) => void,
+  theme: string = 'gradient'
+): Promise<void> {
+  await sleep(1000);
+  for (const format of formats) {
+    onResult(format, format === 'share' ? await shareSlideMock(markdown, theme) : new Blob([markdown], { type: 'text/markdown' }));
+  }
+}
@@ -44,13 +44,20 @@ export async function readSSEStream(
 }
 
 /**
- * Base64文字列をBlobに変換
+ * Base64文字列をバイト列に変換
  */
-export function base64ToBlob(base64: string, mimeType: string): Blob {
+export function base64ToBytes(base64: string): Uint8Array<ArrayBuffer> {
   const binaryString = atob(base64);
   const bytes = new Uint8Array(binaryString.length);
   for (let i = 0; i < binaryString.length; i++) {
     bytes[i] = binaryString.charCodeAt(i);
   }
-  return new Blob([bytes], { type: mimeType });
+  return bytes;
+}
+
+/**
+ * Base64文字列をBlobに変換
+ */
+export function base64ToBlob(base64: string, mimeType: string): Blob {
+  return new Blob([base64ToBytes(base64)], { type: mimeType });
 }
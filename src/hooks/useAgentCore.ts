@@ -5,11 +5,11 @@
 
 // 型定義
 export type { AgentCoreCallbacks, ModelType } from './api/agentCoreClient';
-export type { ShareResult, ExportFormat } from './api/exportClient';
+export type { ShareResult, ExportFormat, BatchExportFormat } from './api/exportClient';
 
 // 本番API
 export { invokeAgent } from './api/agentCoreClient';
-export { exportPdf, exportPptx, exportSlide, shareSlide } from './api/exportClient';
+export { exportPdf, exportPptx, exportSlide, exportSlideBatch, shareSlide } from './api/exportClient';
 
 // モック（ローカル開発用）
-export { invokeAgentMock, exportPdfMock, exportPptxMock, shareSlideMock } from './mock/mockClient';
+export { invokeAgentMock, exportPdfMock, exportPptxMock, exportSlideBatchMock, shareSlideMock } from './mock/mockClient';
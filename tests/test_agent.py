@@ -17,7 +17,7 @@ def test_web_search():
     query = "Claude 4 Opus 2025"
     print(f"検索クエリ: {query}\n")
 
-    result = web_search(query)
+    result = asyncio.run(web_search(query))
     print(f"検索結果:\n{result[:500]}..." if len(result) > 500 else f"検索結果:\n{result}")
     print()
     return result
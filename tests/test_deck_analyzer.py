@@ -0,0 +1,75 @@
+"""デッキの事前チェック（はみ出し・絵文字・フロントマター）のテスト"""
+import asyncio
+import sys
+from pathlib import Path
+
+# ランタイムディレクトリをパスに追加
+sys.path.insert(0, str(Path(__file__).parent.parent / "amplify" / "agent" / "runtime"))
+
+import agent as agent_module
+from deck import analyze_deck
+from exports import slide_exporter
+from tools import output_slide
+
+FRONT_MATTER = "---\nmarp: true\ntheme: gradient\npaginate: true\n---\n\n"
+OVERFLOW_SLIDE = "# 多すぎる\n\n" + "\n".join(f"- 項目{i}" for i in range(10))
+CLEAN_SLIDE = (
+    "<!-- _class: lead -->\n# 表のスライド\n\n| A | B |\n|---|---|\n| 1 | 2 |\n\n"
+    "```python\nprint('🚀')\n```"
+)
+
+
+def _codes(markdown: str) -> list[tuple[str, int | None, bool]]:
+    return [(f.code, f.slide, f.blocking) for f in analyze_deck(markdown)]
+
+
+def test_overflow_and_emoji_are_reported_per_slide():
+    markdown = FRONT_MATTER + "\n\n---\n\n".join(["# タイトル\n## サブタイトル", OVERFLOW_SLIDE, "# 完成 ✅", CLEAN_SLIDE])
+    assert _codes(markdown) == [("overflow", 2, False), ("emoji", 3, False)]
+
+
+def test_malformed_front_matter_blocks_export():
+    assert _codes("---\nmarp: true\n\n# タイトル\n") == [("front_matter", None, True)]
+    assert _codes("---\nmarp: true\nこれはYAMLではない\n---\n\n# タイトル\n") == [("front_matter", None, True)]
+    assert _codes("# タイトル\n") == [("front_matter", None, False)]
+
+
+class OverflowAgent:
+    def __init__(self):
+        self.messages = []
+        self.tool_results = []
+
+    async def stream_async(self, prompt, invocation_state=None, cancel_signal=None):
+        yield {"data": "作成します"}
+        tool_use = {"toolUseId": "tooluse_test", "name": "output_slide", "input": {"markdown": FRONT_MATTER + OVERFLOW_SLIDE}}
+        async for event in output_slide.stream(tool_use, {**invocation_state, "agent": self}):
+            self.tool_results.append(event)
+
+
+def test_output_slide_returns_findings_to_model(monkeypatch):
+    fake_agent = OverflowAgent()
+    monkeypatch.setattr(agent_module, "get_or_create_agent", lambda session_id, model_type: fake_agent)
+
+    async def run():
+        return [event async for event in agent_module.invoke({"prompt": "作って", "model_type": "claude"})]
+
+    events = asyncio.run(run())
+
+    assert [e["data"] for e in events if e["type"] == "markdown"] == [FRONT_MATTER + OVERFLOW_SLIDE]
+    result_text = str(fake_agent.tool_results[-1])
+    assert "1枚目: 本文が10行あります" in result_text
+
+
+def test_broken_deck_is_rejected_before_rendering(monkeypatch):
+    def fail_render(*args, **kwargs):
+        raise AssertionError("Marp should not be launched")
+    monkeypatch.setattr(slide_exporter, "get_renderer_pool", fail_render)
+
+    async def run():
+        payload = {"action": "export_pdf", "markdown": "---\nmarp: true\n\n# タイトル\n"}
+        return [event async for event in agent_module.invoke(payload)]
+
+    [event] = asyncio.run(run())
+
+    assert event["type"] == "error"
+    assert "フロントマターが --- で閉じられていません" in event["message"]
@@ -0,0 +1,70 @@
+"""複数形式の一括エクスポートのテスト"""
+import asyncio
+import base64
+import sys
+import threading
+from pathlib import Path
+
+# ランタイムディレクトリをパスに追加
+sys.path.insert(0, str(Path(__file__).parent.parent / "amplify" / "agent" / "runtime"))
+
+import agent as agent_module
+import sharing
+from exports import slide_exporter
+
+DECK = "---\nmarp: true\n---\n\n# A\n\n---\n\n# B\n"
+
+
+class StepRendererPool:
+    """1件目を返したあと、呼び出し側が受け取るまで2件目の変換を待つレンダラー"""
+
+    def __init__(self):
+        self.sessions = []
+        self.first_delivered = threading.Event()
+
+    def render_batch(self, jobs, theme, allow_html, on_result=None):
+        self.sessions.append([output_format for _, output_format in jobs])
+        results = []
+        for i, (_, output_format) in enumerate(jobs):
+            if i == 1:
+                assert self.first_delivered.wait(5)
+            results.append(f"{output_format}-bytes".encode())
+            on_result(i, results[-1])
+        return results
+
+
+def test_formats_stream_from_one_render_session(monkeypatch):
+    pool = StepRendererPool()
+    monkeypatch.setattr(slide_exporter, "EXPORT_CACHE_MAX_BYTES", 0)
+    monkeypatch.setattr(slide_exporter, "MARP_POOL_SIZE", 1)
+    monkeypatch.setattr(slide_exporter, "get_renderer_pool", lambda: pool)
+
+    async def fake_share_slide(markdown, theme="gradient"):
+        return {"url": "https://example.com/slides/1/index.html", "expiresAt": 1}
+    monkeypatch.setattr(sharing, "share_slide", fake_share_slide)
+
+    async def run():
+        events = []
+        payload = {"action": "export_batch", "markdown": DECK, "formats": ["pdf", "pptx", "share", "pdf"]}
+        async for event in agent_module.invoke(payload):
+            events.append(event)
+            if event["type"] == "pdf":
+                pool.first_delivered.set()
+        return events
+
+    events = asyncio.run(run())
+
+    assert pool.sessions == [["pdf", "pptx"]]
+    assert [event["type"] for event in events] == ["pdf", "pptx", "share_result"]
+    assert base64.b64decode(events[1]["data"]) == b"pptx-bytes"
+
+
+def test_unknown_format_is_rejected():
+    async def run():
+        payload = {"action": "export_batch", "markdown": DECK, "formats": ["pdf", "docx"]}
+        return [event async for event in agent_module.invoke(payload)]
+
+    [event] = asyncio.run(run())
+
+    assert event["type"] == "error"
+    assert "docx" in event["message"]
@@ -0,0 +1,89 @@
+"""エクスポート結果キャッシュ（TTL・LRU・容量上限）のテスト"""
+import sys
+import time
+from pathlib import Path
+from types import SimpleNamespace
+
+import pytest
+
+# ランタイムディレクトリをパスに追加
+sys.path.insert(0, str(Path(__file__).parent.parent / "amplify" / "agent" / "runtime"))
+
+from exports import export_cache
+from exports.export_cache import ExportCache, make_cache_key
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    """キャッシュが使う時刻を進められるようにする"""
+    # 書き込んだファイルのアクセス時刻（実時刻）と比べられるよう、現在時刻から始める
+    now = [time.time()]
+    monkeypatch.setattr(export_cache, "time", SimpleNamespace(time=lambda: now[0]))
+    return now
+
+
+def test_expired_entry_is_removed(tmp_path, clock):
+    cache = ExportCache(tmp_path, max_bytes=1024, ttl=60)
+    cache.put("a", b"pdf")
+
+    clock[0] += 59
+    assert cache.get("a") == b"pdf"
+    # 読んでも書き込み時刻からのTTLは延びない
+    clock[0] += 2
+    assert cache.get("a") is None
+
+    assert not (tmp_path / "a.bin").exists()
+    stats = cache.stats()
+    assert (stats["entries"], stats["bytes"], stats["evictions"]) == (0, 0, 1)
+
+
+def test_least_recently_used_entry_is_evicted_over_budget(tmp_path, clock):
+    cache = ExportCache(tmp_path, max_bytes=30, ttl=60)
+    for key in ("a", "b", "c"):
+        cache.put(key, b"x" * 10)
+        clock[0] += 1
+    assert cache.get("a") is not None
+
+    cache.put("d", b"x" * 10)
+
+    assert cache.get("b") is None
+    assert all(cache.get(key) is not None for key in ("a", "c", "d"))
+    assert cache.stats()["bytes"] == 30
+
+
+def test_entry_larger_than_budget_is_not_stored(tmp_path, clock):
+    cache = ExportCache(tmp_path, max_bytes=30, ttl=60)
+    cache.put("a", b"x" * 10)
+
+    cache.put("big", b"x" * 31)
+
+    assert cache.get("big") is None
+    assert cache.get("a") == b"x" * 10
+    assert not (tmp_path / "big.bin").exists()
+
+
+def test_index_is_reloaded_in_access_order(tmp_path, clock):
+    cache = ExportCache(tmp_path, max_bytes=30, ttl=60)
+    for key in ("a", "b", "c"):
+        cache.put(key, b"x" * 10)
+        clock[0] += 1
+    cache.get("a")
+
+    # 再起動後に容量を減らすと、最後に使われたのが古いものから追い出す
+    restarted = ExportCache(tmp_path, max_bytes=20, ttl=60)
+
+    assert restarted.get("b") is None
+    assert restarted.get("a") == b"x" * 10
+    assert restarted.get("c") == b"x" * 10
+
+
+def test_cache_key_depends_on_markdown_theme_and_format():
+    key = make_cache_key("# A", "gradient", "pdf")
+
+    assert key == make_cache_key("# A", "gradient", "pdf")
+    others = [
+        make_cache_key("# B", "gradient", "pdf"),
+        make_cache_key("# A", "default", "pdf"),
+        make_cache_key("# A", "gradient", "pptx"),
+    ]
+    assert len({key, *others}) == 4
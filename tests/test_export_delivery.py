@@ -0,0 +1,59 @@
+"""エクスポート結果のチャンク配信のテスト"""
+import asyncio
+import base64
+import hashlib
+import sys
+from pathlib import Path
+
+# ランタイムディレクトリをパスに追加
+sys.path.insert(0, str(Path(__file__).parent.parent / "amplify" / "agent" / "runtime"))
+
+from config import EXPORT_CHUNK_SIZE
+from exports import delivery
+
+
+def _stream(monkeypatch, tmp_path, data: bytes, output_format: str = "pdf") -> tuple[list[dict], list]:
+    """変換結果がdataになる偽のopen_exportで配信し、(イベント, 開いたファイル) を返す"""
+    path = tmp_path / f"slide.{output_format}"
+    path.write_bytes(data)
+    opened = []
+
+    def fake_open_export(markdown, fmt, theme):
+        opened.append(open(path, "rb"))
+        return opened[-1]
+    monkeypatch.setattr(delivery, "open_export", fake_open_export)
+
+    async def run():
+        return [event async for event in delivery.stream_export_chunks("# A", output_format)]
+
+    return asyncio.run(run()), opened
+
+
+def test_file_is_split_into_fixed_size_chunks_with_digest(monkeypatch, tmp_path):
+    data = bytes(range(256)) * (EXPORT_CHUNK_SIZE * 5 // 2 // 256)
+
+    (start, *chunks, end), opened = _stream(monkeypatch, tmp_path, data)
+
+    assert start == {"type": "export_start", "format": "pdf", "size": len(data), "chunkSize": EXPORT_CHUNK_SIZE}
+    assert [chunk["seq"] for chunk in chunks] == [0, 1, 2]
+    decoded = [base64.b64decode(chunk["data"]) for chunk in chunks]
+    assert [len(part) for part in decoded] == [EXPORT_CHUNK_SIZE, EXPORT_CHUNK_SIZE, len(data) - 2 * EXPORT_CHUNK_SIZE]
+    assert b"".join(decoded) == data
+    # チャンクサイズが3の倍数なので、Base64のまま連結してもデコードできる
+    assert base64.b64decode("".join(chunk["data"] for chunk in chunks)) == data
+    assert end == {
+        "type": "export_end",
+        "format": "pdf",
+        "chunks": 3,
+        "size": len(data),
+        "sha256": hashlib.sha256(data).hexdigest(),
+    }
+    assert opened[0].closed
+
+
+def test_empty_file_has_no_chunks(monkeypatch, tmp_path):
+    (start, end), _ = _stream(monkeypatch, tmp_path, b"", "pptx")
+
+    assert start["size"] == 0
+    assert end["chunks"] == 0
+    assert end["sha256"] == hashlib.sha256(b"").hexdigest()
@@ -0,0 +1,58 @@
+"""エクスポートの同時実行数・待ち行列の上限のテスト"""
+import asyncio
+import sys
+import threading
+from pathlib import Path
+
+import pytest
+
+# ランタイムディレクトリをパスに追加
+sys.path.insert(0, str(Path(__file__).parent.parent / "amplify" / "agent" / "runtime"))
+
+from exports import ExportBusyError
+from exports.export_runner import _ExportLimiter
+
+
+def test_timed_out_job_keeps_its_slot_until_the_thread_finishes():
+    limiter = _ExportLimiter(max_concurrency=1, max_queue_depth=8)
+    release = threading.Event()
+
+    def slow_render():
+        release.wait(5)
+        return "slow"
+
+    async def run():
+        with pytest.raises(RuntimeError, match="タイムアウト"):
+            await limiter.run(slow_render, timeout=0.05)
+        # 呼び出し側は諦めたが、変換はまだ続いているので枠は空かない
+        assert limiter.running == 1
+        waiting = asyncio.ensure_future(limiter.run(lambda: "next", timeout=5))
+        await asyncio.sleep(0.05)
+        assert limiter.waiting == 1 and not waiting.done()
+
+        release.set()
+        assert await waiting == "next"
+        assert limiter.running == 0
+
+    asyncio.run(run())
+
+
+def test_queue_depth_limit_rejects_with_busy_error():
+    limiter = _ExportLimiter(max_concurrency=1, max_queue_depth=1)
+    release = threading.Event()
+
+    async def run():
+        running = asyncio.ensure_future(limiter.run(release.wait, 5, timeout=5))
+        await asyncio.sleep(0.01)
+        queued = asyncio.ensure_future(limiter.run(lambda: "queued", timeout=5))
+        await asyncio.sleep(0.01)
+
+        with pytest.raises(ExportBusyError):
+            await limiter.run(lambda: "rejected", timeout=5)
+        assert limiter.stats() == {"running": 1, "waiting": 1, "rejected": 1}
+
+        release.set()
+        assert await running is True
+        assert await queued == "queued"
+
+    asyncio.run(run())
@@ -0,0 +1,56 @@
+"""会話履歴圧縮のテスト"""
+import sys
+from pathlib import Path
+from types import SimpleNamespace
+
+# ランタイムディレクトリをパスに追加
+sys.path.insert(0, str(Path(__file__).parent.parent / "amplify" / "agent" / "runtime"))
+
+from session import build_user_message, compact_history
+
+DECK = "---\nmarp: true\n---\n\n# タイトル\n\n---\n\n" + "- 本文\n" * 200
+
+
+def _turn(instruction: str, deck: str = "") -> list[dict]:
+    """ユーザー発言 → output_slide呼び出し → ツール結果 → 応答 の1ターン分"""
+    return [
+        {"role": "user", "content": [{"text": build_user_message(instruction, deck)}]},
+        {"role": "assistant", "content": [{"toolUse": {"toolUseId": "t1", "name": "output_slide", "input": {"markdown": DECK}}}]},
+        {"role": "user", "content": [{"toolResult": {"toolUseId": "t1", "status": "success", "content": [{"text": "スライドを出力しました。"}]}}]},
+        {"role": "assistant", "content": [{"text": "完成しました。"}]},
+    ]
+
+
+def test_superseded_decks_are_replaced():
+    """新しいメッセージにスライドが付く場合、履歴内のスライド全文はすべて省略される"""
+    agent = SimpleNamespace(messages=_turn("作って") + _turn("直して", DECK))
+
+    saved = compact_history(agent, has_current_deck=True)
+
+    assert saved > 0
+    assert all(DECK not in str(m) for m in agent.messages)
+    assert agent.messages[4]["content"][0]["text"].endswith("ユーザーの指示: 直して")
+
+
+def test_latest_tool_deck_is_kept_without_current_deck():
+    """スライドが付かない場合は最新のoutput_slideの引数だけ残す"""
+    agent = SimpleNamespace(messages=_turn("作って") + _turn("直して"))
+
+    compact_history(agent, has_current_deck=False)
+
+    assert agent.messages[1]["content"][0]["toolUse"]["input"]["markdown"] != DECK
+    assert agent.messages[5]["content"][0]["toolUse"]["input"]["markdown"] == DECK
+
+
+def test_old_turns_are_summarized_at_turn_boundary():
+    """予算超過時は古いターンを要約に置き換え、ユーザー発言から始まる履歴を保つ"""
+    agent = SimpleNamespace(messages=_turn("一回目") + _turn("二回目") + _turn("三回目"))
+
+    compact_history(agent, has_current_deck=True, token_budget=30)
+
+    first = agent.messages[0]
+    assert first["role"] == "user"
+    assert first["content"][0]["text"].startswith("これまでの会話の要約:")
+    assert "一回目" in first["content"][0]["text"]
+    assert len(agent.messages) == 4
+    assert "toolResult" not in first["content"][0]
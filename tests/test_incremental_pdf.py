@@ -0,0 +1,70 @@
+"""PDFのスライド単位キャッシュのテスト（Marpの代わりに偽のレンダラーを使用）"""
+import io
+import re
+import sys
+from pathlib import Path
+
+from pypdf import PdfReader, PdfWriter
+
+# ランタイムディレクトリをパスに追加
+sys.path.insert(0, str(Path(__file__).parent.parent / "amplify" / "agent" / "runtime"))
+
+from deck import parse_deck
+from exports import slide_exporter
+from exports.export_cache import ExportCache
+
+
+def _deck(titles: list[str]) -> str:
+    slides = "\n\n---\n\n".join(f"# {title}\n\n本文" for title in titles)
+    return f"---\nmarp: true\npaginate: true\n---\n\n{slides}\n"
+
+
+class FakeRenderer:
+    """スライドごとに1ページのPDFを作る（ページ幅にスライド番号を埋め込む）"""
+
+    def __init__(self):
+        self.rendered_slides = 0
+
+    def __call__(self, jobs, theme, allow_html, on_result=None):
+        results = []
+        for markdown, output_format in jobs:
+            writer = PdfWriter()
+            for slide in parse_deck(markdown).slides:
+                number = int(re.search(r"# S(\d+)", slide.body).group(1))
+                writer.add_blank_page(width=100 + number, height=100)
+                self.rendered_slides += 1
+            buffer = io.BytesIO()
+            writer.write(buffer)
+            results.append(buffer.getvalue())
+        return results
+
+
+def _page_widths(pdf: bytes) -> list[int]:
+    return [int(page.mediabox.width) for page in PdfReader(io.BytesIO(pdf)).pages]
+
+
+def test_only_changed_slides_are_rerendered(monkeypatch, tmp_path):
+    renderer = FakeRenderer()
+    monkeypatch.setattr(slide_exporter, "_render_uncached_batch", renderer)
+    monkeypatch.setattr(slide_exporter, "get_export_cache", lambda: ExportCache(tmp_path, 10 * 1024 * 1024, 60))
+
+    first = slide_exporter.generate_pdf(_deck(["S1", "S2", "S3", "S4", "S5"]))
+    assert renderer.rendered_slides == 5
+
+    # 1枚だけ変更（デッキ全体ではなく変更したスライドだけを変換）
+    edited = slide_exporter.generate_pdf(_deck(["S1", "S2", "S9", "S4", "S5"]))
+
+    assert renderer.rendered_slides == 6
+    assert _page_widths(first) == [101, 102, 103, 104, 105]
+    assert _page_widths(edited) == [101, 102, 109, 104, 105]
+
+
+def test_directives_are_carried_into_standalone_slides():
+    deck = parse_deck("---\nmarp: true\n---\n\n# A\n\n---\n\n<!-- class: blue -->\n# B\n\n---\n\n# C\n")
+
+    assert deck.splittable
+    assert deck.inherited_directives(2) == {"class": "blue"}
+    assert deck.standalone_slide(2).startswith("---\nmarp: true\n---\n")
+    assert "class: blue" in deck.standalone_slide(2)
+    # 直前に空行のない --- は見出しになるため、スライド単位では扱わない
+    assert not parse_deck("# A\ntext\n---\n# B\n").splittable
@@ -0,0 +1,80 @@
+"""Kimi K2のツール名破損時の早期中断・リトライ・モデル切り替えのテスト"""
+import asyncio
+import sys
+from pathlib import Path
+
+# ランタイムディレクトリをパスに追加
+sys.path.insert(0, str(Path(__file__).parent.parent / "amplify" / "agent" / "runtime"))
+
+import agent as agent_module
+from handlers import get_retry_stats
+from tools import REQUEST_STATE_KEY
+
+
+class CorruptingAgent:
+    """破損したツール名を出した後も長く生成を続ける偽Agent（cancel_signalで止まる）"""
+
+    def __init__(self):
+        self.messages = []
+        self.events_after_corruption = 0
+
+    async def stream_async(self, prompt, invocation_state=None, cancel_signal=None):
+        yield {"current_tool_use": {"name": "functions.output_slide:0<|tool_call_argument_begin|>", "input": {}}}
+        for _ in range(1000):
+            await asyncio.sleep(0)
+            if cancel_signal is not None and cancel_signal.is_set():
+                return
+            self.events_after_corruption += 1
+            yield {"data": "生成中..."}
+
+
+class HealthyAgent:
+    """スライドを出力する偽Agent"""
+
+    def __init__(self):
+        self.messages = []
+
+    async def stream_async(self, prompt, invocation_state=None, cancel_signal=None):
+        yield {"current_tool_use": {"name": "output_slide", "input": {}}}
+        invocation_state[REQUEST_STATE_KEY].generated_markdown = "---\nmarp: true\n---\n# OK"
+
+
+def _collect(payload: dict) -> list[dict]:
+    async def run():
+        return [event async for event in agent_module.invoke(payload)]
+
+    return asyncio.run(run())
+
+
+def test_corrupted_stream_is_cancelled_and_fails_over(monkeypatch):
+    kimi_agent = CorruptingAgent()
+    agents = {"kimi": kimi_agent, "claude": HealthyAgent()}
+    delays = []
+    backoff_delay = agent_module.backoff_delay
+
+    def record_delay(retry):
+        delays.append(backoff_delay(retry))
+        return 0
+
+    monkeypatch.setattr(agent_module, "get_or_create_agent", lambda session_id, model_type: agents[model_type])
+    monkeypatch.setattr(agent_module, "backoff_delay", record_delay)
+    monkeypatch.setattr(agent_module, "KIMI_EARLY_ABORT", True)
+    monkeypatch.setattr(agent_module, "KIMI_FAILOVER_MODEL_TYPE", "claude")
+    monkeypatch.setattr(agent_module, "KIMI_FAILOVER_AFTER", 2)
+    stats_before = get_retry_stats()
+
+    events = _collect({"prompt": "AWSのスライド", "model_type": "kimi"})
+
+    # 破損を検出した時点で中断するので、後続の生成はほぼ読まない
+    assert kimi_agent.events_after_corruption == 0
+    # 1回目・2回目のリトライは指数バックオフ、3回目で別モデルに切り替え
+    assert len(delays) == 2
+    assert delays[1] == delays[0] * 2
+    assert [e["type"] for e in events if e["type"] in ("status", "markdown", "error")] == [
+        "status", "status", "status", "markdown",
+    ]
+    assert events[-1] == {"type": "done"}
+
+    stats = get_retry_stats()
+    assert stats["aborted"] - stats_before["aborted"] == 3
+    assert stats["failovers"] - stats_before["failovers"] == 1
@@ -0,0 +1,90 @@
+"""Kimi K2ストリームフィルタ・マークダウン抽出のテスト"""
+import json
+import random
+import sys
+import time
+from pathlib import Path
+
+# ランタイムディレクトリをパスに追加
+sys.path.insert(0, str(Path(__file__).parent.parent / "amplify" / "agent" / "runtime"))
+
+from handlers import KimiStreamFilter, MarpMarkdownExtractor, extract_marp_markdown_from_text, remove_think_tags
+
+
+def _run(chunks: list[str]) -> tuple[str, KimiStreamFilter]:
+    stream_filter = KimiStreamFilter()
+    output = "".join(stream_filter.feed(chunk) for chunk in chunks)
+    return output + stream_filter.flush(), stream_filter
+
+
+def _random_chunks(text: str, rng: random.Random) -> list[str]:
+    chunks, pos = [], 0
+    while pos < len(text):
+        size = rng.randint(1, 5)
+        chunks.append(text[pos:pos + size])
+        pos += size
+    return chunks
+
+
+def test_think_tags_split_across_chunks_are_removed():
+    """チャンク境界で分割されたタグも除去し、タグ以外の<は残す"""
+    text = "こんにちは<think>考え中 a<b </thi</think>。a < b と <b>太字</b> です<thin"
+    rng = random.Random(0)
+
+    for _ in range(200):
+        output, _ = _run(_random_chunks(text, rng))
+        assert output == remove_think_tags(text)
+
+
+def test_marp_marker_split_across_chunks_stops_text_output():
+    """"marp: true" が分割されていても検出し、以降のテキストを出さない"""
+    output, stream_filter = _run(["スライドを作ります\n---\nMA", "RP:", " TR", "ue\n# タイトル"])
+
+    assert stream_filter.marp_detected
+    assert output.startswith("スライドを作ります")
+    assert "タイトル" not in output
+
+
+def _extract(chunks: list[str]) -> MarpMarkdownExtractor:
+    extractor = MarpMarkdownExtractor()
+    for chunk in chunks:
+        extractor.feed(chunk)
+    return extractor
+
+
+def test_markdown_is_extracted_incrementally():
+    """フロントマター・スライド区切りを逐次認識し、<|tool_call の手前までを取り出す"""
+    text = (
+        "作成します。\n---\nmarp: true\ntheme: gradient\n---\n\n# 表紙\n\n---\n\n"
+        "```\n---\n```\n\n---\n\n# まとめ\n<|tool_calls_section_begin|> functions.output_slide:0"
+    )
+    expected = "---\nmarp: true\ntheme: gradient\n---\n\n# 表紙\n\n---\n\n```\n---\n```\n\n---\n\n# まとめ"
+    rng = random.Random(1)
+
+    for _ in range(100):
+        extractor = _extract(_random_chunks(text, rng))
+        assert extractor.result() == expected
+        assert extractor.front_matter_closed
+        assert extractor.slide_boundaries == 2
+    assert extract_marp_markdown_from_text(text) == expected
+
+
+def test_markdown_without_delimiter_and_json_argument():
+    """---なしのフロントマターは補完し、JSON引数内のマークダウンを優先する"""
+    assert extract_marp_markdown_from_text("marp: true\n# A") == "---\nmarp: true\n# A"
+
+    markdown = "---\nmarp: true\n---\n# JSON"
+    text = f'<|tool_call_argument_begin|> {json.dumps({"markdown": markdown})} <|tool_call_end|>'
+    rng = random.Random(2)
+    for _ in range(50):
+        assert _extract(_random_chunks(text, rng)).result() == markdown
+
+
+def test_markdown_extraction_is_linear_on_pathological_input():
+    """閉じない内部トークンが大量にあっても線形時間で終わる"""
+    text = "---\nmarp: true\n" + "<|x" * 100_000
+
+    started = time.monotonic()
+    extract_marp_markdown_from_text(text)
+
+    assert time.monotonic() - started < 1.0
@@ -0,0 +1,62 @@
+"""モデルクライアントプールのテスト"""
+import sys
+import threading
+from pathlib import Path
+
+from botocore.stub import Stubber
+
+# ランタイムディレクトリをパスに追加
+sys.path.insert(0, str(Path(__file__).parent.parent / "amplify" / "agent" / "runtime"))
+
+from session import model_pool
+from session.model_pool import ModelPool, _create_bedrock_model
+
+
+def test_model_client_is_created_once_per_model_type():
+    created = []
+
+    def factory(model_type):
+        created.append(model_type)
+        return _create_bedrock_model(model_type)
+
+    pool = ModelPool(factory)
+    barrier = threading.Barrier(8)
+    templates = []
+
+    def worker():
+        barrier.wait()
+        templates.append(pool.get("claude"))
+
+    threads = [threading.Thread(target=worker) for _ in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert created == ["claude"]
+    first, second = templates[0].clone(), templates[1].clone()
+    # 会話履歴は別々、モデルクライアントは共有
+    assert first is not second
+    assert first.model is second.model
+    first.messages.append({"role": "user", "content": [{"text": "hi"}]})
+    assert second.messages == []
+
+
+def test_warm_up_opens_connection_for_each_model(monkeypatch):
+    opened = []
+    monkeypatch.setattr(model_pool, "_open_connection", lambda model: opened.append(model))
+    pool = ModelPool()
+
+    pool.warm_up(["nova", "kimi"])
+
+    assert pool.stats()["model_types"] == ["kimi", "nova"]
+    assert opened == [pool.get("nova").model, pool.get("kimi").model]
+    assert pool.stats()["created"] == 2
+
+
+def test_open_connection_uses_public_api_and_tolerates_access_denied():
+    model = _create_bedrock_model("nova")
+    with Stubber(model.client) as stubber:
+        stubber.add_client_error("list_async_invokes", service_error_code="AccessDeniedException", http_status_code=403)
+        model_pool._open_connection(model)
+        stubber.assert_no_pending_responses()
@@ -0,0 +1,123 @@
+"""スライド部分修正ツールのテスト"""
+import asyncio
+import sys
+from pathlib import Path
+
+import pytest
+
+# ランタイムディレクトリをパスに追加
+sys.path.insert(0, str(Path(__file__).parent.parent / "amplify" / "agent" / "runtime"))
+
+import agent as agent_module
+from deck import SlidePatchError, apply_slide_patch, parse_deck
+from tools import patch_slides
+
+DECK = "---\nmarp: true\npaginate: true\n---\n\n# S1\n\n---\n\n# S2\n\n---\n\n# S3\n\n---\n\n# S4\n"
+
+
+def _bodies(markdown: str) -> list[str]:
+    return [slide.body for slide in parse_deck(markdown).slides]
+
+
+def test_operations_use_original_slide_numbers():
+    patched = apply_slide_patch(DECK, [
+        {"op": "delete", "index": 1},
+        {"op": "replace", "index": 3, "markdown": "---\n# S3 改\n---"},
+        {"op": "insert", "index": 3, "markdown": "# 新規"},
+        {"op": "insert", "index": 5, "markdown": "# 末尾"},
+        {"op": "reorder", "order": [4, 3, 2, 1]},
+    ])
+
+    assert patched.startswith("---\nmarp: true\npaginate: true\n---\n")
+    assert _bodies(patched) == ["# S4", "# 新規", "# S3 改", "# S2", "# 末尾"]
+
+
+@pytest.mark.parametrize("operations", [
+    [],
+    [{"op": "replace", "index": 5, "markdown": "# X"}],
+    [{"op": "delete", "index": 2}, {"op": "replace", "index": 2, "markdown": "# X"}],
+    [{"op": "reorder", "order": [1, 2, 3]}],
+    [{"op": "reorder", "order": [1, "2", 3, 4]}],
+    [{"op": "reorder", "order": [1, 2.0, 3, 4]}],
+    [{"op": "reorder", "order": [True, 2, 3, 4]}],
+    [{"op": "move", "index": 1}],
+    [{"op": "delete", "index": i} for i in range(1, 5)],
+])
+def test_invalid_operations_are_rejected(operations):
+    with pytest.raises(SlidePatchError):
+        apply_slide_patch(DECK, operations)
+
+
+@pytest.mark.parametrize("markdown", [
+    # 直前が空行でない --- はsetext見出しになり、スライド区切りにならない
+    "# S1\ntext\n---\n\n# S2\n",
+    "# S1\n\n---\n\n<!-- theme: gaia -->\n# S2\n",
+])
+def test_unsplittable_deck_is_rejected(markdown):
+    with pytest.raises(SlidePatchError, match="output_slide"):
+        apply_slide_patch(markdown, [{"op": "delete", "index": 1}])
+
+
+class PatchingAgent:
+    """patch_slidesを呼ぶ偽Agent"""
+
+    def __init__(self):
+        self.messages = []
+
+    async def stream_async(self, prompt, invocation_state=None, cancel_signal=None):
+        yield {"current_tool_use": {"name": "patch_slides", "input": {}}}
+        tool_use = {
+            "toolUseId": "tooluse_patch",
+            "name": "patch_slides",
+            "input": {"operations": [{"op": "replace", "index": 2, "markdown": "# S2 改"}]},
+        }
+        async for _ in patch_slides.stream(tool_use, {**invocation_state, "agent": self}):
+            pass
+
+
+def test_patch_is_applied_to_current_markdown(monkeypatch):
+    fake_agent = PatchingAgent()
+    monkeypatch.setattr(agent_module, "get_or_create_agent", lambda session_id, model_type: fake_agent)
+
+    async def run():
+        payload = {"prompt": "2枚目を直して", "markdown": DECK, "model_type": "claude"}
+        return [event async for event in agent_module.invoke(payload)]
+
+    events = asyncio.run(run())
+
+    [markdown] = [e["data"] for e in events if e["type"] == "markdown"]
+    assert _bodies(markdown) == ["# S1", "# S2 改", "# S3", "# S4"]
+
+
+class TwoPatchAgent:
+    """同じターンでpatch_slidesを2回呼ぶ偽Agent"""
+
+    def __init__(self):
+        self.messages = []
+        self.results = []
+
+    async def stream_async(self, prompt, invocation_state=None, cancel_signal=None):
+        yield {"current_tool_use": {"name": "patch_slides", "input": {}}}
+        for i, operations in enumerate([
+            [{"op": "delete", "index": 1}],
+            # 2回目は1回目の修正後（S2, S3, S4）の番号で指定する
+            [{"op": "replace", "index": 1, "markdown": "# S2 改"}],
+        ]):
+            tool_use = {"toolUseId": f"tooluse_patch_{i}", "name": "patch_slides", "input": {"operations": operations}}
+            async for event in patch_slides.stream(tool_use, {**invocation_state, "agent": self}):
+                self.results.append(event)
+
+
+def test_second_patch_uses_numbers_of_the_patched_deck(monkeypatch):
+    fake_agent = TwoPatchAgent()
+    monkeypatch.setattr(agent_module, "get_or_create_agent", lambda session_id, model_type: fake_agent)
+
+    async def run():
+        payload = {"prompt": "1枚目を消して、次の1枚目を直して", "markdown": DECK, "model_type": "claude"}
+        return [event async for event in agent_module.invoke(payload)]
+
+    events = asyncio.run(run())
+
+    [markdown] = [e["data"] for e in events if e["type"] == "markdown"]
+    assert _bodies(markdown) == ["# S2 改", "# S3", "# S4"]
+    assert "修正後は3枚" in str(fake_agent.results[0])
@@ -0,0 +1,169 @@
+"""Marpレンダラーワーカープールのテスト（偽の marp コマンドを使用）"""
+import os
+import stat
+import sys
+import textwrap
+import time
+from pathlib import Path
+
+import pytest
+
+# ランタイムディレクトリをパスに追加
+sys.path.insert(0, str(Path(__file__).parent.parent / "amplify" / "agent" / "runtime"))
+
+from exports import renderer_pool
+from exports.renderer_pool import MarpRendererPool, MarpWorker
+
+PROFILE = (None, False)
+
+# marp --server <dir> の代わり。少し遅れてからPORTで待ち受け、子プロセス（Chromium役）も起動する
+FAKE_MARP = textwrap.dedent('''
+    import http.server, os, subprocess, sys, time
+    from pathlib import Path
+
+    root = Path(sys.argv[sys.argv.index("--server") + 1])
+    child = subprocess.Popen([sys.executable, "-c", "import time; time.sleep(60)"])
+    with open(os.environ["FAKE_MARP_LOG"], "a") as log:
+        log.write(f"{os.getpid()} {child.pid} {' '.join(sys.argv[1:])}\\n")
+    if os.environ.get("FAKE_MARP_EXIT"):
+        sys.exit(1)
+    time.sleep(0.3)
+
+    class Handler(http.server.BaseHTTPRequestHandler):
+        def log_message(self, *args):
+            pass
+
+        def do_GET(self):
+            path, _, query = self.path.partition("?")
+            if path == "/":
+                body = b"index"
+            else:
+                markdown = (root / path.lstrip("/")).read_text(encoding="utf-8")
+                if "SLOW" in markdown:
+                    time.sleep(30)
+                body = f"{query or 'html'}:{markdown}".encode()
+            self.send_response(200)
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+    http.server.HTTPServer(("127.0.0.1", int(os.environ["PORT"])), Handler).serve_forever()
+''')
+
+
+def _alive(pid: int) -> bool:
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    # 終了済みでも親が回収するまではゾンビとして残る
+    with open(f"/proc/{pid}/stat") as f:
+        return f.read().split()[2] != "Z"
+
+
+@pytest.fixture
+def fake_marp(tmp_path, monkeypatch):
+    """PATHの先頭に偽の marp を置き、起動ログ（pid・子pid・引数）のパスを返す"""
+    bin_dir = tmp_path / "bin"
+    bin_dir.mkdir()
+    script = bin_dir / "marp"
+    script.write_text(f"#!{sys.executable}\n{FAKE_MARP}", encoding="utf-8")
+    script.chmod(script.stat().st_mode | stat.S_IEXEC)
+    log = tmp_path / "marp.log"
+    monkeypatch.setenv("PATH", f"{bin_dir}{os.pathsep}{os.environ['PATH']}")
+    monkeypatch.setenv("FAKE_MARP_LOG", str(log))
+    monkeypatch.setattr(renderer_pool, "MARP_WORKER_START_TIMEOUT", 10)
+    return log
+
+
+def _launches(log: Path) -> list[tuple[int, int, str]]:
+    lines = log.read_text().splitlines() if log.exists() else []
+    return [(int(pid), int(child), args) for pid, child, args in (line.split(" ", 2) for line in lines)]
+
+
+def test_worker_waits_for_port_and_renders(fake_marp):
+    worker = MarpWorker(0)
+    try:
+        worker.start(("/themes/gradient.css", True))
+
+        [(_, _, args)] = _launches(fake_marp)
+        assert "--html" in args
+        assert "--theme /themes/gradient.css" in args
+        assert worker.render("# A", "pdf") == b"pdf:# A"
+        assert worker.render("# B", "html") == b"html:# B"
+        assert worker.job_count == 2
+    finally:
+        worker.stop()
+
+
+def test_stop_kills_process_group(fake_marp):
+    worker = MarpWorker(0)
+    worker.start(PROFILE)
+    workdir = worker._workdir
+    [(_, child, _)] = _launches(fake_marp)
+
+    worker.stop()
+
+    assert not worker.is_running
+    assert not workdir.exists()
+    deadline = time.monotonic() + 5
+    while _alive(child) and time.monotonic() < deadline:
+        time.sleep(0.05)
+    assert not _alive(child)
+
+
+def test_worker_exiting_during_startup_is_reported(fake_marp, monkeypatch):
+    monkeypatch.setenv("FAKE_MARP_EXIT", "1")
+    worker = MarpWorker(0)
+
+    with pytest.raises(RuntimeError, match="exited during startup"):
+        worker.start(PROFILE)
+    assert worker.profile is None
+
+
+def test_job_timeout_stops_worker(fake_marp):
+    worker = MarpWorker(0)
+    worker.start(PROFILE)
+    [(_, child, _)] = _launches(fake_marp)
+
+    started = time.monotonic()
+    with pytest.raises(RuntimeError, match="Marp worker error"):
+        worker.render("# SLOW", "pdf", timeout=0.5)
+
+    assert time.monotonic() - started < 5
+    assert not worker.is_running
+    deadline = time.monotonic() + 5
+    while _alive(child) and time.monotonic() < deadline:
+        time.sleep(0.05)
+    assert not _alive(child)
+
+
+def test_missing_workdir_stops_worker(fake_marp):
+    worker = MarpWorker(0)
+    worker.start(PROFILE)
+    worker._workdir.rmdir()
+
+    with pytest.raises(RuntimeError, match="Marp worker error"):
+        worker.render("# A", "pdf")
+
+    assert not worker.is_running
+
+
+def test_pool_recycles_worker_after_max_jobs_and_on_profile_change(fake_marp):
+    pool = MarpRendererPool(size=1, max_jobs_per_worker=2, queue_timeout=5)
+    try:
+        assert pool.render_batch([("# 1", "pdf"), ("# 2", "pptx")]) == [b"pdf:# 1", b"pptx:# 2"]
+        # 上限回数に達したので次の変換の前に再起動
+        assert pool.render("# 3", "pdf") == b"pdf:# 3"
+        assert pool.stats()["restarts"] == 2
+        # HTMLタグを許可するプロファイルに切り替える場合も再起動
+        pool.render_batch([("# 4", "html")])
+
+        launches = _launches(fake_marp)
+        stats = pool.stats()
+        assert (stats["running"], stats["jobs"], stats["restarts"]) == (1, 4, 3)
+        assert ["--html" in args for _, _, args in launches] == [False, False, True]
+        # 再起動前のプロセスは停止済み
+        assert [_alive(pid) for pid, _, _ in launches] == [False, False, True]
+    finally:
+        pool.shutdown()
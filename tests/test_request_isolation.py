@@ -0,0 +1,55 @@
+"""並行リクエスト間でツール状態が混ざらないことのストレステスト"""
+import asyncio
+import random
+import sys
+import urllib.parse
+from pathlib import Path
+
+# ランタイムディレクトリをパスに追加
+sys.path.insert(0, str(Path(__file__).parent.parent / "amplify" / "agent" / "runtime"))
+
+import agent as agent_module
+from tools import output_slide, generate_tweet_url
+
+CONCURRENCY = 100
+
+
+class FakeAgent:
+    """strandsと同様にinvocation_state付きでツールを実行する偽Agent"""
+
+    def __init__(self):
+        self.messages = []
+
+    async def _run_tool(self, tool, tool_input: dict, invocation_state: dict) -> None:
+        tool_use = {"toolUseId": "tooluse_test", "name": tool.tool_name, "input": tool_input}
+        async for _ in tool.stream(tool_use, {**invocation_state, "agent": self}):
+            pass
+
+    async def stream_async(self, prompt, invocation_state=None, cancel_signal=None):
+        yield {"data": f"{prompt} を作成します"}
+        await asyncio.sleep(random.random() * 0.01)
+        yield {"current_tool_use": {"name": "output_slide", "input": {}}}
+        await self._run_tool(output_slide, {"markdown": f"deck for {prompt}"}, invocation_state)
+        await asyncio.sleep(random.random() * 0.01)
+        await self._run_tool(generate_tweet_url, {"tweet_text": prompt}, invocation_state)
+
+
+async def _collect(prompt: str) -> list[dict]:
+    return [event async for event in agent_module.invoke({"prompt": prompt, "model_type": "claude"})]
+
+
+def test_concurrent_invocations_do_not_share_tool_state(monkeypatch):
+    monkeypatch.setattr(agent_module, "get_or_create_agent", lambda session_id, model_type: FakeAgent())
+
+    async def run_all():
+        prompts = [f"request-{i}" for i in range(CONCURRENCY)]
+        return prompts, await asyncio.gather(*(_collect(p) for p in prompts))
+
+    prompts, results = asyncio.run(run_all())
+
+    for prompt, events in zip(prompts, results):
+        markdown_events = [e["data"] for e in events if e["type"] == "markdown"]
+        tweet_events = [e["data"] for e in events if e["type"] == "tweet_url"]
+        assert markdown_events == [f"deck for {prompt}"]
+        assert tweet_events == [f"https://twitter.com/intent/tweet?text={urllib.parse.quote(prompt, safe='')}"]
+        assert events[-1] == {"type": "done"}
@@ -0,0 +1,72 @@
+"""スライド共有（S3アップロード）のテスト（motoのローカルS3を使用）"""
+import asyncio
+import gzip
+import sys
+from pathlib import Path
+
+import pytest
+
+# ランタイムディレクトリをパスに追加
+sys.path.insert(0, str(Path(__file__).parent.parent / "amplify" / "agent" / "runtime"))
+
+moto = pytest.importorskip("moto")
+
+import sharing.s3_uploader as s3_uploader
+
+BUCKET = "shared-slides-test"
+MARKDOWN = "---\nmarp: true\n---\n\n# テストスライド\n"
+HTML = "<html><head><title>t</title></head><body>slides</body></html>"
+
+
+@pytest.fixture
+def s3(monkeypatch):
+    monkeypatch.setenv("AWS_ACCESS_KEY_ID", "testing")
+    monkeypatch.setenv("AWS_SECRET_ACCESS_KEY", "testing")
+    monkeypatch.setenv("AWS_DEFAULT_REGION", "us-east-1")
+    monkeypatch.setenv("SHARED_SLIDES_BUCKET", BUCKET)
+    monkeypatch.setenv("CLOUDFRONT_DOMAIN", "example.cloudfront.net")
+    with moto.mock_aws():
+        monkeypatch.setattr(s3_uploader, "_s3_client", None)
+        client = s3_uploader._get_s3_client()
+        client.create_bucket(Bucket=BUCKET)
+        yield client
+    monkeypatch.setattr(s3_uploader, "_s3_client", None)
+
+
+def test_share_slide_uploads_html_and_thumbnail(s3, monkeypatch):
+    """HTML（gzip圧縮・OGPタグ付き）とサムネイルがアップロードされる"""
+    monkeypatch.setattr(s3_uploader, "generate_share_assets", lambda markdown, theme: (HTML, b"png-bytes"))
+
+    result = asyncio.run(s3_uploader.share_slide(MARKDOWN))
+
+    slide_id = result["slideId"]
+    assert result["url"] == f"https://example.cloudfront.net/slides/{slide_id}/index.html"
+
+    html_object = s3.get_object(Bucket=BUCKET, Key=f"slides/{slide_id}/index.html")
+    assert html_object["ContentEncoding"] == "gzip"
+    html = gzip.decompress(html_object["Body"].read()).decode("utf-8")
+    assert 'property="og:title" content="テストスライド"' in html
+    assert f"slides/{slide_id}/thumbnail.png" in html
+
+    thumbnail = s3.get_object(Bucket=BUCKET, Key=f"slides/{slide_id}/thumbnail.png")
+    assert thumbnail["Body"].read() == b"png-bytes"
+    assert thumbnail["ContentType"] == "image/png"
+
+
+def test_share_slide_without_thumbnail(s3, monkeypatch):
+    """サムネイルがない場合はOGPタグなしでHTMLのみアップロードされる"""
+    monkeypatch.setattr(s3_uploader, "generate_share_assets", lambda markdown, theme: (HTML, None))
+
+    result = asyncio.run(s3_uploader.share_slide(MARKDOWN))
+
+    keys = [obj["Key"] for obj in s3.list_objects_v2(Bucket=BUCKET)["Contents"]]
+    assert keys == [f"slides/{result['slideId']}/index.html"]
+    html_object = s3.get_object(Bucket=BUCKET, Key=keys[0])
+    assert "og:title" not in gzip.decompress(html_object["Body"].read()).decode("utf-8")
+
+
+def test_encode_html_identity():
+    """圧縮なし指定ではContent-Encodingを付けない"""
+    body, content_encoding = s3_uploader._encode_html(HTML, "")
+    assert body == HTML.encode("utf-8")
+    assert content_encoding is None
@@ -0,0 +1,92 @@
+"""エクスポート用の作業領域（孤児の掃除・使用量）のテスト"""
+import os
+import subprocess
+import sys
+import time
+from pathlib import Path
+
+import pytest
+
+# ランタイムディレクトリをパスに追加
+sys.path.insert(0, str(Path(__file__).parent.parent / "amplify" / "agent" / "runtime"))
+
+from exports import scratch
+
+
+@pytest.fixture
+def root(tmp_path, monkeypatch):
+    """作業領域のルートを一時ディレクトリにする（ジャニタースレッドは起動しない）"""
+    monkeypatch.setattr(scratch, "_scratch_root", tmp_path)
+    monkeypatch.setattr(scratch, "_active_paths", set())
+    return tmp_path
+
+
+def _dead_pid() -> int:
+    process = subprocess.Popen([sys.executable, "-c", "pass"])
+    process.wait()
+    return process.pid
+
+
+def test_janitor_removes_orphans_and_keeps_live_entries(root):
+    active = scratch.make_scratch_dir("marp-worker-0")
+    fresh = root / f"export-{os.getpid()}-fresh"
+    fresh.mkdir()
+    stale = root / f"export-{os.getpid()}-stale.pdf"
+    stale.write_bytes(b"%PDF")
+    old = time.time() - 7200
+    os.utime(stale, (old, old))
+    orphan = root / f"export-{_dead_pid()}-crashed"
+    orphan.mkdir()
+    (orphan / "slide.md").write_text("# A")
+    unknown = root / "leftover"
+    unknown.mkdir()
+
+    removed = scratch.sweep_orphans(max_age=3600)
+
+    assert removed == 3
+    assert sorted(path.name for path in root.iterdir()) == sorted([active.name, fresh.name])
+
+
+def test_entries_of_other_live_processes_survive_even_when_old(root):
+    """他プロセスのアイドル中のワーカーの作業ディレクトリは消さない"""
+    owner = subprocess.Popen([sys.executable, "-c", "import time; time.sleep(60)"])
+    try:
+        idle = root / f"marp-worker-0-{owner.pid}-idle"
+        idle.mkdir()
+        old = time.time() - 7200
+        os.utime(idle, (old, old))
+
+        assert scratch.sweep_orphans(max_age=3600) == 0
+        assert idle.exists()
+    finally:
+        owner.kill()
+        owner.wait()
+
+    assert scratch.sweep_orphans(max_age=3600) == 1
+    assert not idle.exists()
+
+
+def test_active_entries_survive_even_when_old(root):
+    path = scratch.make_scratch_file("export", ".pdf")
+    old = time.time() - 7200
+    os.utime(path, (old, old))
+
+    assert scratch.sweep_orphans(max_age=3600) == 0
+
+    scratch.release_scratch(path)
+    assert not path.exists()
+
+
+def test_usage_counts_bytes_entries_and_active(root):
+    with scratch.scratch_dir("export") as workdir:
+        (workdir / "slide.pdf").write_bytes(b"x" * 100)
+        leftover = scratch.make_scratch_file("export", ".pptx")
+        leftover.write_bytes(b"y" * 20)
+
+        usage = scratch.get_scratch_usage()
+
+        assert (usage["bytes"], usage["entries"], usage["active"]) == (120, 2, 2)
+
+    scratch.release_scratch(leftover)
+    usage = scratch.get_scratch_usage()
+    assert (usage["bytes"], usage["entries"], usage["active"]) == (0, 0, 0)
@@ -0,0 +1,49 @@
+"""セッションストアのメモリ予算のテスト"""
+import sys
+from pathlib import Path
+from types import SimpleNamespace
+
+# ランタイムディレクトリをパスに追加
+sys.path.insert(0, str(Path(__file__).parent.parent / "amplify" / "agent" / "runtime"))
+
+from session.store import SessionStore
+
+
+def _agent(text: str = "") -> SimpleNamespace:
+    return SimpleNamespace(messages=[{"role": "user", "content": [{"text": text}]}] if text else [])
+
+
+def test_size_is_tracked_without_budget_but_nothing_is_evicted():
+    store = SessionStore(max_entries=10, idle_ttl=60, memory_budget=0)
+    first, second = _agent(), _agent()
+    store.put("a", first)
+    store.put("b", second)
+
+    first.messages.append({"role": "user", "content": [{"text": "x" * 600}]})
+    second.messages.append({"role": "user", "content": [{"text": "y" * 600}]})
+    store.update_size("a")
+    store.update_size("b")
+
+    stats = store.stats()
+    assert stats["bytes_held"] > 1200
+    assert (stats["live_sessions"], stats["evictions"]) == (2, 0)
+
+
+def test_size_is_measured_after_request_and_oldest_session_evicted():
+    store = SessionStore(max_entries=10, idle_ttl=60, memory_budget=1000)
+    old, current = _agent(), _agent()
+    store.put("old", old)
+    store.put("current", current)
+
+    # 取得時には測らず、リクエスト完了後の update_size で反映する
+    old.messages.append({"role": "user", "content": [{"text": "x" * 600}]})
+    store.update_size("old")
+    current.messages.append({"role": "user", "content": [{"text": "y" * 600}]})
+    assert store.get("current") is current
+    assert "old" in store
+
+    store.update_size("current")
+
+    assert "old" not in store
+    assert "current" in store
+    assert store.stats()["evictions"] == 1
@@ -0,0 +1,64 @@
+"""共有用HTML・サムネイル生成のテスト"""
+import sys
+from pathlib import Path
+
+import pytest
+
+# ランタイムディレクトリをパスに追加
+sys.path.insert(0, str(Path(__file__).parent.parent / "amplify" / "agent" / "runtime"))
+
+from exports import slide_exporter
+
+MARKDOWN = "---\nmarp: true\n---\n\n# タイトル\n\n---\n\n# 2枚目\n"
+
+
+class FailingRendererPool:
+    """fail_atの位置の変換で失敗するレンダラー"""
+
+    def __init__(self, fail_at: int, error: Exception):
+        self.fail_at = fail_at
+        self.error = error
+        self.calls = 0
+
+    def render_batch(self, jobs, theme, allow_html, on_result=None):
+        self.calls += 1
+        results = []
+        for i, (_, output_format) in enumerate(jobs):
+            if i == self.fail_at:
+                raise self.error
+            results.append(f"<{output_format}>".encode())
+            on_result(i, results[-1])
+        return results
+
+
+@pytest.fixture
+def use_pool(monkeypatch):
+    monkeypatch.setattr(slide_exporter, "EXPORT_CACHE_MAX_BYTES", 0)
+    monkeypatch.setattr(slide_exporter, "MARP_POOL_SIZE", 1)
+
+    def _use(pool):
+        monkeypatch.setattr(slide_exporter, "get_renderer_pool", lambda: pool)
+        return pool
+
+    return _use
+
+
+def test_thumbnail_failure_returns_rendered_html(use_pool):
+    """サムネイルだけが失敗した場合は、再変換せずに生成済みのHTMLを返す"""
+    pool = use_pool(FailingRendererPool(fail_at=1, error=RuntimeError("Marp CLI error: png")))
+
+    html, thumbnail = slide_exporter.generate_share_assets(MARKDOWN)
+
+    assert html == "<html>"
+    assert thumbnail is None
+    assert pool.calls == 1
+
+
+@pytest.mark.parametrize("message", ["Marp renderer pool is busy", "Marp worker error: timed out"])
+def test_html_failure_is_raised(use_pool, message):
+    """HTMLを生成できなかった場合（混雑・タイムアウト）はフォールバックせずに送出する"""
+    pool = use_pool(FailingRendererPool(fail_at=0, error=RuntimeError(message)))
+
+    with pytest.raises(RuntimeError, match=message):
+        slide_exporter.generate_share_assets(MARKDOWN)
+    assert pool.calls == 1
@@ -0,0 +1,81 @@
+"""スライドの逐次配信のテスト"""
+import asyncio
+import json
+import random
+import sys
+from pathlib import Path
+
+# ランタイムディレクトリをパスに追加
+sys.path.insert(0, str(Path(__file__).parent.parent / "amplify" / "agent" / "runtime"))
+
+import agent as agent_module
+from handlers import JsonStringFieldReader, SlideEventStream
+from tools import REQUEST_STATE_KEY
+
+MARKDOWN = (
+    "---\nmarp: true\ntheme: gradient\n---\n\n# タイトル 🎉\n\n---\n\n"
+    "## コード\n```yaml\n---\nkey: \"value\"\n```\n\n---\n\n## まとめ\n- A\\B\t終わり"
+)
+
+
+def _prefixes(text: str, rng: random.Random) -> list[str]:
+    """ストリーミング中のツール入力（累積文字列）を模したプレフィックス列"""
+    prefixes, pos = [], 0
+    while pos < len(text):
+        pos = min(len(text), pos + rng.randint(1, 7))
+        prefixes.append(text[:pos])
+    return prefixes
+
+
+def test_json_string_field_is_decoded_incrementally():
+    """エスケープ・サロゲートペアがチャンク境界で分割されても正しくデコードする"""
+    tool_input = json.dumps({"markdown": MARKDOWN})  # ensure_ascii で \\uXXXX を含む
+    rng = random.Random(0)
+
+    for _ in range(100):
+        reader = JsonStringFieldReader("markdown")
+        decoded = "".join(reader.feed(prefix) for prefix in _prefixes(tool_input, rng))
+        assert decoded == MARKDOWN
+        assert reader.done
+
+
+def test_slide_events_from_streaming_tool_input():
+    """--- で閉じたスライドから順に slide イベントを出し、入力の終わりで最後のスライドも出す"""
+    tool_input = json.dumps({"markdown": MARKDOWN}, ensure_ascii=False)
+    stream = SlideEventStream()
+
+    events = []
+    for prefix in _prefixes(tool_input, random.Random(1)):
+        events += stream.feed_tool_input("tooluse_1", prefix)
+
+    assert [e["index"] for e in events] == [0, 1, 2]
+    assert events[0]["data"] == "# タイトル 🎉"
+    assert events[1]["data"].startswith("## コード")
+    assert events[2]["data"] == "## まとめ\n- A\\B\t終わり"
+    assert events[0]["frontMatter"] == "marp: true\ntheme: gradient"
+
+
+class StreamingSlideAgent:
+    """output_slideの入力を少しずつ生成する偽Agent"""
+
+    def __init__(self):
+        self.messages = []
+
+    async def stream_async(self, prompt, invocation_state=None, cancel_signal=None):
+        tool_input = json.dumps({"markdown": MARKDOWN})
+        for prefix in _prefixes(tool_input, random.Random(2)):
+            yield {"current_tool_use": {"toolUseId": "tooluse_1", "name": "output_slide", "input": prefix}}
+        invocation_state[REQUEST_STATE_KEY].generated_markdown = MARKDOWN
+
+
+def test_invoke_emits_slides_before_markdown(monkeypatch):
+    monkeypatch.setattr(agent_module, "get_or_create_agent", lambda session_id, model_type: StreamingSlideAgent())
+
+    async def run():
+        payload = {"prompt": "スライド", "model_type": "claude", "stream_slides": True}
+        return [event async for event in agent_module.invoke(payload)]
+
+    events = asyncio.run(run())
+    types = [e["type"] for e in events if e["type"] in ("slide", "markdown")]
+
+    assert types == ["slide", "slide", "slide", "markdown"]
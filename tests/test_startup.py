@@ -0,0 +1,20 @@
+"""起動時間の回帰テスト（新しいプロセスで agent をインポートして計測）"""
+import os
+import sys
+from pathlib import Path
+
+# 計測は起動時間レポートと同じものを使う
+sys.path.insert(0, str(Path(__file__).parent.parent / "benchmarks"))
+
+from startup_report import probe_startup
+
+# 起動時間の上限（秒）。CIなど遅い環境では環境変数で調整する
+STARTUP_BUDGET_SECONDS = float(os.environ.get("STARTUP_BUDGET_SECONDS", "4.0"))
+
+
+def test_startup_skips_lazy_subsystems_and_stays_within_budget():
+    # 1回目はバイトコードのコンパイルなどを含むため、2回のうち速い方で判定
+    results = [probe_startup()[0] for _ in range(2)]
+
+    assert results[0]["loaded"] == []
+    assert min(r["seconds"] for r in results) < STARTUP_BUDGET_SECONDS
@@ -0,0 +1,152 @@
+"""処理段階ごとのスパン・ヒストグラムのテスト（プロセス内のエクスポーターで検証）"""
+import asyncio
+import sys
+from pathlib import Path
+
+import pytest
+from opentelemetry import trace
+from opentelemetry.trace import StatusCode
+
+# ランタイムディレクトリをパスに追加
+sys.path.insert(0, str(Path(__file__).parent.parent / "amplify" / "agent" / "runtime"))
+
+import agent as agent_module
+from exports import slide_exporter
+from session import build_user_message
+from telemetry import Stage, capture_telemetry
+from telemetry.stages import STAGE_DURATION, TIME_TO_FIRST_TOKEN
+from tools import output_slide
+
+DECK = "---\nmarp: true\n---\n\n# A\n\n---\n\n# B\n"
+
+
+class FakeAgent:
+    def __init__(self):
+        self.messages = []
+
+    async def stream_async(self, prompt, invocation_state=None, cancel_signal=None):
+        yield {"data": "作成します"}
+        tool_use = {"toolUseId": "tooluse_test", "name": "output_slide", "input": {"markdown": DECK}}
+        async for _ in output_slide.stream(tool_use, {**invocation_state, "agent": self}):
+            pass
+
+
+class FakeRendererPool:
+    def render_batch(self, jobs, theme, allow_html, on_result=None):
+        return [b"%PDF-fake" for _ in jobs]
+
+
+def _collect(payload: dict) -> list[dict]:
+    async def run():
+        return [event async for event in agent_module.invoke(payload)]
+    return asyncio.run(run())
+
+
+def test_chat_stages_are_traced(monkeypatch):
+    monkeypatch.setattr(agent_module, "get_or_create_agent", lambda session_id, model_type: FakeAgent())
+
+    with capture_telemetry() as telemetry:
+        _collect({"prompt": "テスト", "model_type": "claude", "theme": "border"})
+
+        [invoke_span] = telemetry.spans("agent.invoke")
+        [attempt_span] = telemetry.spans("model.attempt")
+        [tool_span] = telemetry.spans("tool.output_slide")
+        assert invoke_span.attributes["model_type"] == "claude"
+        assert invoke_span.attributes["theme"] == "border"
+        assert invoke_span.attributes["deck.slides"] == 2
+        assert attempt_span.parent.span_id == invoke_span.context.span_id
+        assert tool_span.parent.span_id == attempt_span.context.span_id
+        assert tool_span.attributes["deck.slides"] == 2
+        assert [e.name for e in attempt_span.events] == ["first_token"]
+
+        stages = {point["attributes"]["stage"] for point in telemetry.histogram(STAGE_DURATION)}
+        assert {"agent.invoke", "model.attempt", "tool.output_slide"} <= stages
+        [first_token] = telemetry.histogram(TIME_TO_FIRST_TOKEN)
+        assert first_token["attributes"]["model_type"] == "claude"
+
+
+def test_history_compaction_savings_are_recorded_on_invoke(monkeypatch):
+    fake_agent = FakeAgent()
+    fake_agent.messages = [
+        {"role": "user", "content": [{"text": build_user_message("直して", DECK * 50)}]},
+        {"role": "assistant", "content": [{"text": "直しました。"}]},
+    ]
+    monkeypatch.setattr(agent_module, "get_or_create_agent", lambda session_id, model_type: fake_agent)
+
+    with capture_telemetry() as telemetry:
+        _collect({"prompt": "もう一度", "model_type": "claude", "markdown": DECK})
+
+        [invoke_span] = telemetry.spans("agent.invoke")
+        assert invoke_span.attributes["history.tokens_saved"] > 0
+
+
+class ThrottledAgent:
+    def __init__(self):
+        self.messages = []
+
+    async def stream_async(self, prompt, invocation_state=None, cancel_signal=None):
+        yield {"data": "作成します"}
+        raise RuntimeError("ThrottlingException")
+
+
+def test_attempt_span_ends_when_stream_fails(monkeypatch):
+    monkeypatch.setattr(agent_module, "get_or_create_agent", lambda session_id, model_type: ThrottledAgent())
+
+    with capture_telemetry() as telemetry:
+        with pytest.raises(RuntimeError):
+            _collect({"prompt": "テスト", "model_type": "claude"})
+
+        [attempt_span] = telemetry.spans("model.attempt")
+        assert attempt_span.status.status_code == StatusCode.ERROR
+        assert attempt_span.attributes["aborted"] is True
+        # スパンのコンテキストが残っていない（後続のスパンの親にならない）
+        assert not trace.get_current_span().get_span_context().is_valid
+
+
+def test_export_render_time_is_recorded(monkeypatch):
+    monkeypatch.setattr(slide_exporter, "EXPORT_CACHE_MAX_BYTES", 0)
+    monkeypatch.setattr(slide_exporter, "MARP_POOL_SIZE", 1)
+    monkeypatch.setattr(slide_exporter, "get_renderer_pool", lambda: FakeRendererPool())
+
+    with capture_telemetry() as telemetry:
+        events = _collect({"action": "export_pdf", "markdown": DECK, "theme": "gradient"})
+
+        assert events[0]["type"] == "pdf"
+        [export_span] = telemetry.spans("export")
+        [render_span] = telemetry.spans("marp.render")
+        assert render_span.parent.span_id == export_span.context.span_id
+        assert export_span.attributes["format"] == "pdf"
+        render_points = [p for p in telemetry.histogram(STAGE_DURATION) if p["attributes"]["stage"] == "marp.render"]
+        assert render_points[0]["attributes"] == {
+            "stage": "marp.render", "outcome": "ok", "format": "pdf", "theme": "gradient",
+        }
+
+
+def test_stage_is_current_only_between_start_and_finish():
+    with capture_telemetry() as telemetry:
+        stage = Stage("idle")
+        assert not trace.get_current_span().get_span_context().is_valid
+
+        with stage:
+            assert trace.get_current_span().get_span_context().is_valid
+        assert not trace.get_current_span().get_span_context().is_valid
+        assert [span.name for span in telemetry.spans()] == ["idle"]
+
+
+def test_runtime_stats_are_exported_as_gauges(monkeypatch):
+    from session import get_session_stats
+    from handlers.retry import get_retry_stats
+    monkeypatch.setattr(slide_exporter, "get_renderer_pool", lambda: FakeRendererPool())
+
+    with capture_telemetry() as telemetry:
+        _collect({"action": "export_pdf", "markdown": DECK})
+
+        [sessions] = telemetry.gauge("marp_agent.sessions.live_sessions")
+        [attempts] = telemetry.gauge("marp_agent.retry.attempts")
+        [running] = telemetry.gauge("marp_agent.exports.running")
+        [scratch_active] = telemetry.gauge("marp_agent.scratch.active")
+
+    assert sessions["value"] == get_session_stats()["live_sessions"]
+    assert attempts["value"] == get_retry_stats()["attempts"]
+    assert running["value"] == 0
+    assert scratch_active["value"] == 0
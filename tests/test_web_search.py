@@ -0,0 +1,250 @@
+"""Web検索ツールのテスト（ローカルの偽Tavilyサーバーを使用）"""
+import asyncio
+import importlib
+import json
+import sqlite3
+import sys
+import threading
+import time
+from collections import Counter
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+
+import pytest
+
+# ランタイムディレクトリをパスに追加
+sys.path.insert(0, str(Path(__file__).parent.parent / "amplify" / "agent" / "runtime"))
+
+# tools パッケージが web_search 関数を再エクスポートしているためモジュールを直接取得
+web_search_module = importlib.import_module("tools.web_search")
+from tools.search_cache import SearchCache
+from tools.tavily_keys import QuotaLedger, build_tavily_keys, discover_api_keys
+
+
+class FakeTavilyHandler(BaseHTTPRequestHandler):
+    """APIキーごとに振る舞いを変える偽の /search エンドポイント"""
+
+    hits: Counter = Counter()
+
+    def log_message(self, *args):
+        pass
+
+    def do_POST(self):
+        api_key = self.headers.get("Authorization", "").removeprefix("Bearer ")
+        self.hits[api_key] += 1
+        query = json.loads(self.rfile.read(int(self.headers["Content-Length"])))["query"]
+
+        if api_key == "limited":
+            self._respond(429, {"detail": {"error": "rate limit exceeded"}})
+        elif api_key == "exhausted":
+            self._respond(432, {"detail": {"error": "This request exceeds your plan's set usage limit"}})
+        elif api_key == "broken":
+            self._respond(400, {"detail": {"error": "Invalid request"}})
+        else:
+            if api_key == "slow":
+                time.sleep(1.0)
+            self._respond(200, {"results": [{"title": f"{api_key}:{query}", "content": "本文", "url": "https://example.com"}]})
+
+    def _respond(self, status: int, body: dict):
+        payload = json.dumps(body).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(payload)))
+        self.end_headers()
+        self.wfile.write(payload)
+
+
+@pytest.fixture(scope="module")
+def fake_tavily_url():
+    server = ThreadingHTTPServer(("127.0.0.1", 0), FakeTavilyHandler)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield f"http://127.0.0.1:{server.server_address[1]}"
+    server.shutdown()
+
+
+@pytest.fixture
+def use_keys(monkeypatch, fake_tavily_url):
+    FakeTavilyHandler.hits.clear()
+
+    def _use(*api_keys: str, ledger: QuotaLedger | None = None):
+        keys = build_tavily_keys([(k, k) for k in api_keys], fake_tavily_url, ledger=ledger)
+        monkeypatch.setattr(web_search_module, "tavily_keys", keys)
+        return keys
+
+    return _use
+
+
+def test_rate_limited_key_is_skipped_until_cooldown(use_keys):
+    """レート制限されたキーはクールダウン中は試さない"""
+    use_keys("limited", "fast")
+
+    first, _ = asyncio.run(web_search_module.search_tavily("AWS"))
+    second, _ = asyncio.run(web_search_module.search_tavily("Azure"))
+
+    assert "fast:AWS" in first
+    assert "fast:Azure" in second
+    assert FakeTavilyHandler.hits["limited"] == 1
+
+
+def test_exhausted_keys_return_exhausted_message(use_keys):
+    """全キーが枯渇していれば枯渇メッセージを返し、以降は問い合わせない"""
+    keys = use_keys("exhausted")
+
+    result, succeeded = asyncio.run(web_search_module.search_tavily("AWS"))
+    asyncio.run(web_search_module.search_tavily("AWS"))
+
+    assert not succeeded
+    assert "枯渇" in result
+    assert not keys[0].is_available()
+    assert FakeTavilyHandler.hits["exhausted"] == 1
+
+
+def test_slow_key_is_hedged(use_keys, monkeypatch):
+    """遅いキーは別キーでヘッジし、先に返った結果を使う"""
+    monkeypatch.setattr(web_search_module, "TAVILY_HEDGE_DELAY", 0.1)
+    use_keys("slow", "fast")
+
+    started = time.monotonic()
+    result, succeeded = asyncio.run(web_search_module.search_tavily("GCP"))
+
+    assert succeeded
+    assert "fast:GCP" in result
+    assert time.monotonic() - started < 1.0
+
+
+def test_hedged_search_waits_for_pending_key_after_error(use_keys, monkeypatch):
+    """ヘッジ先がエラーになっても、並行中の検索が成功すればその結果を使う"""
+    monkeypatch.setattr(web_search_module, "TAVILY_HEDGE_DELAY", 0.1)
+    use_keys("slow", "broken")
+
+    result, succeeded = asyncio.run(web_search_module.search_tavily("GCP"))
+
+    assert succeeded
+    assert "slow:GCP" in result
+    assert FakeTavilyHandler.hits == {"slow": 1, "broken": 1}
+
+
+def test_no_hedge_when_next_key_is_over_half_quota(use_keys, monkeypatch):
+    """ヘッジ先のキーの枠が半分以上使われていればヘッジしない"""
+    monkeypatch.setattr(web_search_module, "TAVILY_HEDGE_DELAY", 0.1)
+    _, fast = use_keys("slow", "fast")
+    fast.monthly_quota = 10
+    fast.ledger.record(fast.key_id, 6)
+
+    result, succeeded = asyncio.run(web_search_module.search_tavily("GCP"))
+
+    assert succeeded
+    assert "slow:GCP" in result
+    assert FakeTavilyHandler.hits == {"slow": 1}
+
+
+def test_latency_histogram_is_recorded(use_keys):
+    """成功した検索のレイテンシがキーごとに記録される"""
+    use_keys("fast")
+
+    asyncio.run(web_search_module.search_tavily("AWS"))
+
+    latency = web_search_module.get_search_metrics()["fast"]["latency"]
+    assert latency["count"] == 1
+    assert sum(latency["buckets"].values()) == 1
+
+
+def test_load_is_spread_across_keys(use_keys):
+    """今月の利用数が少ないキーから使い、負荷を分散する"""
+    use_keys("fast", "fast2", "fast3")
+
+    for i in range(6):
+        asyncio.run(web_search_module.search_tavily(f"query {i}"))
+
+    assert FakeTavilyHandler.hits == {"fast": 2, "fast2": 2, "fast3": 2}
+
+
+def test_quota_is_persisted_and_switched_before_limit(use_keys, tmp_path, monkeypatch):
+    """月間カウンタはファイルに保存され、上限間近のキーは再起動後も避ける"""
+    usage_path = tmp_path / "usage.json"
+    ledger = QuotaLedger(usage_path, flush_interval=60)
+    keys = use_keys("fast", "fast2", ledger=ledger)
+    for key in keys:
+        key.monthly_quota = 1
+    asyncio.run(web_search_module.search_tavily("one"))
+    asyncio.run(web_search_module.search_tavily("two"))
+    # 計上のたびには書き込まず、まとめて保存する（終了時にも保存される）
+    assert not usage_path.exists()
+    ledger.flush()
+
+    restarted = use_keys("fast", "fast2", ledger=QuotaLedger(usage_path))
+    for key in restarted:
+        key.monthly_quota = 1
+    result, succeeded = asyncio.run(web_search_module.search_tavily("three"))
+
+    assert FakeTavilyHandler.hits == {"fast": 1, "fast2": 1}
+    assert not succeeded
+    assert "枯渇" in result
+
+
+def test_quota_counts_request_cost(use_keys, tmp_path):
+    """advanced検索は1回でTAVILY_REQUEST_COST分を消費し、閾値をまたいだ時点で切り替える"""
+    [key] = use_keys("fast", ledger=QuotaLedger(tmp_path / "usage.json"))
+    key.monthly_quota = 10
+
+    for _ in range(4):
+        key.record_request(cost=2)
+    assert key.used_this_month == 8
+    assert key.is_available()
+
+    key.record_request(cost=2)
+    assert not key.is_available()
+
+
+def test_discover_api_keys_supports_any_number_of_keys():
+    environ = {"TAVILY_API_KEY12": "k12", "TAVILY_API_KEY": "k1", "TAVILY_API_KEY3": "k3", "TAVILY_API_KEY2": "", "OTHER": "x"}
+
+    assert discover_api_keys(environ) == [("TAVILY_API_KEY", "k1"), ("TAVILY_API_KEY3", "k3"), ("TAVILY_API_KEY12", "k12")]
+
+
+def test_search_cache_normalizes_queries(use_keys, monkeypatch):
+    """表記ゆれのある同じクエリはキャッシュから返し、Tavilyに問い合わせない"""
+    monkeypatch.setattr(web_search_module, "search_cache", SearchCache(max_entries=10, ttl=60, db_path=""))
+    use_keys("fast")
+
+    first = asyncio.run(web_search_module.web_search("AWS  Lambda"))
+    second = asyncio.run(web_search_module.web_search("ａｗｓ　lambda"))
+
+    assert first == second
+    assert FakeTavilyHandler.hits["fast"] == 1
+    assert web_search_module.get_search_cache_stats()["hits"] == 1
+
+
+def test_search_cache_survives_restart(tmp_path):
+    """ディスクに保存した結果は再起動後も使え、期限切れ・上限超過は捨てる"""
+    db_path = str(tmp_path / "search-cache.db")
+    cache = SearchCache(max_entries=2, ttl=60, db_path=db_path)
+    cache.put("a", "A")
+    cache.put("b", "B")
+    cache.put("c", "C")
+
+    restarted = SearchCache(max_entries=2, ttl=60, db_path=db_path)
+
+    assert restarted.get("a") is None
+    assert restarted.get("C") == "C"
+    assert SearchCache(max_entries=2, ttl=0, db_path=db_path).get("b") is None
+
+
+def test_search_cache_hits_are_written_in_batches(tmp_path):
+    """ヒット時はSQLiteに書かず、次の保存（またはflush）でまとめてアクセス順を反映する"""
+    db_path = str(tmp_path / "search-cache.db")
+    cache = SearchCache(max_entries=2, ttl=60, db_path=db_path)
+    cache.put("a", "A")
+    cache.put("b", "B")
+    assert cache.get("a") == "A"
+
+    with sqlite3.connect(db_path) as db:
+        # 未反映なので、ディスク上はまだ b の方が新しい
+        [(latest,)] = db.execute("SELECT query FROM search_cache ORDER BY accessed_at DESC LIMIT 1").fetchall()
+    assert latest == "b"
+    cache.flush()
+
+    restarted = SearchCache(max_entries=1, ttl=60, db_path=db_path)
+    assert restarted.get("a") == "A"
+    assert restarted.get("b") is None